@@ -0,0 +1 @@
+""" Benchmarks and harnesses for the bot and engine hot paths"""
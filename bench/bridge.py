@@ -0,0 +1,61 @@
+""" Microbenchmark of the GameState -> libriichi message bridge
+
+Compares json.dumps / json.loads with bot.bridge.encode / decode per mjai msg type,
+for normal msgs and can_act=False catch-up msgs.
+
+usage: python -m bench.bridge [-n 200000]
+"""
+import argparse
+import json
+import timeit
+
+from bot import bridge
+
+SAMPLE_MSGS = {
+    "tsumo": {"type": "tsumo", "actor": 1, "pai": "5mr"},
+    "dahai": {"type": "dahai", "actor": 2, "pai": "E", "tsumogiri": True},
+    "reach": {"type": "reach", "actor": 0},
+    "reach_accepted": {"type": "reach_accepted", "actor": 0},
+    "dora": {"type": "dora", "dora_marker": "7p"},
+    "pon": {"type": "pon", "actor": 3, "target": 1, "pai": "C", "consumed": ["C", "C"]},
+    "start_kyoku": {
+        "type": "start_kyoku", "bakaze": "E", "dora_marker": "1s", "honba": 0, "kyoku": 1,
+        "kyotaku": 0, "oya": 0, "scores": [25000] * 4,
+        "tehais": [["?"] * 13, ["1m", "2m", "3m", "4p", "5pr", "6p", "7s", "8s", "9s", "E", "E", "P", "C"],
+                   ["?"] * 13, ["?"] * 13],
+    },
+}
+SAMPLE_REACTION = (
+    '{"type":"dahai","actor":1,"pai":"9s","tsumogiri":false,"meta":{"q_values":[-1.2,0.3,2.5,-0.7],'
+    '"mask_bits":2697207348,"is_greedy":true,"eval_time_ns":357088300}}'
+)
+
+
+def _per_msg_ns(stmt, number:int) -> float:
+    return timeit.timeit(stmt, number=number) / number * 1e9
+
+
+def run(number:int) -> str:
+    """ run the benchmark and return the report"""
+    lines = [f"serializer: {'orjson' if bridge.orjson else 'json'}",
+             f"{'msg':<16}{'json.dumps':>12}{'encode':>10}{'gain':>8}"
+             f"{'dumps+can_act':>16}{'encode(False)':>15}{'gain':>8}   (ns/msg)"]
+    for name, msg in SAMPLE_MSGS.items():
+        base = _per_msg_ns(lambda: json.dumps(msg), number)
+        new = _per_msg_ns(lambda: bridge.encode(msg), number)
+        # the old catch-up path set can_act on the dict before dumping it
+        base_na = _per_msg_ns(lambda: json.dumps({**msg, "can_act": False}), number)
+        new_na = _per_msg_ns(lambda: bridge.encode(msg, can_act=False), number)
+        lines.append(f"{name:<16}{base:>12.0f}{new:>10.0f}{base / new:>7.1f}x"
+                     f"{base_na:>16.0f}{new_na:>15.0f}{base_na / new_na:>7.1f}x")
+    base = _per_msg_ns(lambda: json.loads(SAMPLE_REACTION), number)
+    new = _per_msg_ns(lambda: bridge.decode(SAMPLE_REACTION), number)
+    lines.append(f"{'decode reaction':<16}{base:>12.0f}{new:>10.0f}{base / new:>7.1f}x")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Message bridge microbenchmark")
+    parser.add_argument("-n", "--number", help="iterations per measurement", type=int, default=200000)
+    args = parser.parse_args()
+    print(run(args.number))
@@ -0,0 +1,51 @@
+""" Hit rate / latency harness for the observation-keyed q value cache (bot.local.cache)
+
+Replays recordings (see common.recorder, MajiangBot --record) once without and once with the
+cache, in this process, and reports the cache hit rate, evictions and decision latency of both
+runs. Reactions are checked against the recordings in both runs (see bench.replay).
+
+usage: python -m bench.cache -p model.pth --entries 4096 recordings/*.jsonl.gz
+"""
+import argparse
+import time
+
+from bot.local.config import EngineConfig
+from bot.local.registry import acquire_engine, release_engine
+from bench.replay import replay_all, report
+
+
+def run(paths:list[str], model_path:str, device:str=None, entries:int=4096, mb:float=0) -> dict:
+    """ replay without and with the cache
+    returns:
+        dict: {'plain': (ReplayResult, seconds), 'cached': (ReplayResult, seconds), 'stats': EvalCache.stats()}"""
+    out = {}
+    configs = {'plain': EngineConfig(device=device),
+               'cached': EngineConfig(device=device, cache_entries=entries, cache_mb=mb)}
+    for label, config in configs.items():
+        # load the model before timing
+        engine = acquire_engine(model_path, config)
+        start = time.perf_counter()
+        result = replay_all(paths, model_path, config)
+        out[label] = (result, time.perf_counter() - start)
+        if engine.cache is not None:
+            out['stats'] = engine.cache.stats()
+        release_engine(model_path, config)
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recordings with and without the q value cache")
+    parser.add_argument("recordings", nargs="+", help="recording files (*.jsonl.gz)")
+    parser.add_argument("-p", "--modelpath", help="path to the local Mortal model", type=str, default="model.pth")
+    parser.add_argument("-d", "--device", help="torch device for the model (default: auto)", type=str, default=None)
+    parser.add_argument("--entries", help="max cached rows (default: 4096)", type=int, default=4096)
+    parser.add_argument("--mb", help="max cache memory in MB (default: 0, no limit)", type=float, default=0)
+    args = parser.parse_args()
+
+    runs = run(args.recordings, args.modelpath, args.device, args.entries, args.mb)
+    for label in ('plain', 'cached'):
+        print(f"[{label}]")
+        print(report(*runs[label]))
+    s = runs['stats']
+    print(f"cache: hit rate {s['hit_rate']:.1%}  hits {s['hits']}  misses {s['misses']}"
+          f"  evictions {s['evictions']}  entries {s['entries']}  {s['mb']:.2f} MB")
@@ -0,0 +1,78 @@
+""" Benchmark of the inference-only Brain (bot.local.model_infer) against the eager Brain
+
+Builds randomly initialized models (random batch norm statistics) for a few common
+conv_channels / num_blocks settings and reports the forward time of both variants,
+the saving per residual block and the max output difference.
+
+usage: python -m bench.fused_model [--version 4] [--batch-sizes 1 16]
+"""
+import argparse
+import math
+import time
+
+import torch
+from torch import nn
+
+from bot.local.model import Brain
+from bot.local.model_infer import fuse_brain
+from bot.local.inference import example_inputs
+
+SETTINGS = [(128, 20), (192, 40), (256, 54)]     # (conv_channels, num_blocks)
+
+
+def random_brain(version:int, conv_channels:int, num_blocks:int) -> Brain:
+    """ eval mode Brain with random weights and batch norm statistics"""
+    brain = Brain(version=version, conv_channels=conv_channels, num_blocks=num_blocks)
+    gen = torch.Generator().manual_seed(0)
+    with torch.no_grad():
+        for mod in brain.modules():
+            if isinstance(mod, nn.BatchNorm1d):
+                mod.running_mean.copy_(torch.randn(mod.num_features, generator=gen) * 0.1)
+                mod.running_var.copy_(torch.rand(mod.num_features, generator=gen) + 0.5)
+                mod.weight.copy_(torch.rand(mod.num_features, generator=gen) + 0.5)
+                mod.bias.copy_(torch.randn(mod.num_features, generator=gen) * 0.1)
+    return brain.eval()
+
+
+def time_forward(module:nn.Module, obs:torch.Tensor, number:int) -> float:
+    """ best seconds per forward pass over number runs"""
+    best = math.inf
+    with torch.no_grad():
+        module(obs)
+        for _ in range(number):
+            start = time.perf_counter()
+            module(obs)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _output(out) -> torch.Tensor:
+    return out[0] if isinstance(out, tuple) else out
+
+
+def run(version:int, batch_sizes:list[int], number:int) -> str:
+    """ run the benchmark and return the report"""
+    lines = [f"version {version}, best of {number} runs, torch threads {torch.get_num_threads()}",
+             f"{'channels':>8}{'blocks':>7}{'batch':>6}{'eager ms':>10}{'fused ms':>10}"
+             f"{'saved us/block':>16}{'speedup':>9}{'max diff':>10}"]
+    for channels, blocks in SETTINGS:
+        brain = random_brain(version, channels, blocks)
+        fused = fuse_brain(brain)
+        for size in batch_sizes:
+            obs, _ = example_inputs(version, size, torch.device('cpu'))
+            with torch.no_grad():
+                diff = (_output(brain(obs)) - _output(fused(obs))).abs().max().item()
+            t_eager = time_forward(brain, obs, number)
+            t_fused = time_forward(fused, obs, number)
+            lines.append(f"{channels:>8}{blocks:>7}{size:>6}{t_eager * 1000:>10.3f}{t_fused * 1000:>10.3f}"
+                         f"{(t_eager - t_fused) / blocks * 1e6:>16.1f}{t_eager / t_fused:>8.2f}x{diff:>10.1e}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fused Brain benchmark")
+    parser.add_argument("--version", help="Mortal model version", type=int, choices=[1, 2, 3, 4], default=4)
+    parser.add_argument("--batch-sizes", help="batch sizes to time", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("-n", "--number", help="timed runs per measurement", type=int, default=50)
+    args = parser.parse_args()
+    print(run(args.version, args.batch_sizes, args.number))
@@ -0,0 +1,67 @@
+""" Microbenchmark of the per-message logging cost on the decision path
+
+Compares the former synchronous print() calls of GameState / MajiangBot (one GAME message,
+a pending mjai batch and the reaction) with the common.log_setup queue-based logging at DEBUG
+(message built on the caller, written by the background thread) and at the default INFO (per-message logs off).
+Output goes to os.devnull, so only the caller-side cost is measured.
+
+usage: python -m bench.logging_overhead [-n 20000]
+"""
+import argparse
+import contextlib
+import logging
+import os
+import timeit
+
+from common.log_setup import bot_logger, setup_logging, stop_logging
+
+SAMPLE_MSG = {"dapai": {"l": 1, "p": "m5_"}, "seq": 42}
+SAMPLE_BATCH = [
+    {"type": "dahai", "actor": 1, "pai": "5m", "tsumogiri": True},
+    {"type": "tsumo", "actor": 2, "pai": "?"},
+    {"type": "dahai", "actor": 2, "pai": "E", "tsumogiri": False},
+]
+SAMPLE_REACTION = {"type": "none", "meta": {"q_values": [-1.25, 0.5], "mask_bits": 2**45 + 2**10, "is_greedy": True}}
+
+
+def _old_messages():
+    # former GameState._input_inner / _react_all / MajiangBot.on_game output
+    print("[GameState]: ", SAMPLE_MSG)
+    print("[Bot in]:", "\n".join(str(m) for m in SAMPLE_BATCH))
+    print("[Mortal_A]", SAMPLE_BATCH[-1], SAMPLE_REACTION)
+
+
+def _new_messages(log:logging.Logger):
+    log.debug("[GameState]: %s", SAMPLE_MSG)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Bot in (batch):\n%s", "\n".join(str(m) for m in SAMPLE_BATCH))
+    log.debug("%s %s", SAMPLE_BATCH[-1], SAMPLE_REACTION)
+
+
+def _per_call_us(stmt, number:int) -> float:
+    return timeit.timeit(stmt, number=number) / number * 1e6
+
+
+def run(number:int) -> str:
+    """ run the benchmark and return the report"""
+    log = bot_logger("Mortal_A", "bench")
+    results = {}
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            results["print (former)"] = _per_call_us(_old_messages, number)
+        for level in ("DEBUG", "INFO"):
+            setup_logging(level, stream=devnull)
+            results[f"logging {level}"] = _per_call_us(lambda: _new_messages(log), number)
+            stop_logging()
+    base = results["print (former)"]
+    lines = [f"{'mode':<18}{'us/msg':>10}{'vs print':>10}"]
+    for name, t in results.items():
+        lines.append(f"{name:<18}{t:>10.2f}{t / base:>9.1%}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-message logging overhead microbenchmark")
+    parser.add_argument("-n", "--number", help="iterations per measurement", type=int, default=20000)
+    args = parser.parse_args()
+    print(run(args.number))
@@ -0,0 +1,106 @@
+""" Action agreement / speed harness for the reduced precision modes
+
+Replays recordings (see common.recorder, MajiangBot --record) once in fp32 to capture the
+observations the engine is asked about, then evaluates the same observations with each
+precision mode and reports argmax-action agreement with fp32, q-value error and speedup.
+
+usage: python -m bench.precision -p model.pth recordings/*.jsonl.gz
+"""
+import argparse
+import math
+import time
+
+from bot import get_bot
+from bot.local.config import EngineConfig
+from bot.local.engine import get_engine
+from bot.local.registry import acquire_engine, release_engine
+from bot.local.precision import PRECISIONS
+from game_state import GameState
+from bench.replay import replay_recording
+
+
+def capture_observations(paths:list[str], model_path:str, device:str=None) -> list[tuple[list, list]]:
+    """ replay the recordings in fp32 and return the evaluated (obs, masks) batches"""
+    batches = []
+    # every row goes through the network: quick eval answers would agree in every mode for free
+    config = EngineConfig(device=device, quick_eval=False, always_hora=False)
+
+    def capture(obs, masks, invisible_obs):
+        batches.append(([o.copy() for o in obs], [m.copy() for m in masks]))
+
+    # the bots of the replays share this engine
+    engine = acquire_engine(model_path, config)
+    engine.add_observer(capture)
+    try:
+        for path in paths:
+            replay_recording(path, GameState(get_bot(model_path, config)))
+    finally:
+        engine.remove_observer(capture)
+        release_engine(model_path, config)
+    return batches
+
+
+def evaluate(engine, batches:list, repeat:int=1) -> tuple[list[int], list[list[float]], float]:
+    """ run all batches through the engine
+    returns:
+        (actions, q values per row, best total seconds over repeat runs)"""
+    best = math.inf
+    for _ in range(repeat):
+        actions, q_values = [], []
+        start = time.perf_counter()
+        for obs, masks in batches:
+            a, q, _, _ = engine.react_batch(obs, masks, None)
+            actions += a
+            q_values += q
+        best = min(best, time.perf_counter() - start)
+    return actions, q_values, best
+
+
+def compare(base:tuple, other:tuple) -> dict:
+    """ agreement and q error of other vs base, both results of evaluate()"""
+    actions0, q0, t0 = base
+    actions1, q1, t1 = other
+    same = sum(1 for a, b in zip(actions0, actions1) if a == b)
+    errors = [
+        abs(x - y)
+        for row0, row1 in zip(q0, q1)
+        for x, y in zip(row0, row1) if math.isfinite(x)
+    ]
+    return {
+        "agreement": same / max(1, len(actions0)),
+        "q_mean_err": sum(errors) / max(1, len(errors)),
+        "q_max_err": max(errors, default=0.0),
+        "seconds": t1,
+        "speedup": t0 / t1 if t1 > 0 else math.inf,
+    }
+
+
+def run(paths:list[str], model_path:str, device:str=None, modes:list[str]=PRECISIONS, repeat:int=3) -> str:
+    """ run the harness and return the report"""
+    batches = capture_observations(paths, model_path, device)
+    rows = sum(len(obs) for obs, _ in batches)
+    results = {}
+    for mode in ["fp32"] + [m for m in modes if m != "fp32"]:
+        engine = get_engine(model_path, device, precision=mode, quick_eval=False, always_hora=False)
+        results[mode] = evaluate(engine, batches, repeat)
+    lines = [
+        f"observations: {rows} in {len(batches)} batches, best of {repeat} runs",
+        f"{'mode':<8}{'agreement':>11}{'q mean err':>12}{'q max err':>11}{'ms/row':>9}{'speedup':>9}",
+    ]
+    for mode, res in results.items():
+        c = compare(results["fp32"], res)
+        lines.append(f"{mode:<8}{c['agreement']:>10.2%}{c['q_mean_err']:>12.4f}{c['q_max_err']:>11.4f}"
+                     f"{c['seconds'] / max(1, rows) * 1000:>9.3f}{c['speedup']:>8.2f}x")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare precision modes on recorded observations")
+    parser.add_argument("recordings", nargs="+", help="recording files (*.jsonl.gz)")
+    parser.add_argument("-p", "--modelpath", help="path to the local Mortal model", type=str, default="model.pth")
+    parser.add_argument("-d", "--device", help="torch device for the model (default: auto)", type=str, default=None)
+    parser.add_argument("-m", "--modes", help="precision modes to compare with fp32", nargs="+",
+                        choices=PRECISIONS, default=list(PRECISIONS))
+    parser.add_argument("--repeat", help="timing runs per mode, the best one is reported", type=int, default=3)
+    args = parser.parse_args()
+    print(run(args.recordings, args.modelpath, args.device, args.modes, args.repeat))
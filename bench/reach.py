@@ -0,0 +1,59 @@
+""" Cost of evaluating the discard after a self reach
+
+Replays recordings (see common.recorder, MajiangBot --record) and reports the reach_dahai time
+per reach (clone of the libriichi bot rebuilt from the kyoku log + one evaluation) next to the
+libriichi react time per msg, and the share of the reach evaluations in the total bot time.
+Msgs other than reaches pay nothing for it.
+
+usage: python -m bench.reach -p model.pth recordings/*.jsonl.gz
+"""
+import argparse
+import time
+
+from bot import get_bot
+from bot.local.config import EngineConfig
+from bot.local.registry import acquire_engine, release_engine
+from bench.replay import replay_recording
+from game_state import GameState
+
+
+def run(paths:list[str], model_path:str, device:str=None) -> dict:
+    """ replay the recordings
+    returns:
+        dict: summed stage totals {stage: (count, seconds)}, plus 'wall'"""
+    config = EngineConfig(device=device)
+    # load the model before timing
+    acquire_engine(model_path, config)
+    totals = {}
+    start = time.perf_counter()
+    for i, path in enumerate(paths):
+        bot = get_bot(model_path, config)
+        # unlabeled stage timings are shared by every bot of the process
+        bot.set_metric_labels(bot=f"reach-{i}")
+        replay_recording(path, GameState(bot))
+        for stage, (count, secs) in bot.stages.totals().items():
+            c, s = totals.get(stage, (0, 0.0))
+            totals[stage] = (c + count, s + secs)
+    totals['wall'] = (1, time.perf_counter() - start)
+    release_engine(model_path, config)
+    return totals
+
+
+def report(totals:dict) -> str:
+    """ human readable summary of the run"""
+    n_reach, t_reach = totals.get('reach_dahai', (0, 0.0))
+    n_msg, t_react = totals.get('libriichi_react', (0, 0.0))
+    t_bot = sum(s for stage, (_, s) in totals.items() if stage != 'wall')
+    lines = [f"{'reaches':>9}{'ms/reach':>10}{'msgs':>9}{'us/msg react':>14}{'reach share':>13}{'wall s':>9}",
+             f"{n_reach:>9}{t_reach / max(n_reach, 1) * 1e3:>10.2f}{n_msg:>9}"
+             f"{t_react / max(n_msg, 1) * 1e6:>14.1f}{t_reach / max(t_bot, 1e-9):>12.1%}{totals['wall'][1]:>9.2f}"]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of the reach discard evaluation")
+    parser.add_argument("recordings", nargs="+", help="recording files (*.jsonl.gz)")
+    parser.add_argument("-p", "--modelpath", help="path to the local Mortal model", type=str, default="model.pth")
+    parser.add_argument("-d", "--device", help="torch device for the model (default: auto)", type=str, default=None)
+    args = parser.parse_args()
+    print(report(run(args.recordings, args.modelpath, args.device)))
@@ -0,0 +1,112 @@
+""" Replay recorded GAME message streams as a latency benchmark
+
+Feeds each recording (see common.recorder, MajiangBot --record) through a fresh
+GameState.input / trans_mjai_react as fast as possible, checks that the reactions match the
+recorded ones and reports decision latency percentiles.
+
+usage: python -m bench.replay -p model.pth recordings/*.jsonl.gz
+"""
+import argparse
+import time
+
+from bot import get_bot
+from bot.local.config import EngineConfig
+from bot.local.registry import acquire_engine, release_engine, preload_for_workers, warm_up_engines, worker_context
+from game_state import GameState
+from common.recorder import read_recording
+from common.utils import percentiles
+
+
+class ReplayResult:
+    """ result of replaying one or more recordings"""
+    def __init__(self) -> None:
+        self.recordings:int = 0
+        self.messages:int = 0
+        self.decisions:int = 0
+        self.decision_times:list[float] = []    # seconds per decision
+        self.mismatches:int = 0
+        self.first_mismatches:list[str] = []    # a few examples for the report
+
+    def merge(self, other:"ReplayResult"):
+        """ add the results of other to this"""
+        self.recordings += other.recordings
+        self.messages += other.messages
+        self.decisions += other.decisions
+        self.decision_times.extend(other.decision_times)
+        self.mismatches += other.mismatches
+        self.first_mismatches.extend(other.first_mismatches[:5 - len(self.first_mismatches)])
+
+
+def replay_recording(path:str, game:GameState) -> ReplayResult:
+    """ replay one recording through game and compare with the recorded reactions"""
+    res = ReplayResult()
+    res.recordings = 1
+    for msg, recorded in read_recording(path):
+        start = time.perf_counter()
+        mjai_react = game.input(msg)
+        reaction = game.trans_mjai_react(mjai_react)
+        elapsed = time.perf_counter() - start
+        res.messages += 1
+        if mjai_react is not None:
+            res.decisions += 1
+            res.decision_times.append(elapsed)
+        if reaction != recorded:
+            res.mismatches += 1
+            if len(res.first_mismatches) < 5:
+                res.first_mismatches.append(f"{path}: {msg} -> {reaction}, recorded {recorded}")
+    return res
+
+
+def _replay_file(args) -> ReplayResult:
+    path, model_path, engine_config = args
+    return replay_recording(path, GameState(get_bot(model_path, engine_config)))
+
+
+def replay_all(paths:list[str], model_path:str, engine_config:EngineConfig=None, jobs:int=1) -> ReplayResult:
+    """ replay recordings, in a process pool of size jobs if jobs > 1"""
+    total = ReplayResult()
+    args = [(p, model_path, engine_config) for p in paths]
+    if jobs > 1:
+        ctx = worker_context(model_path, (engine_config or EngineConfig()).device)
+        # nothing to do if already preloaded. the engine has not run a forward pass yet, see preload_engine()
+        preload_for_workers(ctx, model_path, engine_config)
+        with ctx.Pool(jobs, initializer=warm_up_engines) as pool:
+            for res in pool.imap_unordered(_replay_file, args):
+                total.merge(res)
+    else:
+        for a in args:
+            total.merge(_replay_file(a))
+    return total
+
+
+def report(res:ReplayResult, elapsed:float) -> str:
+    """ human readable summary of a replay run"""
+    pct = percentiles(res.decision_times, (50, 95, 99))
+    lines = [
+        f"recordings: {res.recordings}  messages: {res.messages}  decisions: {res.decisions}"
+        f"  time: {elapsed:.2f}s  decisions/sec: {res.decisions / elapsed:.1f}",
+        f"decision latency ms: p50 {pct[50]*1000:.2f}  p95 {pct[95]*1000:.2f}  p99 {pct[99]*1000:.2f}",
+        f"reaction mismatches: {res.mismatches}",
+    ]
+    lines += ["  " + m for m in res.first_mismatches]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded GAME message streams")
+    parser.add_argument("recordings", nargs="+", help="recording files (*.jsonl.gz)")
+    parser.add_argument("-p", "--modelpath", help="path to the local Mortal model", type=str, default="model.pth")
+    parser.add_argument("-d", "--device", help="torch device for the model (default: auto)", type=str, default=None)
+    parser.add_argument("-j", "--jobs", help="replay recordings in this many processes", type=int, default=1)
+    args = parser.parse_args()
+
+    config = EngineConfig(device=args.device)
+    # load the model before timing. before forking the process pool, without starting torch's thread pools
+    if args.jobs > 1:
+        preload_for_workers(worker_context(args.modelpath, config.device), args.modelpath, config)
+    else:
+        acquire_engine(args.modelpath, config)
+        release_engine(args.modelpath, config)
+    start = time.perf_counter()
+    result = replay_all(args.recordings, args.modelpath, config, args.jobs)
+    print(report(result, time.perf_counter() - start))
@@ -0,0 +1,86 @@
+""" Microbenchmark of the tile conversions used by the GameState translator
+
+Compares the former string based helpers (reverse + lookup, regex, cmp_to_key sort)
+with the common.tile_codec based ones in common.mj_helper.
+
+usage: python -m bench.tiles [-n 200000]
+"""
+import argparse
+import re
+import timeit
+from functools import cmp_to_key
+
+from common import mj_helper
+
+SAMPLE_TEHAI = "m2479p05s157z14"
+SAMPLE_MJAI_TEHAI = ["C", "9s", "5mr", "1m", "E", "5m", "3p", "5pr", "7s", "2m", "P", "1s", "8p"]
+SAMPLE_MAJIANG_TILES = ["m1", "m0", "p5", "s9", "z1", "z7"]
+SAMPLE_MJAI_TILES = ["1m", "5mr", "5p", "9s", "E", "C"]
+
+
+# former implementations, kept here as the baseline
+def _old_majiang2mjai(majiang_tile:str) -> str:
+    ms_tile = majiang_tile[1] + majiang_tile[0]
+    return mj_helper.TILES_MS_2_MJAI[ms_tile] if ms_tile in mj_helper.TILES_MS_2_MJAI else ms_tile
+
+
+def _old_mjai2maa(mjai_tile:str) -> str:
+    ms_tile = mj_helper.TILES_MJAI_2_MS[mjai_tile] if mjai_tile in mj_helper.TILES_MJAI_2_MS else mjai_tile
+    return ms_tile[1] + ms_tile[0]
+
+
+def _old_tehai_lst(str_tehai:str) -> list[str]:
+    res = []
+    for tile in re.findall(r'([mpsz]\d+)', str_tehai):
+        res.extend([tile[0] + n for n in tile[1:]])
+    return res
+
+
+def _old_sort(mjai_tiles:list[str]) -> list[str]:
+    return sorted(mjai_tiles, key=cmp_to_key(
+        lambda a, b: mj_helper.MJAI_TILES_SORTED.index(a) - mj_helper.MJAI_TILES_SORTED.index(b)))
+
+
+def _old_start_kyoku_tehai(str_tehai:str) -> list[str]:
+    return _old_sort([_old_majiang2mjai(t) for t in _old_tehai_lst(str_tehai)])
+
+
+def _new_start_kyoku_tehai(str_tehai:str) -> list[str]:
+    return mj_helper.sort_mjai_tiles(
+        [mj_helper.cvt_majiang2mjai(t) for t in mj_helper.cvt_majiang_tehai_lst(str_tehai)])
+
+
+CASES = {   # name: (old, new), each called once per iteration
+    "majiang2mjai": (lambda: [_old_majiang2mjai(t) for t in SAMPLE_MAJIANG_TILES],
+                     lambda: [mj_helper.cvt_majiang2mjai(t) for t in SAMPLE_MAJIANG_TILES]),
+    "mjai2maa": (lambda: [_old_mjai2maa(t) for t in SAMPLE_MJAI_TILES],
+                 lambda: [mj_helper.cvt_mjai2maa(t) for t in SAMPLE_MJAI_TILES]),
+    "tehai_lst": (lambda: _old_tehai_lst(SAMPLE_TEHAI),
+                  lambda: mj_helper.cvt_majiang_tehai_lst(SAMPLE_TEHAI)),
+    "sort 13 tiles": (lambda: _old_sort(SAMPLE_MJAI_TEHAI),
+                      lambda: mj_helper.sort_mjai_tiles(SAMPLE_MJAI_TEHAI)),
+    "qipai tehai": (lambda: _old_start_kyoku_tehai(SAMPLE_TEHAI),
+                    lambda: _new_start_kyoku_tehai(SAMPLE_TEHAI)),
+}
+
+
+def _per_call_ns(stmt, number:int) -> float:
+    return timeit.timeit(stmt, number=number) / number * 1e9
+
+
+def run(number:int) -> str:
+    """ run the benchmark and return the report"""
+    lines = [f"{'case':<16}{'old':>10}{'new':>10}{'gain':>8}   (ns/call)"]
+    for name, (old, new) in CASES.items():
+        assert old() == new(), name
+        t_old = _per_call_ns(old, number)
+        t_new = _per_call_ns(new, number)
+        lines.append(f"{name:<16}{t_old:>10.0f}{t_new:>10.0f}{t_old / t_new:>7.1f}x")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tile conversion microbenchmark")
+    parser.add_argument("-n", "--number", help="iterations per measurement", type=int, default=200000)
+    args = parser.parse_args()
+    print(run(args.number))
@@ -1,11 +1,14 @@
 """ Bot represents a mjai protocol bot
 implement wrappers for supportting different bot types
 """
-import json
+import time
 from abc import ABC, abstractmethod
 
-from common.mj_helper import meta_to_options, MjaiType
+from common.mj_helper import meta_to_options, mask_bits_to_bool_list, MjaiType
 from common.utils import GameMode, BotNotSupportingMode
+from common.metrics import Stages
+from bot import bridge
+from bot.local.quick_eval import trivial_action
 
 
 def reaction_convert_meta(reaction:dict, is_3p:bool=False):
@@ -26,6 +29,8 @@ class Bot(ABC):
         self.name = name
         self._initialized:bool = False
         self.seat:int = None
+        self.stages = Stages()      # stage timings, see set_metric_labels()
+        self.skipped_forward:int = 0    # decisions of the current game answered without a forward pass
     
     @property
     def supported_modes(self) -> list[GameMode]:
@@ -48,6 +53,16 @@ class Bot(ABC):
         self._init_bot_impl(mode)
         self._initialized = True
 
+    def load(self):
+        """ Optionally acquire heavy resources (e.g. the model) ahead of the first init_bot()"""
+
+    def prepare(self, mode:GameMode=GameMode.MJ4P):
+        """ Optionally build per-game state for mode ahead of init_bot()"""
+
+    def set_metric_labels(self, **labels):
+        """ set the labels (e.g. bot name, room) of this bot's stage timings"""
+        self.stages = Stages(**labels)
+
     @property
     def initialized(self) -> bool:
         """ return True if bot is initialized"""
@@ -80,7 +95,13 @@ class BotMjai(Bot):
         super().__init__(name)
         
         self.mjai_bot = None
-        self.ignore_next_turn_self_reach:bool = False
+        self._mjai_module = None            # libriichi module the bot was created from
+        self._engine = None
+        # msgs fed to mjai_bot since start_game / the current start_kyoku,
+        # replayed into a clone to evaluate the discard after a self reach
+        self._kyoku_log:list[dict] = []
+        # fresh libriichi bots by (mode, seat), see prepare()
+        self._prepared:dict[tuple, object] = {}
         
     
     @property
@@ -93,49 +114,117 @@ class BotMjai(Bot):
         raise NotImplementedError("Subclass must implement this method")
     
     
-    def _init_bot_impl(self, mode:GameMode=GameMode.MJ4P):
-        engine = self._get_engine(mode)
-        if not engine:
-            raise BotNotSupportingMode(mode)
+    @staticmethod
+    def _mjai_module_for(mode:GameMode):
+        """ libriichi.mjai module for the game mode"""
         if mode == GameMode.MJ4P:
             try:
                 import libriichi
             except:
                 import riichi as libriichi
-            self.mjai_bot = libriichi.mjai.Bot(engine, self.seat)
+            return libriichi.mjai
         elif mode == GameMode.MJ3P:
             import libriichi3p
-            self.mjai_bot = libriichi3p.mjai.Bot(engine, self.seat)
+            return libriichi3p.mjai
         else:
-            raise BotNotSupportingMode(mode)          
-            
+            raise BotNotSupportingMode(mode)
+
+    def prepare(self, mode:GameMode=GameMode.MJ4P):
+        """ Create the libriichi bots for every seat of mode ahead of the game,
+        so that init_bot() only picks the one for the seat given in kaiju"""
+        engine = self._get_engine(mode)
+        if not engine:
+            raise BotNotSupportingMode(mode)
+        module = self._mjai_module_for(mode)
+        n_seats = 3 if mode == GameMode.MJ3P else 4
+        for seat in range(n_seats):
+            if (mode, seat) not in self._prepared:
+                self._prepared[(mode, seat)] = module.Bot(engine, seat)
+
+    def _init_bot_impl(self, mode:GameMode=GameMode.MJ4P):
+        engine = self._get_engine(mode)
+        if not engine:
+            raise BotNotSupportingMode(mode)
+        self._mjai_module = self._mjai_module_for(mode)
+        self._engine = engine
+        self.mjai_bot = self._prepared.pop((mode, self.seat), None) or self._mjai_module.Bot(engine, self.seat)
+        self._kyoku_log = []
+        self.skipped_forward = 0
+
+    def _log_msg(self, input_msg:dict):
+        """ keep the msgs needed to rebuild the current kyoku state"""
+        msg_type = input_msg['type']
+        if msg_type == MjaiType.START_GAME:
+            self._kyoku_log = [input_msg]
+        elif msg_type == MjaiType.START_KYOKU:
+            self._kyoku_log = [m for m in self._kyoku_log[:1] if m['type'] == MjaiType.START_GAME]
+            self._kyoku_log.append(input_msg)
+        else:
+            self._kyoku_log.append(input_msg)
+
+    def _is_trivial(self, mask_bits:int) -> bool:
+        """ True if the engine answers a decision with this mask without a forward pass"""
+        legal = [i for i, b in enumerate(mask_bits_to_bool_list(mask_bits)) if b]
+        return trivial_action(legal, getattr(self._engine, 'enable_quick_eval', False),
+            getattr(self._engine, 'enable_always_hora', False)) is not None
+
+    def _eval_reach_dahai(self) -> dict:
+        """ Evaluate the dahai following a self reach on a clone of mjai_bot.
+        The clone is rebuilt from the kyoku log without evaluations (can_act=False),
+        so the real bot never sees a reach that has not been declared on the server,
+        and msgs other than reaches cost nothing extra"""
+        clone = self._mjai_module.Bot(self._engine, self.seat)
+        for msg in self._kyoku_log:
+            clone.react(bridge.encode(msg, can_act=False))
+        reach_msg = {'type': MjaiType.REACH, 'actor': self.seat}
+        return bridge.decode(clone.react(bridge.encode(reach_msg)))
+
         
+    def react_batch(self, input_list:list[dict]) -> dict | None:
+        # catch-up msgs only update the state: no can_act mutation, no reply decoding
+        if len(input_list) == 0 or self.mjai_bot is None:
+            return None
+        for msg in input_list[:-1]:
+            self._feed_no_act(msg)
+        return self.react(input_list[-1])
+
+    def _feed_no_act(self, input_msg:dict):
+        """ feed a msg to update the bot state only"""
+        self._log_msg(input_msg)
+        t0 = time.perf_counter()
+        str_input = bridge.encode(input_msg, can_act=False)
+        t1 = time.perf_counter()
+        self.mjai_bot.react(str_input)
+        self.stages.observe("json_dumps", t1 - t0)
+        self.stages.observe("libriichi_react", time.perf_counter() - t1)
+
     def react(self, input_msg:dict) -> dict:
         if self.mjai_bot is None:
-            return None        
-        if self.ignore_next_turn_self_reach:    # ignore repetitive self reach. only for the very next msg
-            if input_msg['type'] == MjaiType.REACH and input_msg['actor'] == self.seat:
-                # LOGGER.debug("Ignoring repetitive self reach msg, reach msg already sent to AI last turn")
-                return None
-            self.ignore_next_turn_self_reach = False
-            
-        str_input = json.dumps(input_msg)
+            return None
+        if input_msg.get('can_act') is False:
+            self._feed_no_act(input_msg)
+            return None
+        self._log_msg(input_msg)
 
+        t0 = time.perf_counter()
+        str_input = bridge.encode(input_msg)
+        t1 = time.perf_counter()
         react_str = self.mjai_bot.react(str_input)
+        t2 = time.perf_counter()
+        self.stages.observe("json_dumps", t1 - t0)
+        self.stages.observe("libriichi_react", t2 - t1)
         if react_str is None:
             return None
-        reaction = json.loads(react_str)
+        reaction = bridge.decode(react_str)
+        self.stages.observe("json_loads", time.perf_counter() - t2)
+        if 'meta' in reaction and self._is_trivial(reaction['meta']['mask_bits']):
+            self.skipped_forward += 1
         # Special treatment for self reach output msg
         # mjai only outputs dahai msg after the reach msg
         if reaction['type'] == MjaiType.REACH and reaction['actor'] == self.seat:  # Self reach
-            # get the subsequent dahai message,
+            # get the subsequent dahai message from a clone,
             # appeding it to the reach reaction msg as 'reach_dahai' key
-            # LOGGER.debug("Send reach msg to get reach_dahai. Cannot go back to unreach!")
-            # TODO make a clone of mjai_bot so reach can be tested to get dahai without affecting the game
-
-            reach_msg = {'type': MjaiType.REACH, 'actor': self.seat}
-            reach_dahai_str = self.mjai_bot.react(json.dumps(reach_msg))
-            reach_dahai = json.loads(reach_dahai_str)
-            reaction['reach_dahai'] = reach_dahai
-            self.ignore_next_turn_self_reach = True     # ignore very next reach msg
+            t3 = time.perf_counter()
+            reaction['reach_dahai'] = self._eval_reach_dahai()
+            self.stages.observe("reach_dahai", time.perf_counter() - t3)
         return reaction
@@ -0,0 +1,59 @@
+""" Message bridge between mjai msg dicts and the libriichi string API
+- uses orjson when available, compact json otherwise
+- the small fixed set of msg shapes built by GameState is serialized from string templates
+- can_act=False is written into the string instead of being set on the msg dict
+"""
+import json
+
+from common.mj_helper import MjaiType
+
+try:
+    import orjson
+
+    def decode(msg_str:str) -> dict:
+        """ parse a mjai msg string"""
+        return orjson.loads(msg_str)
+
+    def _dumps(msg:dict) -> str:
+        return orjson.dumps(msg).decode()
+except ImportError:
+    orjson = None
+    _decoder = json.JSONDecoder()
+    _encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+    def decode(msg_str:str) -> dict:
+        """ parse a mjai msg string"""
+        return _decoder.decode(msg_str)
+
+    _dumps = _encoder.encode
+
+_BOOL = {True: 'true', False: 'false'}
+
+# type: (number of keys in the msg dict, template function).
+# Values are tiles / ints / bools from GameState, which never need json escaping
+_TEMPLATES = {
+    MjaiType.TSUMO: (3, lambda m: f'{{"type":"tsumo","actor":{m["actor"]},"pai":"{m["pai"]}"'),
+    MjaiType.DAHAI: (4, lambda m: f'{{"type":"dahai","actor":{m["actor"]},"pai":"{m["pai"]}",'
+                     f'"tsumogiri":{_BOOL[m["tsumogiri"]]}'),
+    MjaiType.REACH: (2, lambda m: f'{{"type":"reach","actor":{m["actor"]}'),
+    MjaiType.REACH_ACCEPTED: (2, lambda m: f'{{"type":"reach_accepted","actor":{m["actor"]}'),
+    MjaiType.DORA: (2, lambda m: f'{{"type":"dora","dora_marker":"{m["dora_marker"]}"'),
+}
+
+
+def encode(msg:dict, can_act:bool=True) -> str:
+    """ serialize a mjai msg for libriichi
+    params:
+        msg(dict): mjai msg, not modified
+        can_act(bool): False to tell libriichi to only update its state for this msg"""
+    template = _TEMPLATES.get(msg['type'])
+    if template is not None and len(msg) == template[0]:
+        try:
+            body = template[1](msg)
+        except (KeyError, TypeError):
+            body = None
+        if body is not None:
+            return body + ('}' if can_act else ',"can_act":false}')
+    if can_act or msg.get('can_act') is False:
+        return _dumps(msg)
+    return _dumps({**msg, 'can_act': False})
@@ -2,15 +2,17 @@
 from common.utils import Folder, sub_file
 from .bot import Bot, GameMode
 from .local.bot_local import BotMortalLocal
+from .local.config import EngineConfig
 
 MODEL_TYPE_STRINGS = ["Local"]
 
-def get_bot(model_path:str) -> Bot:
-    """create the Bot instance based on settings"""
+def get_bot(model_path:str, engine_config:EngineConfig=None) -> Bot:
+    """create the Bot instance based on settings
+    Bots created with the same model path and engine config share one engine"""
 
     model_files: dict = {
         GameMode.MJ4P: sub_file("", model_path)
     }
-    bot = BotMortalLocal(model_files)
+    bot = BotMortalLocal(model_files, engine_config)
 
     return bot
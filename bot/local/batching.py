@@ -0,0 +1,142 @@
+""" Micro-batching scheduler in front of a Mortal engine
+
+libriichi calls engine.react_batch() separately for every bot, usually with a single row.
+BatchingEngine collects the pending calls from all bots (and tables) in the process for a short
+window, runs them as one stacked forward pass and hands each caller its own rows back.
+"""
+import os
+import threading
+import time
+import weakref
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+class _BatchRequest:
+    """ one pending react_batch call"""
+    __slots__ = ("obs", "masks", "invisible_obs", "size", "result", "error", "done")
+
+    def __init__(self, obs, masks, invisible_obs) -> None:
+        self.obs = obs
+        self.masks = masks
+        self.invisible_obs = invisible_obs
+        self.size:int = len(masks)
+        self.result:tuple = None
+        self.error:Exception = None
+        self.done = threading.Event()
+
+
+class BatchingEngine:
+    """ Engine wrapper merging concurrent react_batch calls into one forward pass.
+    Exposes the same attributes and react_batch contract as the wrapped engine, so it can be
+    handed to libriichi in place of it."""
+    def __init__(self, engine, window_ms:float=2.0, max_batch:int=16) -> None:
+        """ params:
+            engine(MortalEngine): the engine doing the actual evaluation
+            window_ms(float): max time to wait for more requests after the first one arrives
+            max_batch(int): flush immediately once this many rows are pending"""
+        self.engine = engine
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+
+        # stats
+        self.n_batches:int = 0
+        self.n_rows:int = 0
+        self._start()
+        if hasattr(os, "register_at_fork"):
+            # threads do not survive fork: a forked worker process needs its own scheduler thread
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: ref() and ref()._start())
+
+    def _start(self):
+        self._cond = threading.Condition()
+        self._pending:list[_BatchRequest] = []
+        self._pending_rows:int = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="engine-batcher", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        # engine attributes read by libriichi (name, version, is_oracle, ...)
+        return getattr(self.engine, name)
+
+    @property
+    def mean_batch_size(self) -> float:
+        """ average number of rows per forward pass so far"""
+        return self.n_rows / self.n_batches if self.n_batches else 0.0
+
+    def react_batch(self, obs, masks, invisible_obs):
+        """ queue the rows and block until the batch containing them has been evaluated"""
+        req = _BatchRequest(obs, masks, invisible_obs)
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("BatchingEngine is closed")
+            self._pending.append(req)
+            self._pending_rows += req.size
+            self._cond.notify()
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def close(self):
+        """ stop the scheduler thread. Pending requests are still evaluated"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    def _take_batch(self) -> list[_BatchRequest]:
+        """ wait for the first request, then for the window to pass or the batch to fill up"""
+        with self._cond:
+            while not self._pending and self._running:
+                self._cond.wait()
+            if not self._pending:
+                return []
+            deadline = time.monotonic() + self.window
+            while self._running and self._pending_rows < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            # take whole requests up to max_batch rows (at least one request)
+            batch = []
+            rows = 0
+            while self._pending and (not batch or rows + self._pending[0].size <= self.max_batch):
+                req = self._pending.pop(0)
+                batch.append(req)
+                rows += req.size
+            self._pending_rows -= rows
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._evaluate(batch)
+
+    def _evaluate(self, batch:list[_BatchRequest]):
+        obs = [o for req in batch for o in req.obs]
+        masks = [m for req in batch for m in req.masks]
+        if any(req.invisible_obs is None for req in batch):
+            invisible_obs = None
+        else:
+            invisible_obs = [o for req in batch for o in req.invisible_obs]
+        try:
+            actions, q_out, masks_out, is_greedy = self.engine.react_batch(obs, masks, invisible_obs)
+        except Exception as e:     # pylint: disable=broad-except
+            LOGGER.error("Batched engine evaluation failed: %s", e, exc_info=True)
+            for req in batch:
+                req.error = e
+                req.done.set()
+            return
+
+        self.n_batches += 1
+        self.n_rows += len(masks)
+        start = 0
+        for req in batch:
+            end = start + req.size
+            req.result = (actions[start:end], q_out[start:end], masks_out[start:end], is_greedy[start:end])
+            req.done.set()
+            start = end
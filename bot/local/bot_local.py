@@ -2,31 +2,60 @@
 
 from pathlib import Path
 import threading
+import weakref
 import logging
 from common.utils import LocalModelException
 LOGGER = logging.getLogger(__name__)
-from bot.local.engine import get_engine
+from bot.local.registry import acquire_engine, release_engine
+from bot.local.config import EngineConfig
 from bot.bot import BotMjai, GameMode
 
 
 class BotMortalLocal(BotMjai):
     """ Mortal model based mjai bot"""
-    def __init__(self, model_files:dict[GameMode, str]) -> None:
+    def __init__(self, model_files:dict[GameMode, str], engine_config:EngineConfig=None) -> None:
         """ params:
         model_files(dicty): model files for different modes {mode, file_path}
+        engine_config(EngineConfig): settings for the engines, None for defaults
+        The engines are acquired on first use or by load(), not here: building the bot stays cheap
         """
         super().__init__("Local Mortal Bot")   
         self._supported_modes: list[GameMode] = []  
         self.model_files = model_files
+        self.engine_config = engine_config or EngineConfig()
         self._engines:dict[GameMode, any] = {}
+        self._loaded:bool = False
+        self._load_lock = threading.Lock()
         for k,v in model_files.items():
             if not Path(v).exists() or not Path(v).is_file():
                 # test file exists
                 LOGGER.warning("Cannot find model file for mode %s:%s", k,v)
             else:
+                self._supported_modes.append(k)
+        if not self._supported_modes:
+            raise LocalModelException("No valid model files found")
+        
+        self.mjai_bot = None
+        # thread lock for mjai.bot access
+        # "mutable borrow" issue when running multiple methods at the same time        
+        self.lock = threading.Lock()
+
+    def load(self):
+        """ Acquire the engines of the supported modes (loading the models if this is the first bot
+        of the process to use them). Called on first use if not before; thread safe
+        raises:
+            LocalModelException: if no engine can be created"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            for k in self._supported_modes:
                 if k == GameMode.MJ4P:
                     try:
-                        self._engines[k] = get_engine(self.model_files[k])
+                        # engines are shared by all bots in the process, released when this bot is collected
+                        self._engines[k] = acquire_engine(self.model_files[k], self.engine_config)
+                        weakref.finalize(self, release_engine, self.model_files[k], self.engine_config)
                     except Exception as e:
                         LOGGER.warning("Cannot create engine for mode %s: %s", k, e, exc_info=True)
                 elif k == GameMode.MJ3P:
@@ -37,15 +66,10 @@ class BotMortalLocal(BotMjai):
                         self._engines[k] = get_engine_3p(self.model_files[k])
                     except Exception as e: # pylint: disable=broad-except
                         LOGGER.warning("Cannot create engine for mode %s: %s", k, e, exc_info=True)
-        self._supported_modes = list(self._engines.keys())
-        if not self._supported_modes:
-            raise LocalModelException("No valid model files found")
-        
-        self.mjai_bot = None
-        self.ignore_next_turn_self_reach:bool = False
-        # thread lock for mjai.bot access
-        # "mutable borrow" issue when running multiple methods at the same time        
-        self.lock = threading.Lock()
+            if not self._engines:
+                raise LocalModelException("No engine could be created")
+            self._supported_modes = list(self._engines.keys())
+            self._loaded = True
     
     @property 
     def supported_modes(self) -> list[GameMode]:
@@ -53,5 +77,6 @@ class BotMortalLocal(BotMjai):
     
     
     def _get_engine(self, mode: GameMode):
+        self.load()
         return self._engines.get(mode, None)
     
\ No newline at end of file
@@ -0,0 +1,98 @@
+""" Observation-keyed LRU cache of engine q values
+
+Rows are keyed by a blake2b digest of the observation and mask bytes. Only q values are cached,
+action selection (greedy or Boltzmann sampling) still runs on every call.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from common.metrics import METRICS
+
+ENTRY_OVERHEAD = 200    # rough bytes per entry for the key, dict slot and tensor object
+
+
+class EvalCache:
+    """ Thread safe LRU cache: row key -> q values, bounded by entry count and / or memory"""
+    def __init__(self, max_entries:int=0, max_mb:float=0, name:str='mortal') -> None:
+        """ params:
+            max_entries(int): max cached rows, 0 for no count limit
+            max_mb(float): max memory of the cached q values in MB, 0 for no memory limit
+            name(str): engine name, label of the metrics"""
+        if max_entries <= 0 and max_mb <= 0:
+            raise ValueError("EvalCache needs max_entries or max_mb")
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 2**20)
+        self.lock = threading.Lock()
+        self._entries:OrderedDict[bytes, object] = OrderedDict()
+        self._bytes = 0
+        self.hits:int = 0
+        self.misses:int = 0
+        self.evictions:int = 0
+        help_str = "engine evaluation cache lookups and evictions"
+        self._c_hit = METRICS.counter("majiang_eval_cache_total", help_str, engine=name, event="hit")
+        self._c_miss = METRICS.counter("majiang_eval_cache_total", help_str, engine=name, event="miss")
+        self._c_evict = METRICS.counter("majiang_eval_cache_total", help_str, engine=name, event="eviction")
+        METRICS.gauge("majiang_eval_cache_entries", lambda: len(self._entries),
+            "rows in the engine evaluation cache", engine=name)
+
+    @staticmethod
+    def key(obs, mask, invisible_obs=None) -> bytes:
+        """ content hash of one row (numpy arrays)"""
+        h = hashlib.blake2b(obs.tobytes(), digest_size=16)
+        h.update(mask.tobytes())
+        if invisible_obs is not None:
+            h.update(invisible_obs.tobytes())
+        return h.digest()
+
+    def get(self, key:bytes):
+        """ cached q values of the row, or None"""
+        with self.lock:
+            q = self._entries.get(key)
+            if q is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        (self._c_miss if q is None else self._c_hit).inc()
+        return q
+
+    def put(self, key:bytes, q):
+        """ cache the q values (a cpu tensor / numpy row) of a row"""
+        size = self._size(q)
+        evicted = 0
+        with self.lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+            self._entries[key] = q
+            self._bytes += size
+            while self._entries and (
+                (self.max_entries and len(self._entries) > self.max_entries)
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                _, q_old = self._entries.popitem(last=False)
+                self._bytes -= self._size(q_old)
+                evicted += 1
+            self.evictions += evicted
+        if evicted:
+            self._c_evict.inc(evicted)
+
+    @staticmethod
+    def _size(q) -> int:
+        if hasattr(q, 'nbytes'):
+            return q.nbytes + ENTRY_OVERHEAD
+        return q.numel() * q.element_size() + ENTRY_OVERHEAD
+
+    def stats(self) -> dict:
+        """ counters and size of the cache"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "mb": self._bytes / 2**20,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
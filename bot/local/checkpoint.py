@@ -0,0 +1,155 @@
+""" Slim inference checkpoints
+
+A training checkpoint holds optimizer / training state next to the weights, and torch.load
+unpickles and copies all of it into every process. convert() keeps only the Brain and DQN
+weights and the config fields needed to build them, saved in torch's zip format so that
+load_state() can memory-map it (torch >= 2.1): tensors are backed by the page cache, shared between
+worker processes, and only paged in when used.
+By default convert() writes the weights of the fused Brain (folded batch norms, see bot.local.model_infer),
+which the engine then takes as loaded, so the default engine keeps them mapped too. fp32 and bf16
+(autocast casts per call) use the weights as loaded; int8 quantization and compiled graphs build new
+weights in the private memory of each process. measure_load() shows how much.
+
+usage: python -m bot.local.checkpoint model.pth model.slim.pth      # convert and compare loading
+       python -m bot.local.checkpoint --measure model.pth           # load time / RSS of one file
+       python -m bot.local.checkpoint --measure --no-fuse model.slim.pth    # ... of the engine without fusing
+"""
+import json
+import logging
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import torch
+from bot.local.config import EngineConfig
+LOGGER = logging.getLogger(__name__)
+
+SLIM_FORMAT = 'mortal-slim-1'
+FUSED_FORMAT = 'mortal-slim-fused-1'     # the 'mortal' weights are those of a FusedBrain
+ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+def convert(src:str, dst:str, fused:bool=True) -> dict:
+    """ write the inference-only checkpoint of src to dst
+    params:
+        fused(bool): write the weights of the fused Brain, if it passes the check against the original
+    returns:
+        dict: the header written: format and config (version, conv_channels, num_blocks)"""
+    state = torch.load(src, map_location='cpu')
+    config = {
+        'control': {'version': state['config']['control']['version']},
+        'resnet': {
+            'conv_channels': state['config']['resnet']['conv_channels'],
+            'num_blocks': state['config']['resnet']['num_blocks'],
+        },
+    }
+    fmt, mortal = SLIM_FORMAT, state['mortal']
+    if state.get('format') == FUSED_FORMAT:
+        fmt = FUSED_FORMAT
+    elif fused:
+        from bot.local.engine import load_model
+        from bot.local.model_infer import FusedBrain, fuse_brain_checked
+        device = torch.device('cpu')
+        brain, dqn, version = load_model(src, device)
+        brain = fuse_brain_checked(brain, dqn, version, device)
+        if isinstance(brain, FusedBrain):
+            fmt, mortal = FUSED_FORMAT, brain.state_dict()
+    # clone: a view would make torch.save write its whole (training) storage
+    slim = {
+        'format': fmt,
+        'config': config,
+        'mortal': {k: v.detach().clone().contiguous() for k, v in mortal.items()},
+        'current_dqn': {k: v.detach().clone().contiguous() for k, v in state['current_dqn'].items()},
+    }
+    torch.save(slim, dst)
+    return {'format': fmt, 'config': config}
+
+
+def load_state(model_file:str, device:torch.device) -> dict:
+    """ Load a checkpoint for inference. Slim (and other zip format) checkpoints are memory-mapped
+    on cpu instead of being read into memory; other files fall back to a regular torch.load"""
+    try:
+        state = torch.load(model_file, map_location='cpu', mmap=True, weights_only=True)
+    except Exception as e:      # pylint: disable=broad-except
+        # legacy (non zip) format, or pickled training objects that weights_only refuses
+        LOGGER.debug("Cannot memory-map %s (%s), loading it fully", model_file, e)
+        return torch.load(model_file, map_location=device)
+    if state.get('format') not in (SLIM_FORMAT, FUSED_FORMAT):
+        LOGGER.info("%s is a full checkpoint, convert it with bot.local.checkpoint for faster loading", model_file)
+    return state
+
+
+def _rss_mb(field:str='VmRSS') -> float:
+    """ resident memory of this process in MB: VmRSS (all), RssFile (mapped files) or RssAnon (private)"""
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if field != 'VmRSS':
+        return float('nan')
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure_here(model_file:str, compile_mode:str=None, precision:str='fp32', fused:bool=True) -> dict:
+    from bot.local.engine import get_engine
+    rss0 = {f: _rss_mb(f) for f in ('VmRSS', 'RssFile', 'RssAnon')}
+    start = time.perf_counter()
+    # one forward pass (the warm-up) reads every weight: the memory a running engine ends up with
+    engine = get_engine(model_file, 'cpu', compile_mode, (1,), precision, fused)
+    seconds = time.perf_counter() - start
+    n_bytes = sum(t.numel() * t.element_size()
+        for m in (engine.brain, engine.dqn) for t in m.state_dict().values() if isinstance(t, torch.Tensor))
+    return {'seconds': seconds, 'weights_mb': n_bytes / 2**20,
+            'rss_mb': _rss_mb('VmRSS') - rss0['VmRSS'],
+            'rss_file_mb': _rss_mb('RssFile') - rss0['RssFile'],
+            'rss_anon_mb': _rss_mb('RssAnon') - rss0['RssAnon']}
+
+
+def measure_load(model_file:str, config:EngineConfig=None) -> dict:
+    """ time and RSS growth of get_engine() with the settings of config (on cpu) in a fresh interpreter
+    (cold process, warm page cache). Weights that stay memory-mapped show up in rss_file_mb and are
+    shared between processes, copies (weights fused at load, quantized or compiled) in rss_anon_mb"""
+    config = config or EngineConfig()
+    args = f"{model_file!r}, {config.compile_mode!r}, {config.precision!r}, {config.fused!r}"
+    code = f"import json; from bot.local.checkpoint import _measure_here; print(json.dumps(_measure_here({args})))"
+    proc = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def report(results:dict[str, dict]) -> str:
+    """ table of measure_load() results per file"""
+    lines = [f"{'file':<40}{'size MB':>9}{'weights MB':>12}{'load s':>8}"
+             f"{'RSS MB':>8}{'mapped MB':>11}{'private MB':>12}"]
+    for path, r in results.items():
+        size = Path(path).stat().st_size / 2**20
+        lines.append(f"{Path(path).name:<40}{size:>9.1f}{r['weights_mb']:>12.1f}{r['seconds']:>8.3f}"
+                     f"{r['rss_mb']:>8.1f}{r['rss_file_mb']:>11.1f}{r['rss_anon_mb']:>12.1f}")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert a Mortal checkpoint to the slim inference format")
+    parser.add_argument("src", help="Mortal checkpoint")
+    parser.add_argument("dst", nargs="?", help="output file (default: <src>.slim.pth)")
+    parser.add_argument("--measure", help="only report load time / RSS of src", action="store_true")
+    parser.add_argument("--compile", dest="compile_mode", choices=["trace", "inductor"], default=None,
+        help="measure the engine compiled in this mode (default: eager)")
+    parser.add_argument("--precision", choices=["fp32", "bf16", "int8"], default="fp32",
+        help="measure the engine in this precision (default: fp32)")
+    parser.add_argument("--no-fuse", dest="fused", action="store_false",
+        help="write the weights of the original Brain / measure the engine without the fused (inference-only) Brain")
+    args = parser.parse_args()
+    engine_config = EngineConfig(compile_mode=args.compile_mode, precision=args.precision, fused=args.fused)
+    if args.measure:
+        print(report({args.src: measure_load(args.src, engine_config)}))
+    else:
+        dst = args.dst or str(Path(args.src).with_suffix('.slim.pth'))
+        header = convert(args.src, dst, args.fused)
+        print(f"wrote {dst}: {header['format']} {header['config']}")
+        print(report({args.src: measure_load(args.src, engine_config), dst: measure_load(dst, engine_config)}))
@@ -0,0 +1,40 @@
+""" Engine configuration for local Mortal bots
+kept free of heavy imports so it can be used before torch is loaded
+"""
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class EngineConfig:
+    """ Settings for building a local Mortal engine.
+    Bots with equal configs (and the same model file) share one engine in the process"""
+    device:str = None               # torch device name, None to pick automatically
+    batch_window_ms:float = 0       # micro-batching window across bots, 0 to disable batching
+    max_batch:int = 16              # flush a micro-batch as soon as it has this many rows
+    compile_mode:str = None         # None for eager mode, 'trace' (TorchScript) or 'inductor' (torch.compile)
+    precision:str = 'fp32'          # 'fp32', 'bf16' (autocast) or 'int8' (dynamic quantization, cpu only)
+    fused:bool = True               # fold batch norms / fuse attention for inference (bot.local.model_infer)
+    warmup:bool = True              # warm up the engine over the expected batch sizes when loading it
+    intra_op_threads:int = 0        # threads inside one op (torch: process-wide / ORT: per session), 0 for the library default
+    inter_op_threads:int = 0        # threads across ops (torch / ORT), 0 for the library default
+    inference_cpus:tuple = ()       # cpu ids evaluations run on, () for no pinning
+    cache_entries:int = 0           # max rows in the q value cache (bot.local.cache), 0 for no count limit
+    cache_mb:float = 0              # max memory of the q value cache in MB, 0 for no memory limit
+    quick_eval:bool = True          # answer rows with a single legal action without a forward pass
+    always_hora:bool = False        # always take hora when it is legal, without a forward pass
+    agari_guard:bool = False        # libriichi's rule-based agari guard (Mortal's enable_rule_based_agari_guard)
+
+    def warmup_batch_sizes(self) -> tuple:
+        """ batch sizes the engine is expected to see: 1 without micro-batching,
+        otherwise powers of 2 up to max_batch"""
+        if not self.warmup:
+            return ()
+        if self.batch_window_ms <= 0:
+            return (1,)
+        sizes = []
+        size = 1
+        while size < self.max_batch:
+            sizes.append(size)
+            size *= 2
+        sizes.append(self.max_batch)
+        return tuple(sizes)
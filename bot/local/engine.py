@@ -1,8 +1,16 @@
 """ Mortal Engine for 4p game"""
+import contextlib
+import logging
+import time
 import torch
 import numpy as np
 from torch.distributions import Normal, Categorical
-from bot.local.model import Brain, DQN
+from bot.local.model import Brain, DQN, libriichi
+from bot.local.precision import apply_precision
+from bot.local.checkpoint import FUSED_FORMAT, load_state
+from bot.local.quick_eval import SKIP_REASONS, trivial_rows
+from common.metrics import METRICS, Stages
+LOGGER = logging.getLogger(__name__)
 
 class MortalEngine:
     """ Mortal Engine for local Bot 4p"""
@@ -15,8 +23,10 @@ class MortalEngine:
         device = None,
         stochastic_latent = False,
         enable_amp = False,
+        amp_dtype = None,
         enable_quick_eval = True,
         enable_rule_based_agari_guard = False,
+        enable_always_hora = False,
         name = 'NoName',
         boltzmann_epsilon = 0,
         boltzmann_temp = 1,
@@ -32,51 +42,137 @@ class MortalEngine:
         self.stochastic_latent = stochastic_latent
 
         self.enable_amp = enable_amp
+        self.amp_dtype = amp_dtype      # autocast dtype, None for the device default
         self.enable_quick_eval = enable_quick_eval
         self.enable_rule_based_agari_guard = enable_rule_based_agari_guard
+        self.enable_always_hora = enable_always_hora   # see bot.local.quick_eval
         self.name = name
 
         self.boltzmann_epsilon = boltzmann_epsilon
         self.boltzmann_temp = boltzmann_temp
         self.top_p = top_p
+        self.stages = Stages(engine=name)
+        self._n_skipped = {r: METRICS.counter("majiang_forward_skipped_total",
+            "rows answered without a forward pass", engine=name, reason=r) for r in SKIP_REASONS}
+        self.net = None     # compiled brain -> dqn graph (see bot.local.inference), None for eager mode
+        # EvalCache of q values (see bot.local.cache), None to always run the network.
+        # ignored by stochastic_latent engines, whose q values are sampled per call
+        self.cache = None
+        self._observers:tuple = ()     # see add_observer()
+
+    def add_observer(self, observer):
+        """ call observer(obs, masks, invisible_obs) with every batch passed to react_batch, before
+        it is evaluated (e.g. to capture observations). Must not modify the arrays"""
+        self._observers = self._observers + (observer,)
+
+    def remove_observer(self, observer):
+        """ stop calling an observer added by add_observer()"""
+        self._observers = tuple(o for o in self._observers if o is not observer)
 
     def react_batch(self, obs, masks, invisible_obs):
+        for observer in self._observers:
+            observer(obs, masks, invisible_obs)
         with (
-            torch.autocast(self.device.type, enabled=self.enable_amp),
+            torch.autocast(self.device.type, dtype=self.amp_dtype, enabled=self.enable_amp),
             torch.no_grad(),
         ):
             return self._react_batch(obs, masks, invisible_obs)
 
     def _react_batch(self, obs, masks, invisible_obs):
-        obs = torch.as_tensor(np.stack(obs, axis=0), device=self.device)
+        t0 = time.perf_counter()
+        batch_size = len(masks)
+        # rows answered without the network: trivial decisions, then cache hits
+        trivial = trivial_rows(masks, self.enable_quick_eval, self.enable_always_hora)
+        todo = [i for i in range(batch_size) if i not in trivial]
+        for _, reason in trivial.values():
+            self._n_skipped[reason].inc()
+        cached = {}
+        # q values of stochastic_latent engines are sampled per call: never cached
+        cache = None if self.stochastic_latent else self.cache
+        if cache is not None:
+            # oracle rows also depend on the invisible obs
+            keys = {i: cache.key(obs[i], masks[i], invisible_obs[i] if self.is_oracle else None) for i in todo}
+            for i in todo:
+                q = cache.get(keys[i])
+                if q is not None:
+                    cached[i] = q
+            todo = [i for i in todo if i not in cached]
         masks = torch.as_tensor(np.stack(masks, axis=0), device=self.device)
-        invisible_obs = None
-        if self.is_oracle:
-            invisible_obs = torch.as_tensor(np.stack(invisible_obs, axis=0), device=self.device)
-        batch_size = obs.shape[0]
+        if todo:
+            obs = torch.as_tensor(np.stack([obs[i] for i in todo], axis=0), device=self.device)
+            if self.is_oracle:
+                invisible_obs = torch.as_tensor(np.stack([invisible_obs[i] for i in todo], axis=0), device=self.device)
+        if not self.is_oracle:
+            invisible_obs = None
+        t1 = time.perf_counter()
 
-        match self.version:
-            case 1:
-                mu, logsig = self.brain(obs, invisible_obs)
-                if self.stochastic_latent:
-                    latent = Normal(mu, logsig.exp() + 1e-6).sample()
-                else:
-                    latent = mu
-                q_out = self.dqn(latent, masks)
-            case 2 | 3 | 4:
-                phi = self.brain(obs)
-                q_out = self.dqn(phi, masks)
+        if len(todo) == batch_size:
+            q_out = self._forward(obs, masks, invisible_obs).float()
+        else:
+            # same layout as the dqn output: illegal actions are -inf
+            q_out = torch.full(masks.shape, -torch.inf, dtype=torch.float32, device=self.device)
+            for i, (action, _) in trivial.items():
+                q_out[i, action] = 0.
+            for i, q in cached.items():
+                q_out[i] = q
+            if todo:
+                q_todo = self._forward(obs, masks[todo], invisible_obs).float()
+                q_out[todo] = q_todo
+                if cache is not None:
+                    for i, q in zip(todo, q_todo.cpu()):
+                        cache.put(keys[i], q.clone())
 
         if self.boltzmann_epsilon > 0:
             is_greedy = torch.full((batch_size,), 1-self.boltzmann_epsilon, device=self.device).bernoulli().to(torch.bool)
             logits = (q_out / self.boltzmann_temp).masked_fill(~masks, -torch.inf)
             sampled = sample_top_p(logits, self.top_p)
+            if trivial:
+                is_greedy[list(trivial)] = True
             actions = torch.where(is_greedy, q_out.argmax(-1), sampled)
         else:
             is_greedy = torch.ones(batch_size, dtype=torch.bool, device=self.device)
             actions = q_out.argmax(-1)
+        t2 = time.perf_counter()
+
+        result = actions.tolist(), q_out.tolist(), masks.tolist(), is_greedy.tolist()
+        self.stages.observe("tensor_build", t1 - t0)
+        self.stages.observe("forward", t2 - t1)
+        self.stages.observe("tolist", time.perf_counter() - t2)
+        return result
+
+    def _forward(self, obs, masks, invisible_obs):
+        if self.net is not None:
+            return self.net(obs, masks)
+        match self.version:
+            case 1:
+                mu, logsig = self.brain(obs, invisible_obs)
+                if self.stochastic_latent:
+                    latent = Normal(mu, logsig.exp() + 1e-6).sample()
+                else:
+                    latent = mu
+                return self.dqn(latent, masks)
+            case 2 | 3 | 4:
+                phi = self.brain(obs)
+                return self.dqn(phi, masks)
 
-        return actions.tolist(), q_out.tolist(), masks.tolist(), is_greedy.tolist()
+    def warmup(self, batch_sizes:tuple=(1,)):
+        """ run the forward pass once per batch size, so that the first decisions of a game
+        do not pay for allocator / dispatch (or compilation) warm-up"""
+        from bot.local.inference import example_inputs
+        start = time.perf_counter()
+        with (
+            torch.autocast(self.device.type, dtype=self.amp_dtype, enabled=self.enable_amp),
+            torch.no_grad(),
+        ):
+            for size in batch_sizes:
+                obs, masks = example_inputs(self.version, size, self.device)
+                invisible_obs = None
+                if self.is_oracle:
+                    invisible_obs = torch.zeros(
+                        (size, *libriichi.consts.oracle_obs_shape(self.version)), device=self.device)
+                self._forward(obs, masks, invisible_obs).tolist()
+        LOGGER.info("Warmed up engine %s for batch sizes %s in %.2f s",
+            self.name, list(batch_sizes), time.perf_counter() - start)
 
 def sample_top_p(logits, p):
     if p >= 1:
@@ -91,36 +187,116 @@ def sample_top_p(logits, p):
     sampled = probs_idx.gather(-1, probs_sort.multinomial(1)).squeeze(-1)
     return sampled
 
-def get_engine(model_file:str) -> MortalEngine:
-    """ Create and return Mortal engine object
-    params:
-        model_file(str): Mortal model file path"""
+def resolve_device(device:str=None) -> torch.device:
+    """ return torch device for the given name, or the best available device if None"""
+    if device:
+        return torch.device(device)
     # check if GPU is available
     if torch.cuda.is_available():
-        device = torch.device('cuda')
-    else:
-        device = torch.device('cpu')
+        return torch.device('cuda')
+    return torch.device('cpu')
+
+def set_torch_threads(intra_op_threads:int=0, inter_op_threads:int=0):
+    """ set the process-wide torch thread pools, 0 keeps the torch default.
+    inter-op threads can only be set before torch runs any inter-op parallel work"""
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0 and torch.get_num_interop_threads() != inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            LOGGER.warning("Cannot set torch inter-op threads to %d: %s", inter_op_threads, e)
+
+@contextlib.contextmanager
+def single_threaded(enabled:bool=True):
+    """ run torch ops inline on the calling thread, so that no intra-op (OpenMP) thread pool
+    is started, e.g. in a process that forks workers afterwards"""
+    if not enabled:
+        yield
+        return
+    n_threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(n_threads)
 
-    # Get the path of control_state_file = current directory / control_state_file
-    state = torch.load(model_file, map_location=device)
+def load_model(model_file:str, device:torch.device) -> tuple[Brain, DQN, int]:
+    """ load Brain and DQN (in eval mode) from a Mortal checkpoint
+    returns:
+        (brain, dqn, model version). brain is a FusedBrain for checkpoints converted fused (see bot.local.checkpoint)"""
+    state = load_state(model_file, device)
+    version = state['config']['control']['version']
+    fused = state.get('format') == FUSED_FORMAT
 
-    mortal = Brain(version=state['config']['control']['version'],
-        conv_channels=state['config']['resnet']['conv_channels'],
-        num_blocks=state['config']['resnet']['num_blocks']).eval()
-    dqn = DQN(version=state['config']['control']['version']).eval()
-    mortal.load_state_dict(state['mortal'])
-    dqn.load_state_dict(state['current_dqn'])
+    def build():
+        mortal = Brain(version=version,
+            conv_channels=state['config']['resnet']['conv_channels'],
+            num_blocks=state['config']['resnet']['num_blocks']).eval()
+        if fused:
+            # same module tree as the fused weights were saved from
+            from bot.local.model_infer import fuse_brain
+            mortal = fuse_brain(mortal)
+        return mortal, DQN(version=version).eval()
+
+    try:
+        # modules are built on the meta device and take the loaded (possibly memory-mapped) tensors as is
+        with torch.device('meta'):
+            mortal, dqn = build()
+        mortal.load_state_dict(state['mortal'], assign=True)
+        dqn.load_state_dict(state['current_dqn'], assign=True)
+    except TypeError:
+        # torch < 2.1 has no assign=: the weights are copied into regular parameters
+        LOGGER.info("load_state_dict(assign=True) needs torch >= 2.1, copying the weights of %s", model_file)
+        mortal, dqn = build()
+        mortal.load_state_dict(state['mortal'])
+        dqn.load_state_dict(state['current_dqn'])
+    return mortal, dqn, version
+
+def get_engine(model_file:str, device:str=None, compile_mode:str=None,
+    warmup_batch_sizes:tuple=(1,), precision:str='fp32', fused:bool=True,
+    cache_entries:int=0, cache_mb:float=0, quick_eval:bool=True, always_hora:bool=False,
+    agari_guard:bool=False) -> MortalEngine:
+    """ Create and return Mortal engine object
+    params:
+        model_file(str): Mortal model file path
+        device(str): torch device name, e.g. 'cpu'/'cuda'. None to pick automatically
+        compile_mode(str): None for eager mode, 'trace' (TorchScript) or 'inductor' (torch.compile)
+        warmup_batch_sizes(tuple): batch sizes to warm up before returning, empty to skip
+        precision(str): 'fp32', 'bf16' (autocast) or 'int8' (dynamic quantization of nn.Linear, cpu only)
+        fused(bool): use the inference-only Brain variant (see bot.local.model_infer).
+            checkpoints converted fused (see bot.local.checkpoint) hold it already and are used as loaded
+        cache_entries(int), cache_mb(float): bounds of the q value cache (see bot.local.cache), both 0 to disable
+        quick_eval(bool), always_hora(bool): answer trivial decisions without the network (see bot.local.quick_eval)
+        agari_guard(bool): enable libriichi's rule-based agari guard"""
+    device = resolve_device(device)
+    mortal, dqn, version = load_model(model_file, device)
+    mortal, dqn, amp_dtype = apply_precision(mortal, dqn, precision, device)
 
     engine = MortalEngine(
         mortal,
         dqn,
         is_oracle = False,
         device = device,
-        enable_amp = False,
-        enable_quick_eval = False,
-        enable_rule_based_agari_guard = False,
+        enable_amp = amp_dtype is not None,
+        amp_dtype = amp_dtype,
+        enable_quick_eval = quick_eval,
+        enable_rule_based_agari_guard = agari_guard,
+        enable_always_hora = always_hora,
         name = 'mortal',
-        version = state['config']['control']['version'],
+        version = version,
     )
+    if fused:
+        from bot.local.model_infer import FusedBrain, fuse_brain_checked
+        if not isinstance(engine.brain, FusedBrain):
+            engine.brain = fuse_brain_checked(engine.brain, engine.dqn, version, device)
+    if compile_mode:
+        from bot.local.inference import build_compiled_net
+        engine.net = build_compiled_net(engine.brain, engine.dqn, engine.version, compile_mode, device)
+    if warmup_batch_sizes:
+        engine.warmup(warmup_batch_sizes)
+    if cache_entries > 0 or cache_mb > 0:
+        from bot.local.cache import EvalCache
+        engine.cache = EvalCache(cache_entries, cache_mb, name=engine.name)
 
     return engine
\ No newline at end of file
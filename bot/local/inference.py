@@ -0,0 +1,104 @@
+""" Compiled inference path for the Mortal brain -> dqn graph
+
+InferenceNet wraps Brain + DQN of any version (1~4) into one module (obs, masks) -> q values,
+which can be compiled with TorchScript tracing ('trace') or torch.compile ('inductor').
+The compiled net is checked against eager mode before the engine uses it.
+"""
+import logging
+import time
+
+import torch
+from torch import nn, Tensor
+
+from bot.local.model import Brain, DQN, libriichi
+LOGGER = logging.getLogger(__name__)
+
+COMPILE_MODES = ('trace', 'inductor')
+
+
+class InferenceNet(nn.Module):
+    """ brain -> dqn graph for deterministic inference (version 1 uses the latent mean)"""
+    def __init__(self, brain:Brain, dqn:DQN, version:int):
+        super().__init__()
+        self.brain = brain
+        self.dqn = dqn
+        self.version = version
+
+    def forward(self, obs:Tensor, masks:Tensor) -> Tensor:
+        if self.version == 1:
+            mu, _ = self.brain(obs)
+            return self.dqn(mu, masks)
+        return self.dqn(self.brain(obs), masks)
+
+
+def example_inputs(version:int, batch_size:int, device:torch.device, seed:int=0) -> tuple[Tensor, Tensor]:
+    """ random (obs, masks) of the given batch size, every row with at least one legal action"""
+    gen = torch.Generator().manual_seed(seed)
+    obs = torch.rand((batch_size, *libriichi.consts.obs_shape(version)), generator=gen)
+    masks = torch.rand((batch_size, libriichi.consts.ACTION_SPACE), generator=gen) < 0.3
+    masks[:, -1] = True
+    return obs.to(device), masks.to(device)
+
+
+def compile_net(net:InferenceNet, mode:str, device:torch.device) -> nn.Module:
+    """ compile the net with TorchScript tracing ('trace') or torch.compile ('inductor')"""
+    obs, masks = example_inputs(net.version, 2, device)
+    match mode:
+        case 'trace':
+            with torch.no_grad():
+                compiled = torch.jit.trace(net, (obs, masks), check_trace=False)
+            compiled = torch.jit.freeze(compiled)
+            try:
+                compiled = torch.jit.optimize_for_inference(compiled)
+            except Exception as e:      # pylint: disable=broad-except
+                LOGGER.warning("optimize_for_inference failed, using the frozen trace: %s", e)
+            return compiled
+        case 'inductor':
+            # compiles lazily on the first calls, i.e. during warm-up
+            return torch.compile(net, dynamic=True)
+        case _:
+            raise ValueError(f'Unexpected compile mode {mode}, expected one of {COMPILE_MODES}')
+
+
+def max_abs_diff(expected:Tensor, actual:Tensor) -> float:
+    """ max abs difference of q values. Masked entries (-inf) must match exactly"""
+    finite = expected.isfinite()
+    if not torch.equal(finite, actual.isfinite()):
+        return float('inf')
+    if not finite.any():
+        return 0.0
+    return (expected[finite] - actual[finite]).abs().max().item()
+
+
+def check_against_eager(eager:nn.Module, compiled:nn.Module, version:int, device:torch.device,
+    batch_sizes:tuple=(1, 4), atol:float=1e-3) -> float:
+    """ compare compiled and eager outputs on random inputs
+    returns:
+        float: the max abs difference seen
+    raises:
+        RuntimeError: if the difference is above atol"""
+    worst = 0.0
+    with torch.no_grad():
+        for i, size in enumerate(batch_sizes):
+            obs, masks = example_inputs(version, size, device, seed=i + 1)
+            worst = max(worst, max_abs_diff(eager(obs, masks), compiled(obs, masks)))
+    if worst > atol:
+        raise RuntimeError(f'compiled net differs from eager mode by {worst:.3g} (> {atol})')
+    return worst
+
+
+def build_compiled_net(brain:Brain, dqn:DQN, version:int, mode:str, device:torch.device) -> nn.Module | None:
+    """ Compile the brain -> dqn graph and check it against eager mode.
+    returns:
+        nn.Module: the compiled net, or None if compiling failed or the check did not pass (eager mode is used)"""
+    eager = InferenceNet(brain, dqn, version).eval()
+    start = time.perf_counter()
+    try:
+        compiled = compile_net(eager, mode, device)
+        diff = check_against_eager(eager, compiled, version, device)
+    except Exception as e:      # pylint: disable=broad-except
+        LOGGER.warning("Compiling the model (%s) failed, falling back to eager mode: %s", mode, e)
+        return None
+    LOGGER.info("Compiled model (%s, version %d) in %.2f s, max abs diff vs eager %.2e",
+        mode, version, time.perf_counter() - start, diff)
+    return compiled
@@ -0,0 +1,134 @@
+""" Inference-only variant of the Mortal Brain
+
+fuse_brain() builds a module tree from a loaded (eval mode) Brain that computes the same outputs with less work:
+- BatchNorm1d directly after a Conv1d is folded into the conv weights / bias
+- other BatchNorm1d (pre-activation ones, applied before the residual split) become a per-channel affine
+- ChannelAttention runs its shared MLP once on the stacked avg / max pooled inputs
+- no running stats, momentum or freeze_bn state is kept
+"""
+#pylint:disable=no-member, C0115, C0116
+import logging
+from typing import Optional, Tuple, Union
+import torch
+from torch import nn, Tensor
+
+from bot.local.model import Brain, ChannelAttention, ResBlock
+LOGGER = logging.getLogger(__name__)
+
+
+class Affine(nn.Module):
+    """ eval-mode BatchNorm1d as x * scale + shift"""
+    def __init__(self, bn:nn.BatchNorm1d):
+        super().__init__()
+        scale = bn.weight.detach() / torch.sqrt(bn.running_var + bn.eps)
+        shift = bn.bias.detach() - bn.running_mean * scale
+        self.register_buffer('scale', scale.unsqueeze(-1))
+        self.register_buffer('shift', shift.unsqueeze(-1))
+
+    def forward(self, x):
+        return torch.addcmul(self.shift, x, self.scale)
+
+class FusedChannelAttention(nn.Module):
+    def __init__(self, ca:ChannelAttention):
+        super().__init__()
+        self.shared_mlp = ca.shared_mlp
+
+    def forward(self, x):
+        pooled = torch.stack((x.mean(-1), x.amax(-1)))
+        out = self.shared_mlp(pooled)
+        weight = (out[0] + out[1]).sigmoid()
+        return weight.unsqueeze(-1) * x
+
+class FusedResBlock(nn.Module):
+    def __init__(self, block:ResBlock):
+        super().__init__()
+        self.pre_actv = block.pre_actv
+        self.res_unit = nn.Sequential(*fuse_layers(block.res_unit))
+        self.ca = FusedChannelAttention(block.ca)
+        self.actv = None if block.pre_actv else block.actv
+
+    def forward(self, x):
+        out = self.ca(self.res_unit(x)) + x
+        if self.actv is not None:
+            out = self.actv(out)
+        return out
+
+class FusedBrain(nn.Module):
+    """ drop-in replacement of an eval mode Brain for inference"""
+    def __init__(self, brain:Brain):
+        super().__init__()
+        self.is_oracle = brain.is_oracle
+        self.version = brain.version
+        self.encoder = nn.Sequential(*fuse_layers(brain.encoder.net))
+        self.actv = brain.actv
+        if brain.version == 1:
+            self.latent_net = brain.latent_net
+            self.mu_head = brain.mu_head
+            self.logsig_head = brain.logsig_head
+
+    def forward(self, obs, invisible_obs: Optional[Tensor] = None) -> Union[Tuple[Tensor, Tensor], Tensor]:
+        if self.is_oracle:
+            assert invisible_obs is not None
+            obs = torch.cat((obs, invisible_obs), dim=1)
+        phi = self.encoder(obs)
+        if self.version == 1:
+            latent_out = self.latent_net(phi)
+            return self.mu_head(latent_out), self.logsig_head(latent_out)
+        return self.actv(phi)
+
+
+def fold_bn(conv:nn.Conv1d, bn:nn.BatchNorm1d) -> nn.Conv1d:
+    """ return a conv computing bn(conv(x)) with eval-mode bn statistics"""
+    fused = nn.Conv1d(
+        conv.in_channels, conv.out_channels, conv.kernel_size,
+        stride=conv.stride, padding=conv.padding, dilation=conv.dilation, groups=conv.groups, bias=True,
+    ).to(conv.weight.device)
+    with torch.no_grad():
+        scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+        bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+        fused.weight.copy_(conv.weight * scale.view(-1, 1, 1))
+        fused.bias.copy_((bias - bn.running_mean) * scale + bn.bias)
+    return fused
+
+def fuse_layers(layers:nn.Sequential) -> list[nn.Module]:
+    """ fused copies of a Sequential's layers, see module doc"""
+    mods = list(layers)
+    res = []
+    i = 0
+    while i < len(mods):
+        mod = mods[i]
+        nxt = mods[i + 1] if i + 1 < len(mods) else None
+        if isinstance(mod, nn.Conv1d) and isinstance(nxt, nn.BatchNorm1d):
+            res.append(fold_bn(mod, nxt))
+            i += 2
+            continue
+        if isinstance(mod, nn.BatchNorm1d):
+            res.append(Affine(mod))
+        elif isinstance(mod, ResBlock):
+            res.append(FusedResBlock(mod))
+        elif not isinstance(mod, nn.Identity):
+            res.append(mod)
+        i += 1
+    return res
+
+def fuse_brain(brain:Brain) -> FusedBrain:
+    """ build the inference-only variant of a loaded Brain"""
+    assert not brain.training, "fuse_brain() needs a Brain in eval mode"
+    return FusedBrain(brain).eval().requires_grad_(False)
+
+def fuse_brain_checked(brain:Brain, dqn:nn.Module, version:int, device:torch.device,
+    atol:float=1e-3) -> nn.Module:
+    """ fuse_brain() and compare the brain -> dqn outputs with the original brain on random inputs
+    returns:
+        the fused brain, or the original one if the outputs differ by more than atol"""
+    from bot.local.inference import InferenceNet, check_against_eager
+    fused = fuse_brain(brain)
+    try:
+        diff = check_against_eager(
+            InferenceNet(brain, dqn, version).eval(), InferenceNet(fused, dqn, version).eval(),
+            version, device, atol=atol)
+    except RuntimeError as e:
+        LOGGER.warning("Fused model rejected, using the original one: %s", e)
+        return brain
+    LOGGER.info("Using fused model, max abs diff vs original %.2e", diff)
+    return fused
@@ -0,0 +1,192 @@
+""" ONNX Runtime backend for local Mortal bots
+
+export_onnx() turns a Mortal checkpoint (Brain + DQN, including the masked dueling head)
+into an ONNX graph with a dynamic batch axis. OnnxMortalEngine runs that graph on the
+ONNX Runtime CPU provider with the same react_batch contract as MortalEngine, so libriichi
+can use it as a drop-in replacement. Running an exported model needs numpy and onnxruntime
+only, no torch.
+
+export: python -m bot.local.onnx_engine model.pth model.onnx
+"""
+import logging
+import time
+
+import numpy as np
+import onnxruntime as ort
+
+from bot.local.quick_eval import SKIP_REASONS, trivial_rows
+from common.metrics import METRICS, Stages
+LOGGER = logging.getLogger(__name__)
+
+META_VERSION = 'mortal_version'
+
+
+class OnnxMortalEngine:
+    """ Mortal engine running an exported graph on ONNX Runtime (greedy actions only)"""
+    def __init__(
+        self,
+        onnx_file:str,
+        name:str = 'mortal',
+        intra_op_threads:int = 0,
+        inter_op_threads:int = 0,
+        quick_eval:bool = True,
+        always_hora:bool = False,
+        agari_guard:bool = False,
+    ):
+        """ params:
+            onnx_file(str): graph exported with export_onnx()
+            intra_op_threads(int): ORT threads inside one op, 0 for the ORT default
+            inter_op_threads(int): ORT threads across ops, 0 for the ORT default
+            quick_eval(bool), always_hora(bool): answer trivial decisions without the graph (see bot.local.quick_eval)
+            agari_guard(bool): enable libriichi's rule-based agari guard"""
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(onnx_file, options, providers=['CPUExecutionProvider'])
+        meta = self.session.get_modelmeta().custom_metadata_map
+        if META_VERSION not in meta:
+            raise ValueError(f'{onnx_file} has no {META_VERSION} metadata, export it with export_onnx()')
+        inputs = self.session.get_inputs()
+        self.obs_shape = tuple(inputs[0].shape[1:])
+        self.action_space = inputs[1].shape[1]
+
+        # attributes read by libriichi, same as MortalEngine
+        self.engine_type = 'mortal'
+        self.is_oracle = False
+        self.version = int(meta[META_VERSION])
+        self.enable_amp = False
+        self.enable_quick_eval = quick_eval
+        self.enable_rule_based_agari_guard = agari_guard
+        self.enable_always_hora = always_hora
+        self.name = name
+        self.stages = Stages(engine=name)
+        self._n_skipped = {r: METRICS.counter("majiang_forward_skipped_total",
+            "rows answered without a forward pass", engine=name, reason=r) for r in SKIP_REASONS}
+        self.cache = None   # EvalCache of q values (see bot.local.cache), None to always run the graph
+
+    def react_batch(self, obs, masks, invisible_obs):
+        t0 = time.perf_counter()
+        batch_size = len(masks)
+        # rows answered without the graph: trivial decisions, then cache hits (see MortalEngine)
+        trivial = trivial_rows(masks, self.enable_quick_eval, self.enable_always_hora)
+        todo = [i for i in range(batch_size) if i not in trivial]
+        for _, reason in trivial.values():
+            self._n_skipped[reason].inc()
+        cached = {}
+        if self.cache is not None:
+            # no invisible_obs in the key: the graph is never oracle (nor stochastic), obs and mask define a row
+            keys = {i: self.cache.key(obs[i], masks[i]) for i in todo}
+            for i in todo:
+                q = self.cache.get(keys[i])
+                if q is not None:
+                    cached[i] = q
+            todo = [i for i in todo if i not in cached]
+        masks = np.stack(masks, axis=0).astype(np.bool_, copy=False)
+        if todo:
+            obs = np.stack([obs[i] for i in todo], axis=0).astype(np.float32, copy=False)
+        t1 = time.perf_counter()
+
+        if len(todo) == batch_size:
+            q_out = self.session.run(None, {'obs': obs, 'masks': masks})[0]
+        else:
+            q_out = np.full(masks.shape, -np.inf, dtype=np.float32)
+            for i, (action, _) in trivial.items():
+                q_out[i, action] = 0.
+            for i, q in cached.items():
+                q_out[i] = q
+            if todo:
+                q_todo = self.session.run(None, {'obs': obs, 'masks': masks[todo]})[0]
+                q_out[todo] = q_todo
+                if self.cache is not None:
+                    for i, q in zip(todo, q_todo):
+                        self.cache.put(keys[i], q.copy())
+        actions = q_out.argmax(-1)
+        t2 = time.perf_counter()
+
+        result = actions.tolist(), q_out.tolist(), masks.tolist(), [True] * len(actions)
+        self.stages.observe("tensor_build", t1 - t0)
+        self.stages.observe("forward", t2 - t1)
+        self.stages.observe("tolist", time.perf_counter() - t2)
+        return result
+
+    def warmup(self, batch_sizes:tuple=(1,)):
+        """ run the graph once per batch size, see MortalEngine.warmup"""
+        start = time.perf_counter()
+        for size in batch_sizes:
+            obs = np.zeros((size, *self.obs_shape), dtype=np.float32)
+            masks = np.ones((size, self.action_space), dtype=np.bool_)
+            self.session.run(None, {'obs': obs, 'masks': masks})
+        LOGGER.info("Warmed up engine %s for batch sizes %s in %.2f s",
+            self.name, list(batch_sizes), time.perf_counter() - start)
+
+
+def get_onnx_engine(onnx_file:str, warmup_batch_sizes:tuple=(1,), intra_op_threads:int=0,
+    inter_op_threads:int=0, cache_entries:int=0, cache_mb:float=0, quick_eval:bool=True,
+    always_hora:bool=False, agari_guard:bool=False) -> OnnxMortalEngine:
+    """ Create and return an ONNX Runtime Mortal engine, warmed up for the given batch sizes"""
+    engine = OnnxMortalEngine(onnx_file, intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads,
+        quick_eval=quick_eval, always_hora=always_hora, agari_guard=agari_guard)
+    if warmup_batch_sizes:
+        engine.warmup(warmup_batch_sizes)
+    if cache_entries > 0 or cache_mb > 0:
+        from bot.local.cache import EvalCache
+        engine.cache = EvalCache(cache_entries, cache_mb, name=engine.name)
+    return engine
+
+
+def export_onnx(model_file:str, onnx_file:str, opset:int=17, check:bool=True) -> float | None:
+    """ Export a Mortal checkpoint to ONNX (needs torch and onnx)
+    params:
+        model_file(str): Mortal checkpoint (.pth)
+        onnx_file(str): output file
+        opset(int): ONNX opset version
+        check(bool): compare ORT and torch outputs on random inputs after exporting
+    returns:
+        float | None: max abs q-value difference between ORT and torch if checked"""
+    import torch
+    import onnx
+    from bot.local.engine import load_model
+    from bot.local.inference import InferenceNet, example_inputs, max_abs_diff
+
+    device = torch.device('cpu')
+    brain, dqn, version = load_model(model_file, device)
+    net = InferenceNet(brain, dqn, version).eval()
+    obs, masks = example_inputs(version, 2, device)
+    with torch.no_grad():
+        torch.onnx.export(
+            net, (obs, masks), onnx_file,
+            input_names=['obs', 'masks'],
+            output_names=['q'],
+            dynamic_axes={'obs': {0: 'batch'}, 'masks': {0: 'batch'}, 'q': {0: 'batch'}},
+            opset_version=opset,
+        )
+    model = onnx.load(onnx_file)
+    meta = model.metadata_props.add()
+    meta.key, meta.value = META_VERSION, str(version)
+    onnx.save(model, onnx_file)
+    LOGGER.info("Exported %s (version %d) to %s", model_file, version, onnx_file)
+    if not check:
+        return None
+
+    engine = OnnxMortalEngine(onnx_file)
+    worst = 0.0
+    with torch.no_grad():
+        for i, size in enumerate((1, 4, 16)):
+            obs, masks = example_inputs(version, size, device, seed=i + 1)
+            q_ort = engine.session.run(None, {'obs': obs.numpy(), 'masks': masks.numpy()})[0]
+            worst = max(worst, max_abs_diff(net(obs, masks), torch.from_numpy(q_ort)))
+    return worst
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Export a Mortal checkpoint to ONNX")
+    parser.add_argument("model", help="Mortal checkpoint (.pth)")
+    parser.add_argument("output", help="output ONNX file")
+    parser.add_argument("--opset", help="ONNX opset version", type=int, default=17)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    diff = export_onnx(args.model, args.output, args.opset)
+    print(f"exported {args.output}, max abs q diff vs torch: {diff:.2e}")
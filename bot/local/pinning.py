@@ -0,0 +1,26 @@
+""" Engine wrapper that runs evaluations on a dedicated set of CPUs
+
+The calling thread (a bot's socket thread, an executor thread or the micro-batching thread)
+is moved to the inference cpus for the duration of react_batch and moved back afterwards,
+so networking threads and the torch / OpenMP thread pools do not compete for the same cores.
+"""
+from common.cpu_layout import PinnedSection
+
+
+class PinnedEngine:
+    """ Engine wrapper evaluating on the given cpus, same attributes and react_batch contract"""
+    def __init__(self, engine, cpus) -> None:
+        """ params:
+            engine(MortalEngine | OnnxMortalEngine): the engine doing the evaluation
+            cpus(tuple[int]): cpus for the evaluation"""
+        self.engine = engine
+        self.cpus = tuple(cpus)
+        self._section = PinnedSection(cpus)
+
+    def __getattr__(self, name):
+        # engine attributes read by libriichi (name, version, is_oracle, ...)
+        return getattr(self.engine, name)
+
+    def react_batch(self, obs, masks, invisible_obs):
+        with self._section:
+            return self.engine.react_batch(obs, masks, invisible_obs)
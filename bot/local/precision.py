@@ -0,0 +1,29 @@
+""" Reduced precision modes for CPU inference
+- fp32: full precision (default)
+- bf16: bfloat16 autocast
+- int8: dynamic int8 quantization of the nn.Linear layers (ResNet head, ChannelAttention MLPs, DQN)
+"""
+import torch
+from torch import nn
+
+PRECISIONS = ('fp32', 'bf16', 'int8')
+
+
+def apply_precision(brain:nn.Module, dqn:nn.Module, precision:str,
+    device:torch.device) -> tuple[nn.Module, nn.Module, torch.dtype | None]:
+    """ Prepare brain and dqn for the given precision mode
+    returns:
+        (brain, dqn, autocast dtype or None if autocast is not used)"""
+    match precision:
+        case 'fp32' | None:
+            return brain, dqn, None
+        case 'bf16':
+            return brain, dqn, torch.bfloat16
+        case 'int8':
+            if device.type != 'cpu':
+                raise ValueError(f'int8 dynamic quantization runs on cpu only, not {device}')
+            brain = torch.ao.quantization.quantize_dynamic(brain, {nn.Linear}, dtype=torch.qint8)
+            dqn = torch.ao.quantization.quantize_dynamic(dqn, {nn.Linear}, dtype=torch.qint8)
+            return brain, dqn, None
+        case _:
+            raise ValueError(f'Unexpected precision {precision}, expected one of {PRECISIONS}')
@@ -0,0 +1,36 @@
+""" Trivial decisions that do not need a forward pass
+
+Quick eval: a row whose mask has exactly one legal action (e.g. only 'none' after a discard
+the bot cannot call) is answered with that action.
+Always hora: a row where hora is legal is answered with hora. Unlike Mortal's rule-based agari guard
+(enable_rule_based_agari_guard, applied by libriichi) it never holds back a legal hora.
+Both work on the masks only, so engines can split them off before building tensors.
+"""
+
+HORA = 43       # index of hora in the Mortal action space (versions 1 ~ 4)
+SKIP_REASONS = ('quick_eval', 'always_hora')
+
+
+def trivial_action(legal:list[int], quick_eval:bool, always_hora:bool) -> tuple[int, str] | None:
+    """ params:
+        legal(list[int]): legal action indices of one row
+    returns:
+        (action, reason) if the row can be answered without the network, otherwise None"""
+    if quick_eval and len(legal) == 1:
+        return legal[0], 'quick_eval'
+    if always_hora and HORA in legal:
+        return HORA, 'always_hora'
+    return None
+
+
+def trivial_rows(masks, quick_eval:bool, always_hora:bool) -> dict[int, tuple[int, str]]:
+    """ {row index: (action, reason)} of the rows (numpy bool masks) answered without the network"""
+    if not (quick_eval or always_hora):
+        return {}
+    rows = {}
+    for i, m in enumerate(masks):
+        res = trivial_action(m.nonzero()[0].tolist(), quick_eval, always_hora)
+        if res is not None:
+            rows[i] = res
+    return rows
+
@@ -0,0 +1,237 @@
+""" Process-wide registry of shared Mortal engines
+
+Engines are read-only after creation, so every bot in the process that uses the same
+model file and engine config can share one engine (one copy of the weights, one load).
+
+Torch thread pools are process-wide: the intra / inter-op thread counts of torch engines are
+not part of the engine key, they are applied once per process and conflicting values are rejected.
+ONNX Runtime sessions have their own pools, so the counts stay per engine for .onnx models.
+"""
+import dataclasses
+import threading
+import logging
+from pathlib import Path
+from bot.local.config import EngineConfig
+from common.cpu_layout import PinnedSection, describe_layout
+LOGGER = logging.getLogger(__name__)
+
+
+class _EngineEntry:
+    """ registry slot for one (model file, engine config) key"""
+    def __init__(self) -> None:
+        self.lock = threading.Lock()    # held while the engine is being loaded
+        self.engine = None
+        self.warm:bool = False          # warm-up done in this process, see preload_engine()
+        self.refs:int = 0               # number of bots currently holding the engine
+
+
+_LOCK = threading.Lock()
+_ENGINES:dict[tuple, _EngineEntry] = {}
+_TORCH_THREADS:tuple[int, int] = None   # (intra, inter) op threads applied to torch in this process
+
+
+def _is_onnx(model_file:str) -> bool:
+    return Path(model_file).suffix == '.onnx'
+
+
+def engine_device(model_file:str, device:str) -> str:
+    """ the device name an engine for model_file ends up on, e.g. None -> 'cuda' on a cuda host"""
+    if _is_onnx(model_file):
+        return 'cpu'        # ONNX Runtime engines run on cpu whatever the device setting
+    from bot.local.engine import resolve_device
+    return str(resolve_device(device))
+
+
+def _engine_key(model_file:str, config:EngineConfig=None) -> tuple:
+    config = config or EngineConfig()
+    config = dataclasses.replace(config, device=engine_device(model_file, config.device))
+    if not _is_onnx(model_file):
+        config = dataclasses.replace(config, intra_op_threads=0, inter_op_threads=0)
+    return (str(Path(model_file).resolve()), config)
+
+
+def _claim_torch_threads(config:EngineConfig) -> tuple[int, int]:
+    """ check the torch thread counts of config against those of the process (the first torch
+    engine sets them). Call with _LOCK held
+    raises:
+        ValueError: if they differ from the counts already in use"""
+    global _TORCH_THREADS
+    wanted = (config.intra_op_threads, config.inter_op_threads)
+    if _TORCH_THREADS is None:
+        _TORCH_THREADS = wanted
+    elif wanted != _TORCH_THREADS:
+        raise ValueError(f"torch thread counts (intra, inter) {wanted} conflict with {_TORCH_THREADS}"
+            " already used by the engines of this process: they are process-wide")
+    return _TORCH_THREADS
+
+
+def _thread_counts(key:tuple) -> tuple[int, int]:
+    """ (intra, inter) op threads the engine of key runs with"""
+    if _is_onnx(key[0]):
+        return key[1].intra_op_threads, key[1].inter_op_threads
+    return _TORCH_THREADS or (0, 0)
+
+
+def _key_str(key:tuple) -> str:
+    return f"{key[0]} {key[1]}"
+
+
+def _build_engine(model_file:str, config:EngineConfig, fork_safe:bool=False):
+    # load and warm up on the inference cpus: thread pools started now inherit them
+    with PinnedSection(config.inference_cpus):
+        if _is_onnx(model_file):
+            # exported graph on ONNX Runtime (cpu), torch is not imported
+            from bot.local.onnx_engine import get_onnx_engine
+            engine = get_onnx_engine(model_file, config.warmup_batch_sizes(),
+                config.intra_op_threads, config.inter_op_threads, config.cache_entries, config.cache_mb,
+                config.quick_eval, config.always_hora, config.agari_guard)
+        else:
+            from bot.local.engine import get_engine, set_torch_threads, single_threaded
+            set_torch_threads(*_TORCH_THREADS)
+            with single_threaded(fork_safe):
+                engine = get_engine(model_file, config.device, config.compile_mode,
+                    () if fork_safe else config.warmup_batch_sizes(), config.precision, config.fused,
+                    config.cache_entries, config.cache_mb, config.quick_eval, config.always_hora,
+                    config.agari_guard)
+    if config.inference_cpus:
+        from bot.local.pinning import PinnedEngine
+        engine = PinnedEngine(engine, config.inference_cpus)
+    if config.batch_window_ms > 0:
+        from bot.local.batching import BatchingEngine
+        engine = BatchingEngine(engine, config.batch_window_ms, config.max_batch)
+    return engine
+
+
+def _load(entry:_EngineEntry, key:tuple, model_file:str, fork_safe:bool=False):
+    # called with entry.lock held
+    try:
+        entry.engine = _build_engine(model_file, key[1], fork_safe)
+    except Exception:
+        with _LOCK:
+            _ENGINES.pop(key, None)
+        raise
+    entry.warm = not fork_safe
+    LOGGER.info("Loaded engine %s", _key_str(key))
+    LOGGER.info("CPU layout: %s", describe_layout(*_thread_counts(key), key[1].inference_cpus))
+
+
+def _warm_up(entry:_EngineEntry, key:tuple):
+    # called with entry.lock held, for an engine loaded by preload_engine() (before fork)
+    config = key[1]
+    if not _is_onnx(key[0]):
+        from bot.local.engine import set_torch_threads
+        set_torch_threads(*_TORCH_THREADS)
+    batch_sizes = config.warmup_batch_sizes()
+    if batch_sizes:
+        with PinnedSection(config.inference_cpus):
+            entry.engine.warmup(batch_sizes)
+    entry.warm = True
+
+
+def acquire_engine(model_file:str, config:EngineConfig=None):
+    """ Return the shared engine for (model_file, config), loading it on first use.
+    Thread safe: concurrent callers for the same key wait for a single load.
+    Every call must be paired with release_engine() when the caller is done with the engine.
+    params:
+        model_file(str): Mortal model file path
+        config(EngineConfig): engine settings, None for defaults
+    returns:
+        MortalEngine | BatchingEngine: the shared engine
+    raises:
+        ValueError: if the torch thread counts of config conflict with those of the loaded engines"""
+    key = _engine_key(model_file, config)
+    while True:
+        with _LOCK:
+            if not _is_onnx(model_file):
+                _claim_torch_threads(config or EngineConfig())
+            entry = _ENGINES.get(key)
+            if entry is None:
+                entry = _EngineEntry()
+                _ENGINES[key] = entry
+
+        with entry.lock:
+            with _LOCK:
+                registered = _ENGINES.get(key) is entry
+            if not registered:
+                # the load this caller waited for failed and dropped the entry: start over
+                continue
+            if entry.engine is None:
+                _load(entry, key, model_file)
+            elif not entry.warm:
+                _warm_up(entry, key)
+            with _LOCK:
+                entry.refs += 1
+                refs = entry.refs
+        break
+    LOGGER.info("Engine %s shared by %d bot(s)", _key_str(key), refs)
+    return entry.engine
+
+
+def preload_engine(model_file:str, config:EngineConfig=None) -> bool:
+    """ Load the engine for (model_file, config) ahead of forking worker processes, which then
+    share its weights copy-on-write. Torch runs single-threaded and skips the warm-up meanwhile,
+    so that no intra-op / OpenMP thread pool is running in the parent when it forks.
+    Each child warms the engine up in warm_up_engines() or its first acquire_engine().
+    ONNX Runtime sessions start their thread pools when created, so .onnx models are not preloaded.
+    returns:
+        bool: True if the engine is loaded now"""
+    if _is_onnx(model_file):
+        return False
+    key = _engine_key(model_file, config)
+    with _LOCK:
+        _claim_torch_threads(config or EngineConfig())
+        entry = _ENGINES.setdefault(key, _EngineEntry())
+    with entry.lock:
+        if entry.engine is None:
+            _load(entry, key, model_file, fork_safe=True)
+    return True
+
+
+def worker_context(model_file:str, device:str) -> "multiprocessing.context.BaseContext":
+    """ multiprocessing context for worker processes that run the engine of model_file on device:
+    fork where it is available, so that the workers share the weights of preload_for_workers()
+    copy-on-write, spawn where it is not or for CUDA, which cannot be used across fork"""
+    import multiprocessing as mp
+    if "fork" in mp.get_all_start_methods() and not engine_device(model_file, device).startswith("cuda"):
+        return mp.get_context("fork")
+    return mp.get_context("spawn")
+
+
+def preload_for_workers(ctx:"multiprocessing.context.BaseContext", model_file:str,
+        config:EngineConfig=None) -> bool:
+    """ preload_engine() ahead of starting workers in ctx (see worker_context()), if ctx forks them.
+    Spawned workers load the engine themselves
+    returns:
+        bool: True if the engine is loaded now"""
+    if ctx.get_start_method() != "fork":
+        return False
+    return preload_engine(model_file, config)
+
+
+def warm_up_engines():
+    """ warm up the loaded engines that have not been warmed up in this process"""
+    with _LOCK:
+        items = list(_ENGINES.items())
+    for key, entry in items:
+        with entry.lock:
+            if entry.engine is not None and not entry.warm:
+                _warm_up(entry, key)
+
+
+def release_engine(model_file:str, config:EngineConfig=None):
+    """ Release one reference acquired by acquire_engine().
+    The engine stays loaded so that bots created later in the process can reuse it."""
+    key = _engine_key(model_file, config)
+    with _LOCK:
+        entry = _ENGINES.get(key)
+        if entry is not None and entry.refs > 0:
+            entry.refs -= 1
+
+
+def engine_share_counts() -> dict[str, int]:
+    """ return {'model_file config': number of bots sharing the engine} for loaded engines"""
+    with _LOCK:
+        return {
+            _key_str(key): entry.refs
+            for key, entry in _ENGINES.items() if entry.engine is not None
+        }
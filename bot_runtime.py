@@ -0,0 +1,134 @@
+"""State and game lifecycle shared by the threaded (majiang_socket_bot) and asyncio (majiang_async_bot)
+socket.io bots. Kept free of socket.io / HTTP client imports"""
+
+import random
+import string
+import time
+import weakref
+from typing import TYPE_CHECKING
+
+from bot import Bot, GameMode, get_bot
+from bot.local.registry import engine_share_counts
+from game_state import GameState
+from common.archive import GameArchive, get_archive
+from common.log_setup import bot_logger
+from common.metrics import METRICS
+from common.recorder import GameRecorder
+from common.utils import FPSCounter
+
+if TYPE_CHECKING:
+    from common.connection import ConnectTimer  # imports requests
+
+
+def generate_random_name(length=5):
+    letters = string.ascii_letters
+    return "Mortal_" + "".join([random.choice(letters) for _ in range(length)])
+
+
+class BotRuntimeMixin:
+    """bot, game state, identity, metrics and the warm reset between games of one socket.io bot"""
+
+    server: str = ""
+    authpath: str = ""
+    socketpath: str = ""
+    modelpath: str = ""
+    bot: Bot = None
+    game: GameState = None
+    myuid = ""
+    myname = ""
+    is_in_room = False
+    is_in_game = False
+    room = ""
+    recorder: GameRecorder = None
+    archive: GameArchive = None
+    _ended_at: float = None  # perf_counter() when END arrived, for the reset latency
+    connect_timer: "ConnectTimer" = None
+    _load_done = False  # load_bot() has run (successfully or not)
+
+    def _init_runtime(self, setting, room="", botname=""):
+        """build the bot (the model is loaded by load_bot()), the game state, logger and metrics
+        params:
+            setting(MajiangBotSetting): bot settings
+            room(str): room to join, "" for none
+            botname(str): player name, "" for a random one"""
+        self.setting = setting
+        self.server = setting.server
+        self.authpath = setting.apppath + "server/auth/"
+        self.socketpath = setting.apppath + "server/socket.io/"
+        self.modelpath = setting.modelpath
+        self.bot = get_bot(setting.modelpath, setting.engine_config())
+        self.game = GameState(self.bot)
+        self.room = room
+        self.myname = botname if botname else generate_random_name()
+        self.record_dir = setting.record_dir
+        if setting.archive_dir:
+            self.archive = get_archive(setting.archive_dir)
+        self.log = bot_logger(self.myname, self.room)
+        self.game.set_logger(self.log)
+        self._init_metrics()
+
+    def _init_metrics(self):
+        labels = {"bot": self.myname, "room": self.room}
+        self.game.set_metric_labels(**labels)
+        self.stages = self.game.stages
+        self.n_messages = METRICS.counter(
+            "majiang_messages_total", "GAME messages processed", **labels
+        )
+        self.n_decisions = METRICS.counter(
+            "majiang_decisions_total", "GAME messages answered by the bot", **labels
+        )
+        bot_ref = weakref.ref(self.bot)
+        METRICS.gauge(
+            "majiang_forward_skipped_game",
+            lambda: bot_ref().skipped_forward if bot_ref() else 0,
+            "decisions of the current game answered without a forward pass",
+            **labels,
+        )
+        self.decision_fps = FPSCounter()
+        fps_ref = weakref.ref(self.decision_fps)
+        METRICS.gauge(
+            "majiang_decisions_per_second",
+            lambda: fps_ref().fps if fps_ref() else 0,
+            "decisions in the last second",
+            **labels,
+        )
+
+    def load_bot(self):
+        """load the engine (once per process, shared) and prepare the libriichi bots.
+        Runs in the background of the first login / connect, kaiju waits for it if needed"""
+        start = time.perf_counter()
+        try:
+            self.bot.load()
+            self.bot.prepare(GameMode.MJ4P)
+        except Exception as e:  # pylint: disable=broad-except
+            self.log.warning("Cannot load the bot: %s", e)
+            return
+        finally:
+            self._load_done = True
+        self.log.info(
+            "Bot ready in %.2f s, shared engines: %s",
+            time.perf_counter() - start,
+            engine_share_counts(),
+        )
+
+    def reset_game(self):
+        """reset the per-game state only. Engine, session and identity stay warm for the next game"""
+        start = time.perf_counter()
+        self.game.reset()
+        self.myuid = ""
+        self.is_in_room = False
+        self.is_in_game = False
+        if self._load_done:
+            try:
+                # libriichi bots for every seat, before the next kaiju
+                self.bot.prepare(GameMode.MJ4P)
+            except Exception as e:  # pylint: disable=broad-except
+                self.log.warning("Cannot prepare the bot for the next game: %s", e)
+        now = time.perf_counter()
+        if self._ended_at is not None:
+            self.log.info(
+                "Ready for the next game %.1f ms after END (reset %.1f ms)",
+                (now - self._ended_at) * 1000,
+                (now - start) * 1000,
+            )
+            self._ended_at = None
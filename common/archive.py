@@ -0,0 +1,298 @@
+""" Indexed, compressed archive of finished games (paipu)
+
+Bots hand the paipu of a finished game (the END message) to GameArchive.submit(), which only
+queues it. A background thread splits the game into a header block (everything but the log)
+and one block per kyoku, compresses each block with zlib and appends it to the current segment
+file. Block positions go into an sqlite index (games by bot, room, date; kyokus by game), so
+ArchiveReader fetches one kyoku with one seek / read / decompress of that block only.
+
+Segment files are append-only and named per process, so worker processes can share an archive
+folder; sqlite serializes their index writes. Readers open the index read-only.
+
+usage: python -m common.archive ARCHIVE_DIR [--bot NAME] [--room ROOM] [--date YYYY-MM-DD]
+       python -m common.archive ARCHIVE_DIR --game ID [--kyoku N]
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+from common.metrics import METRICS
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_FILE = "index.sqlite"
+SEGMENT_SUFFIX = ".seg"
+_SEPARATORS = (",", ":")
+_STOP = object()  # queue sentinel
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    bot TEXT, room TEXT, title TEXT,
+    date TEXT,                  -- YYYY-MM-DD (local time) the game ended
+    ended_at REAL,              -- unix time
+    segment TEXT, header_offset INTEGER, header_length INTEGER,
+    n_kyoku INTEGER
+);
+CREATE INDEX IF NOT EXISTS games_bot ON games (bot, date);
+CREATE INDEX IF NOT EXISTS games_room ON games (room, date);
+CREATE INDEX IF NOT EXISTS games_date ON games (date);
+CREATE TABLE IF NOT EXISTS kyokus (
+    game_id INTEGER, idx INTEGER,
+    zhuangfeng INTEGER, jushu INTEGER, changbang INTEGER,
+    segment TEXT, offset INTEGER, length INTEGER,
+    PRIMARY KEY (game_id, idx)
+);
+"""
+
+
+def _connect(folder: pathlib.Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(folder / INDEX_FILE, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _connect_ro(folder: pathlib.Path) -> sqlite3.Connection:
+    path = (folder / INDEX_FILE).resolve()
+    if not path.is_file():
+        raise FileNotFoundError(f"No archive index {path}")
+    return sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True, timeout=30)
+
+
+def _pack(obj) -> bytes:
+    return zlib.compress(json.dumps(obj, separators=_SEPARATORS, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _unpack(data: bytes):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def _kyoku_key(kyoku: list) -> tuple:
+    """(zhuangfeng, jushu, changbang) from the qipai message opening a kyoku log"""
+    for msg in kyoku[:1]:
+        qipai = msg.get("qipai") if isinstance(msg, dict) else None
+        if qipai:
+            return qipai.get("zhuangfeng"), qipai.get("jushu"), qipai.get("changbang")
+    return None, None, None
+
+
+@dataclass
+class GameEntry:
+    """one row of the game index"""
+
+    id: int
+    bot: str
+    room: str
+    title: str
+    date: str
+    ended_at: float
+    n_kyoku: int
+
+
+class GameArchive:
+    """Writes submitted games to the archive folder on a background thread"""
+
+    def __init__(self, folder: str, segment_mb: float = 64) -> None:
+        """params:
+        folder(str): archive folder, created if missing
+        segment_mb(float): start a new segment file once the current one is this large"""
+        self.folder = pathlib.Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = int(segment_mb * 2**20)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._segment_no = 0
+        self._segment: pathlib.Path = None
+        self._file = None
+        self.n_games = METRICS.counter("majiang_archive_games_total", "games written to the archive")
+        self.n_bytes = METRICS.counter("majiang_archive_bytes_total", "compressed bytes written to the archive")
+        METRICS.gauge("majiang_archive_queue_depth", self._queue.qsize, "games waiting for the archive writer")
+        self._thread = threading.Thread(target=self._run, name="archive-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, paipu: dict, bot: str = "", room: str = ""):
+        """queue a finished game for writing, returns at once"""
+        self._queue.put((paipu, bot, room, time.time()))
+
+    def close(self, timeout: float = None):
+        """write the queued games and stop the writer. Games submitted afterwards are not written"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _run(self):
+        conn = _connect(self.folder)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                try:
+                    self._write_game(conn, *item)
+                except Exception:  # pylint: disable=broad-except
+                    LOGGER.exception("Cannot archive game of %s in room %s", item[1], item[2])
+        finally:
+            if self._file is not None:
+                self._file.close()
+            conn.close()
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        self._segment_no += 1
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{self._segment_no:04d}{SEGMENT_SUFFIX}"
+        self._segment = self.folder / name
+        self._file = open(self._segment, "ab")
+
+    def _append(self, block: bytes) -> tuple[int, int]:
+        offset = self._file.tell()
+        self._file.write(block)
+        self.n_bytes.inc(len(block))
+        return offset, len(block)
+
+    def _write_game(self, conn: sqlite3.Connection, paipu: dict, bot: str, room: str, ended_at: float):
+        if self._file is None or self._file.tell() >= self.segment_bytes:
+            self._open_segment()
+        log = paipu.get("log") or []
+        header = {k: v for k, v in paipu.items() if k != "log"}
+        header_pos = self._append(_pack(header))
+        kyoku_pos = [self._append(_pack(kyoku)) for kyoku in log]
+        # the blocks are on disk before the index points at them
+        self._file.flush()
+        segment = self._segment.name
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO games (bot, room, title, date, ended_at, segment, header_offset, header_length, n_kyoku)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (bot, room, paipu.get("title", ""), time.strftime("%Y-%m-%d", time.localtime(ended_at)),
+                 ended_at, segment, *header_pos, len(log)),
+            )
+            game_id = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO kyokus VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(game_id, i, *_kyoku_key(kyoku), segment, *pos) for i, (kyoku, pos) in enumerate(zip(log, kyoku_pos))],
+            )
+        self.n_games.inc()
+
+
+_ARCHIVES: dict[str, GameArchive] = {}
+_LOCK = threading.Lock()
+
+
+def get_archive(folder: str) -> GameArchive:
+    """return the process-wide archive (one writer thread) for folder.
+    The archives are closed at exit, see close_archives()"""
+    key = str(pathlib.Path(folder).resolve())
+    with _LOCK:
+        archive = _ARCHIVES.get(key)
+        if archive is None:
+            if not _ARCHIVES:
+                atexit.register(close_archives)
+            archive = GameArchive(folder)
+            _ARCHIVES[key] = archive
+        return archive
+
+
+def close_archives(timeout: float = None):
+    """write the queued games of every process-wide archive and stop their writers.
+    Runs at exit; call it explicitly where atexit does not run (e.g. multiprocessing workers)"""
+    with _LOCK:
+        archives = list(_ARCHIVES.values())
+        _ARCHIVES.clear()
+    for archive in archives:
+        archive.close(timeout)
+
+
+class ArchiveReader:
+    """Random-access reader of an archive folder"""
+
+    def __init__(self, folder: str) -> None:
+        """raises:
+        FileNotFoundError: if folder has no archive index"""
+        self.folder = pathlib.Path(folder)
+        self.conn = _connect_ro(self.folder)
+
+    def close(self):
+        """close the index"""
+        self.conn.close()
+
+    def find(self, bot: str = None, room: str = None, date_from: str = None, date_to: str = None,
+             limit: int = None) -> list[GameEntry]:
+        """games matching all given filters, newest first. Dates are YYYY-MM-DD, inclusive"""
+        where, args = [], []
+        for cond, value in (("bot = ?", bot), ("room = ?", room), ("date >= ?", date_from), ("date <= ?", date_to)):
+            if value is not None:
+                where.append(cond)
+                args.append(value)
+        sql = "SELECT id, bot, room, title, date, ended_at, n_kyoku FROM games"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ended_at DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [GameEntry(*row) for row in self.conn.execute(sql, args)]
+
+    def kyokus(self, game_id: int) -> list[tuple[int, int, int, int]]:
+        """(index, zhuangfeng, jushu, changbang) of every kyoku of a game"""
+        return list(self.conn.execute(
+            "SELECT idx, zhuangfeng, jushu, changbang FROM kyokus WHERE game_id = ? ORDER BY idx", (game_id,)))
+
+    def _read_block(self, segment: str, offset: int, length: int):
+        with open(self.folder / segment, "rb") as f:
+            f.seek(offset)
+            return _unpack(f.read(length))
+
+    def read_kyoku(self, game_id: int, index: int) -> list:
+        """message log of one kyoku, reading only its block"""
+        row = self.conn.execute(
+            "SELECT segment, offset, length FROM kyokus WHERE game_id = ? AND idx = ?", (game_id, index)).fetchone()
+        if row is None:
+            raise KeyError(f"No kyoku {index} in game {game_id}")
+        return self._read_block(*row)
+
+    def read_game(self, game_id: int) -> dict:
+        """the full paipu of a game"""
+        row = self.conn.execute(
+            "SELECT segment, header_offset, header_length, n_kyoku FROM games WHERE id = ?", (game_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No game {game_id}")
+        paipu = self._read_block(*row[:3])
+        paipu["log"] = [self.read_kyoku(game_id, i) for i in range(row[3])]
+        return paipu
+
+
+def main(argv: list[str] = None):
+    """list games, or print one game / kyoku as JSON"""
+    parser = argparse.ArgumentParser(description="Query a game archive")
+    parser.add_argument("folder", help="archive folder")
+    parser.add_argument("--bot", help="bot name", default=None)
+    parser.add_argument("--room", help="room", default=None)
+    parser.add_argument("--date", help="date, YYYY-MM-DD", default=None)
+    parser.add_argument("--limit", help="max games listed (default: 50)", type=int, default=50)
+    parser.add_argument("--game", help="print this game", type=int, default=None)
+    parser.add_argument("--kyoku", help="print only this kyoku (index) of --game", type=int, default=None)
+    args = parser.parse_args(argv)
+    reader = ArchiveReader(args.folder)
+    try:
+        if args.game is None:
+            for g in reader.find(args.bot, args.room, args.date, args.date, args.limit):
+                print(f"{g.id:>8}  {g.date}  {g.room:<10}{g.bot:<24}kyoku {g.n_kyoku:>3}  {g.title}")
+        elif args.kyoku is None:
+            print(json.dumps(reader.read_game(args.game), ensure_ascii=False))
+        else:
+            print(json.dumps(reader.read_kyoku(args.game, args.kyoku), ensure_ascii=False))
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+""" Connection establishment for bot fleets
+
+ConnectionManager authenticates bots over one shared pool of keep-alive HTTP connections
+(each bot keeps its own cookie jar), retries failed auth / socket connects with jittered
+exponential backoff, limits how many bots connect at the same time, and can make socket.io
+connect over websocket directly instead of starting with long-polling.
+ConnectTimer records the auth -> HELLO -> ROOM join latency of one bot.
+"""
+
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Backoff:
+    """Exponential backoff with full jitter: attempt n waits uniform(0, min(cap, base * 2**n)) seconds"""
+
+    def __init__(self, base: float = 0.25, cap: float = 30, max_attempts: int = 6) -> None:
+        self.base = base
+        self.cap = cap
+        self.max_attempts = max_attempts
+
+    def delay(self, attempt: int) -> float:
+        """seconds to wait before retry number attempt (0 based)"""
+        return random.uniform(0, min(self.cap, self.base * 2**attempt))
+
+    def run(self, func, what: str = "", retry_on=(Exception,)):
+        """call func() until it succeeds, sleeping between attempts. Re-raises the last error"""
+        for attempt in range(self.max_attempts):
+            try:
+                return func()
+            except retry_on as e:
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                delay = self.delay(attempt)
+                LOGGER.warning("%s failed (%s), retry %d in %.2f s", what, e, attempt + 1, delay)
+                time.sleep(delay)
+        return None
+
+    async def run_async(self, coro_func, what: str = "", retry_on=(Exception,)):
+        """asyncio version of run(): await coro_func() until it succeeds"""
+        import asyncio
+
+        for attempt in range(self.max_attempts):
+            try:
+                return await coro_func()
+            except retry_on as e:
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                delay = self.delay(attempt)
+                LOGGER.warning("%s failed (%s), retry %d in %.2f s", what, e, attempt + 1, delay)
+                await asyncio.sleep(delay)
+        return None
+
+
+class ConnectTimer:
+    """auth -> HELLO -> ROOM join timestamps of one connection"""
+
+    STAGES = ("auth", "hello", "room_join")
+
+    def __init__(self, stages=None) -> None:
+        """params:
+        stages(common.metrics.Stages): where the stage latencies are recorded, None for none"""
+        self.stages = stages
+        self.start = time.perf_counter()
+        self.marks: dict[str, float] = {}
+
+    def mark(self, stage: str) -> float:
+        """record the end of a stage, returns the seconds since the previous stage"""
+        now = time.perf_counter()
+        prev = max(self.marks.values(), default=self.start)
+        self.marks[stage] = now
+        if self.stages is not None:
+            self.stages.observe(f"connect_{stage}", now - prev)
+        return now - prev
+
+    def summary(self) -> str:
+        """e.g. "auth 35.1 ms, hello 80.2 ms, room_join 12.0 ms, total 127.3 ms" """
+        parts, prev = [], self.start
+        for stage in self.STAGES:
+            if stage in self.marks:
+                parts.append(f"{stage} {(self.marks[stage] - prev) * 1000:.1f} ms")
+                prev = self.marks[stage]
+        parts.append(f"total {(prev - self.start) * 1000:.1f} ms")
+        return ", ".join(parts)
+
+
+class ConnectionManager:
+    """Shared HTTP connection pool, connect concurrency limit and retry policy of the bots of a process"""
+
+    def __init__(
+        self,
+        server: str,
+        authpath: str,
+        pool_size: int = 32,
+        max_concurrent: int = 16,
+        websocket_only: bool = False,
+        backoff: Backoff = None,
+    ) -> None:
+        """params:
+        server(str), authpath(str): auth url is server + authpath
+        pool_size(int): max keep-alive connections kept to the server
+        max_concurrent(int): max bots authenticating / connecting at the same time
+        websocket_only(bool): connect socket.io over websocket without the long-polling handshake
+        backoff(Backoff): retry policy, None for the default"""
+        self.auth_url = server + authpath
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.transports = ["websocket"] if websocket_only else None
+        self.backoff = backoff or Backoff()
+
+    def new_session(self) -> requests.Session:
+        """a session with its own cookies, using the shared connection pool"""
+        session = requests.Session()
+        session.mount("http://", self.adapter)
+        session.mount("https://", self.adapter)
+        return session
+
+    def login(self, name: str) -> requests.Session:
+        """authenticate name, retrying with backoff. Returns the authenticated session"""
+        session = self.new_session()
+
+        def post():
+            r = session.post(self.auth_url, data={"name": name, "passwd": "*"})
+            if r.status_code not in (200, 302):
+                raise ConnectionError(f"Failed to auth on the server: {self.auth_url} {r.status_code} {r.text}")
+
+        with self.slots:
+            self.backoff.run(post, f"auth of {name}", (requests.RequestException, ConnectionError))
+        return session
+
+    def connect(self, sio, server: str, socketpath: str, name: str = ""):
+        """connect a socketio.Client, retrying connection errors with backoff"""
+        from socketio.exceptions import ConnectionError as SocketConnectionError
+
+        kwargs = {"socketio_path": socketpath}
+        if self.transports:
+            kwargs["transports"] = self.transports
+        with self.slots:
+            self.backoff.run(
+                lambda: sio.connect(server, **kwargs), f"socket connect of {name}", (SocketConnectionError, OSError)
+            )
+
+
+_MANAGERS: dict[tuple, ConnectionManager] = {}
+_LOCK = threading.Lock()
+
+
+def get_connection_manager(server: str, authpath: str, **kwargs) -> ConnectionManager:
+    """return the process-wide manager for (server, authpath), created with kwargs on first use"""
+    with _LOCK:
+        manager = _MANAGERS.get((server, authpath))
+        if manager is None:
+            manager = ConnectionManager(server, authpath, **kwargs)
+            _MANAGERS[(server, authpath)] = manager
+        return manager
@@ -0,0 +1,110 @@
+""" CPU layout helpers: cpu list parsing, thread pinning and a printable summary
+
+Linux pins per thread: os.sched_setaffinity(0, cpus) only changes the calling thread,
+threads started afterwards inherit the mask of the thread that starts them.
+"""
+
+import os
+import sys
+import logging
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+CAN_PIN = hasattr(os, "sched_setaffinity")
+
+
+def parse_cpu_list(spec: str) -> tuple[int, ...]:
+    """parse a cpu list like "0-3,8,10-11" into a sorted tuple of cpu ids. Empty / None -> ()"""
+    if not spec:
+        return ()
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            lo, hi = int(lo), int(hi)
+            if lo > hi:
+                raise ValueError(f"Invalid cpu range: {part}")
+            cpus.update(range(lo, hi + 1))
+        else:
+            cpus.add(int(part))
+    return tuple(sorted(cpus))
+
+
+def format_cpu_list(cpus) -> str:
+    """inverse of parse_cpu_list, e.g. (0, 1, 2, 3, 8) -> "0-3,8" """
+    cpus = sorted(cpus)
+    parts = []
+    i = 0
+    while i < len(cpus):
+        j = i
+        while j + 1 < len(cpus) and cpus[j + 1] == cpus[j] + 1:
+            j += 1
+        parts.append(str(cpus[i]) if i == j else f"{cpus[i]}-{cpus[j]}")
+        i = j + 1
+    return ",".join(parts)
+
+
+def thread_cpus() -> tuple[int, ...] | None:
+    """cpus the calling thread may run on, None if unknown on this platform"""
+    if not CAN_PIN:
+        return None
+    return tuple(sorted(os.sched_getaffinity(0)))
+
+
+def pin_thread(cpus) -> bool:
+    """pin the calling thread (and threads it starts later) to cpus.
+    returns:
+        bool: False if pinning is not supported here or cpus is empty"""
+    if not cpus or not CAN_PIN:
+        return False
+    os.sched_setaffinity(0, cpus)
+    return True
+
+
+class PinnedSection:
+    """context manager running a block on the given cpus and restoring the thread's previous cpus after"""
+
+    __slots__ = ("cpus", "_saved")
+
+    def __init__(self, cpus) -> None:
+        self.cpus = set(cpus) if (cpus and CAN_PIN) else None
+        self._saved = threading.local()
+
+    def __enter__(self):
+        if self.cpus is not None:
+            self._saved.cpus = os.sched_getaffinity(0)
+            if self._saved.cpus != self.cpus:
+                os.sched_setaffinity(0, self.cpus)
+        return self
+
+    def __exit__(self, *exc):
+        if self.cpus is not None and self._saved.cpus != self.cpus:
+            os.sched_setaffinity(0, self._saved.cpus)
+        return False
+
+
+def describe_layout(
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 0,
+    inference_cpus=(),
+    io_cpus=(),
+) -> str:
+    """one line summary of the effective thread / cpu layout of this process"""
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        intra = torch.get_num_threads()
+        inter = torch.get_num_interop_threads()
+    else:
+        intra = intra_op_threads or "default"
+        inter = inter_op_threads or "default"
+    cpus = thread_cpus()
+    return (
+        f"pid {os.getpid()}: cpus available {format_cpu_list(cpus) if cpus else 'n/a'}"
+        f" ({os.cpu_count()} total), torch intra-op threads {intra}, inter-op threads {inter},"
+        f" inference cpus {format_cpu_list(inference_cpus) or 'any'},"
+        f" io cpus {format_cpu_list(io_cpus) or 'any'}"
+    )
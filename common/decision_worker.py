@@ -0,0 +1,79 @@
+""" Per-bot decision worker
+Socket callbacks only enqueue GAME messages; a worker thread handles them in arrival order
+(translation, engine evaluation, emitting the reply). The socket client keeps answering pings
+and other events while the model is thinking.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from common.metrics import METRICS
+
+LOGGER = logging.getLogger(__name__)
+
+_STOP = object()  # queue sentinel
+
+
+class DecisionWorker:
+    """Runs handler(item) for every submitted item, in order, on one worker thread"""
+
+    def __init__(self, handler, max_queue: int = 64, name: str = "", **labels) -> None:
+        """params:
+        handler(callable): called with each submitted item on the worker thread
+        max_queue(int): max pending items, submit() blocks while the queue is full (backpressure)
+        name(str): worker thread name
+        labels: metric labels (e.g. bot, room)"""
+        self.handler = handler
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self.labels = labels
+        self.queue_wait = METRICS.histogram(
+            "majiang_decision_queue_seconds", "time GAME messages wait in the decision queue", **labels
+        )
+        self.n_full = METRICS.counter(
+            "majiang_decision_queue_full_total", "submits that blocked on a full decision queue", **labels
+        )
+        METRICS.gauge(
+            "majiang_decision_queue_depth", self._queue.qsize, "GAME messages waiting in the decision queue", **labels
+        )
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name or "decision-worker", daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        """number of pending items"""
+        return self._queue.qsize()
+
+    def submit(self, item):
+        """queue item for the handler, blocking while the queue is full"""
+        entry = (time.perf_counter(), item)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.n_full.inc()
+            LOGGER.warning("Decision queue full (%d), waiting: %s", self._queue.maxsize, self.labels)
+            self._queue.put(entry)
+
+    def close(self, timeout: float = None):
+        """handle the pending items, then stop the worker thread. Safe to call more than once"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((time.perf_counter(), _STOP))
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+        METRICS.remove_gauge("majiang_decision_queue_depth", **self.labels)
+
+    def _run(self):
+        while True:
+            queued_at, item = self._queue.get()
+            if item is _STOP:
+                return
+            self.queue_wait.observe(time.perf_counter() - queued_at)
+            try:
+                self.handler(item)
+            except Exception:  # pylint: disable=broad-except
+                # keep the worker alive: the socket callbacks would otherwise queue forever
+                LOGGER.exception("Decision worker error: %s", self.labels)
@@ -0,0 +1,101 @@
+""" Compact representation of the bot's own hand
+
+Tiles are kept as 34 counts plus aka dora counts and a tsumohai slot,
+so draws, discards, calls and kans are O(1). The sorted mjai tile list is
+only built when asked for (e.g. by GameState.get_game_info).
+"""
+
+from array import array
+
+from common.tile_codec import MJAI_TO_ID, ID_TO_MJAI, ID_TO_KIND, ID_TO_AKA, AKA_BASE
+
+_EMPTY_34 = bytes(34)
+_EMPTY_AKA = bytes(3)
+_NO_TILE = -1
+_FIVES = {4: 0, 13: 1, 22: 2}  # 34-kind of 5m / 5p / 5s: aka suit index
+
+
+class Hand:
+    """Own hand: 34 tile counts (aka doras included), aka dora counts and the tsumohai"""
+
+    __slots__ = ("counts", "akas", "tsumohai")
+
+    def __init__(self, mjai_tiles: list[str] = None) -> None:
+        """params:
+        mjai_tiles(list[str]): initial tiles in mjai format, without tsumohai"""
+        self.counts = array("B", _EMPTY_34)  # tile count per 34-kind, aka doras counted as 5
+        self.akas = array("B", _EMPTY_AKA)  # aka dora count of 5m / 5p / 5s
+        self.tsumohai: int = _NO_TILE  # tile id of the drawn tile, or -1
+        if mjai_tiles:
+            for tile in mjai_tiles:
+                self.add(tile)
+
+    def add(self, mjai_tile: str):
+        """add a tile to the hand (not as tsumohai)"""
+        tid = MJAI_TO_ID[mjai_tile]
+        self.counts[ID_TO_KIND[tid]] += 1
+        if tid >= AKA_BASE:
+            self.akas[ID_TO_AKA[tid]] += 1
+
+    def remove(self, mjai_tile: str):
+        """remove a tile from the hand (not the tsumohai slot).
+        Raises ValueError if the tile is not in the hand, like list.remove"""
+        tid = MJAI_TO_ID[mjai_tile]
+        kind = ID_TO_KIND[tid]
+        if tid >= AKA_BASE:
+            aka = ID_TO_AKA[tid]
+            if not self.akas[aka]:
+                raise ValueError(f"{mjai_tile} not in hand")
+            self.akas[aka] -= 1
+        else:
+            n_normal = self.counts[kind]
+            if kind in _FIVES:
+                n_normal -= self.akas[_FIVES[kind]]
+            if not n_normal:
+                raise ValueError(f"{mjai_tile} not in hand")
+        self.counts[kind] -= 1
+
+    def draw(self, mjai_tile: str):
+        """put a drawn tile into the tsumohai slot"""
+        self.merge_tsumohai()
+        self.tsumohai = MJAI_TO_ID[mjai_tile]
+
+    def merge_tsumohai(self):
+        """move the tsumohai (if any) into the hand"""
+        if self.tsumohai != _NO_TILE:
+            tid = self.tsumohai
+            self.tsumohai = _NO_TILE
+            self.counts[ID_TO_KIND[tid]] += 1
+            if tid >= AKA_BASE:
+                self.akas[ID_TO_AKA[tid]] += 1
+
+    def discard(self, mjai_tile: str):
+        """discard a tile, from the hand or the tsumohai slot"""
+        self.merge_tsumohai()
+        self.remove(mjai_tile)
+
+    def tsumohai_mjai(self) -> str | None:
+        """tsumohai in mjai format, or None"""
+        if self.tsumohai == _NO_TILE:
+            return None
+        return ID_TO_MJAI[self.tsumohai]
+
+    def tehai(self) -> list[str]:
+        """sorted tiles in mjai format (see mj_helper.sort_mjai_tiles), without tsumohai"""
+        res = []
+        for kind, count in enumerate(self.counts):
+            if not count:
+                continue
+            aka = _FIVES.get(kind)
+            if aka is not None and self.akas[aka]:  # aka dora sorts before its 5
+                n_aka = self.akas[aka]
+                res += [ID_TO_MJAI[AKA_BASE + aka]] * n_aka
+                count -= n_aka
+            res += [ID_TO_MJAI[kind]] * count
+        return res
+
+    def __len__(self) -> int:
+        return sum(self.counts) + (self.tsumohai != _NO_TILE)
+
+    def __repr__(self) -> str:
+        return f"Hand({self.tehai()}, tsumohai={self.tsumohai_mjai()})"
@@ -0,0 +1,91 @@
+""" Import time report for the bot's startup path
+
+Imports the startup modules in a fresh interpreter with `python -X importtime`, then prints
+the slowest top-level imports and checks that no heavy module (torch, numpy, libriichi, ...)
+is imported before an engine is built.
+
+usage: python -m common.import_report [modules ...]
+       python majiang_socket_bot.py --import-report
+"""
+
+import argparse
+import pathlib
+import subprocess
+import sys
+from dataclasses import dataclass
+
+HEAVY_MODULES = ("torch", "numpy", "libriichi", "riichi", "libriichi3p", "onnxruntime")
+STARTUP_MODULES = ("majiang_socket_bot",)
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class ImportTime:
+    """one line of -X importtime output"""
+
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int  # 0 for modules imported directly by the measured code
+
+
+def measure(modules=STARTUP_MODULES) -> list[ImportTime]:
+    """import modules in a fresh interpreter and return the import times, in import order"""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    entries = []
+    other = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            other.append(line)
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # header line
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append(ImportTime(name.strip(), self_us, cumulative_us, depth))
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {code!r} failed:\n" + "\n".join(other[-10:]))
+    return entries
+
+
+def heavy_imports(entries: list[ImportTime]) -> list[str]:
+    """heavy modules (see HEAVY_MODULES) that were imported"""
+    return sorted({e.name for e in entries if e.name.split(".")[0] in HEAVY_MODULES and "." not in e.name})
+
+
+def report(entries: list[ImportTime], top: int = 15) -> str:
+    """human readable summary of measure()"""
+    total = sum(e.self_us for e in entries)
+    roots = sorted((e for e in entries if e.depth == 0), key=lambda e: e.cumulative_us, reverse=True)
+    lines = [f"modules imported: {len(entries)}  total import time: {total / 1000:.1f} ms",
+             f"{'cumulative ms':>14}{'self ms':>10}  module"]
+    for e in roots[:top]:
+        lines.append(f"{e.cumulative_us / 1000:>14.1f}{e.self_us / 1000:>10.1f}  {e.name}")
+    heavy = heavy_imports(entries)
+    lines.append("heavy modules imported: " + (", ".join(heavy) if heavy else "none"))
+    return "\n".join(lines)
+
+
+def main(argv: list[str] = None) -> int:
+    """print the report. returns 1 if a heavy module is imported on the startup path, else 0"""
+    parser = argparse.ArgumentParser(description="Import time report of the startup path")
+    parser.add_argument("modules", nargs="*", help="modules to import", default=list(STARTUP_MODULES))
+    parser.add_argument("--top", help="number of top-level imports to list", type=int, default=15)
+    args = parser.parse_args(argv)
+    entries = measure(args.modules)
+    print(report(entries, args.top))
+    return 1 if heavy_imports(entries) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
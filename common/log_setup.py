@@ -0,0 +1,94 @@
+""" Logging setup: records go through a queue to one background writer thread
+
+Callers only pay for the level check, and for building the message of records that pass it
+(the args are frozen at call time, callers may change them afterwards); the rest of the formatting
+and the stream I/O happen on the QueueListener thread.
+Per-message logs (GAME messages, bot input / output) are at DEBUG. Bots log to "majiang.bot.<room>.<name>" loggers, so
+verbosity can be set per room or per bot, e.g. "A1234=WARNING,A1234.Mortal_A1234_B=DEBUG".
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+BOT_LOGGER = "majiang.bot"
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener: logging.handlers.QueueListener = None
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that builds the message in place instead of copying the record"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # only records that passed the level checks get here. The queue handler is the only
+        # handler, nobody else sees the record. Message and traceback are built now, while the
+        # args and frames still hold their values at call time
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def bot_logger(name: str, room: str = "") -> logging.Logger:
+    """logger of one bot, a child of its room's logger"""
+    return logging.getLogger(f"{BOT_LOGGER}.{room}.{name}" if room else f"{BOT_LOGGER}.{name}")
+
+
+def parse_levels(spec: str) -> dict[str, str]:
+    """parse "A1234=WARNING,A1234.Mortal_A=DEBUG" into {logger suffix: level}. Empty / None -> {}"""
+    levels = {}
+    if not spec:
+        return levels
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, level = part.rpartition("=")
+        if not sep or not name:
+            raise ValueError(f"Invalid bot log level: {part}, expected NAME=LEVEL")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: str = "INFO", bot_levels: dict[str, str] = None, stream=None):
+    """route all records through a queue to a background stream writer.
+    Call again in a forked process: the writer thread does not survive fork
+    params:
+        level(str): root level, e.g. "INFO". "DEBUG" adds the per-message logs
+        bot_levels(dict): {room or room.name: level} overrides below "majiang.bot"
+        stream: output stream, default sys.stdout"""
+    global _listener  # pylint: disable=global-statement
+    # record fields that FORMAT does not use, see "Optimization" in the logging docs:
+    # %(thread)d / %(threadName)s, %(process)d and %(processName)s are not available
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    if _listener is not None:
+        _listener.stop()
+    else:
+        atexit.register(stop_logging)
+    records = queue.SimpleQueue()
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(logging.Formatter(FORMAT))
+    _listener = logging.handlers.QueueListener(records, writer, respect_handler_level=True)
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(_QueueHandler(records))
+    root.setLevel(level.upper())
+    for name, lvl in (bot_levels or {}).items():
+        logging.getLogger(f"{BOT_LOGGER}.{name}").setLevel(lvl)
+    _listener.start()
+
+
+def stop_logging():
+    """flush the queued records and stop the writer thread"""
+    global _listener  # pylint: disable=global-statement
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
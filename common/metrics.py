@@ -0,0 +1,197 @@
+""" Low-overhead latency histograms / counters and a Prometheus text endpoint
+
+Code on the hot path keeps a Stages object (one per bot / engine) and calls
+    stages.observe("stage_name", seconds)
+Histograms have fixed buckets, an observation is one bisect and a few increments.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds, from 50us to 10s
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value) -> str:
+    """label value escaped as the text exposition format requires (backslash, quote, newline)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_str(labels: tuple) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+
+
+class Histogram:
+    """Fixed-bucket histogram"""
+
+    def __init__(self, buckets: tuple = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        """add one observation"""
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name: str, labels: tuple) -> list[str]:
+        """Prometheus text lines for this histogram"""
+        with self.lock:
+            counts = self.counts.copy()
+            total, count = self.sum, self.count
+        base = _labels_str(labels)
+        sep = "," if base else ""
+        lines = []
+        acc = 0
+        for bound, c in zip(self.buckets + ("+Inf",), counts):
+            acc += c
+            lines.append(f'{name}_bucket{{{base}{sep}le="{bound}"}} {acc}')
+        lines.append(f"{name}_sum{{{base}}} {total}")
+        lines.append(f"{name}_count{{{base}}} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self) -> None:
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n: int = 1):
+        """increase the counter by n"""
+        with self.lock:
+            self.value += n
+
+
+class MetricsRegistry:
+    """Holds all metrics of the process, keyed by (name, labels)"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self._histograms: dict[tuple, Histogram] = {}
+        self._counters: dict[tuple, Counter] = {}
+        self._gauges: dict[tuple, callable] = {}
+        self._help: dict[str, tuple[str, str]] = {}  # name: (type, help)
+
+    def histogram(self, name: str, help_str: str = "", **labels) -> Histogram:
+        """get or create a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+                self._help.setdefault(name, ("histogram", help_str))
+            return self._histograms[key]
+
+    def counter(self, name: str, help_str: str = "", **labels) -> Counter:
+        """get or create a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self._counters:
+                self._counters[key] = Counter()
+                self._help.setdefault(name, ("counter", help_str))
+            return self._counters[key]
+
+    def gauge(self, name: str, func, help_str: str = "", **labels):
+        """register a gauge whose value is read from func() at scrape time"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._gauges[key] = func
+            self._help.setdefault(name, ("gauge", help_str))
+
+    def remove_gauge(self, name: str, **labels):
+        """unregister a gauge"""
+        with self.lock:
+            self._gauges.pop((name, tuple(sorted(labels.items()))), None)
+
+    def render(self) -> str:
+        """all metrics in Prometheus text exposition format"""
+        with self.lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+            helps = dict(self._help)
+        lines = []
+        written = set()
+
+        def header(name):
+            if name not in written:
+                written.add(name)
+                mtype, help_str = helps[name]
+                if help_str:
+                    lines.append(f"# HELP {name} {help_str}")
+                lines.append(f"# TYPE {name} {mtype}")
+
+        for (name, labels), h in sorted(histograms, key=lambda x: x[0]):
+            header(name)
+            lines += h.render(name, labels)
+        for (name, labels), c in sorted(counters, key=lambda x: x[0]):
+            header(name)
+            lines.append(f"{name}{{{_labels_str(labels)}}} {c.value}")
+        for (name, labels), func in sorted(gauges, key=lambda x: x[0]):
+            header(name)
+            try:
+                value = func()
+            except Exception:  # pylint: disable=broad-except
+                continue
+            lines.append(f"{name}{{{_labels_str(labels)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+STAGE_METRIC = "majiang_stage_seconds"
+
+
+class Stages:
+    """Per-component stage timers: stage name -> histogram with fixed labels"""
+
+    def __init__(self, **labels) -> None:
+        self.labels = labels
+        self._hists: dict[str, Histogram] = {}
+
+    def observe(self, stage: str, seconds: float):
+        """record the time spent in stage"""
+        h = self._hists.get(stage)
+        if h is None:
+            h = METRICS.histogram(
+                STAGE_METRIC, "time spent per processing stage", stage=stage, **self.labels
+            )
+            self._hists[stage] = h
+        h.observe(seconds)
+
+    def totals(self) -> dict[str, tuple[int, float]]:
+        """{stage: (observations, total seconds)} of the stages observed so far"""
+        return {stage: (h.count, h.sum) for stage, h in self._hists.items()}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        """serve /metrics"""
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """serve the metrics on http://host:port/metrics from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
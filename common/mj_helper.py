@@ -2,10 +2,9 @@
 """
 
 from dataclasses import dataclass, field
-from functools import cmp_to_key
-import re
 
-import numpy as np
+from common.tile_codec import (
+    MAJIANG_TO_MJAI, MJAI_TO_MAJIANG, MJAI_SORT_RANK, ID_TO_MAJIANG, majiang_tehai_ids)
 
 TILES_MS_2_MJAI = {
     '0m': '5mr',
@@ -25,40 +24,32 @@ TILES_MJAI_2_MS = {value: key for key, value in TILES_MS_2_MJAI.items()}    # sw
 
 # 電脳麻雀
 def cvt_majiang2mjai(majiang_tile:str) -> str:
-    assert len(majiang_tile) == 2
-    ms_tile = majiang_tile[1] + majiang_tile[0]
-    return cvt_ms2mjai(ms_tile)
+    try:
+        return MAJIANG_TO_MJAI[majiang_tile]
+    except KeyError:
+        assert len(majiang_tile) == 2
+        return cvt_ms2mjai(majiang_tile[1] + majiang_tile[0])
 
 def cvt_mjai2maa(mjai_tile:str) -> str:
-    ms_tile = cvt_mjai2ms(mjai_tile)
-    return ms_tile[1] + ms_tile[0]
+    try:
+        return MJAI_TO_MAJIANG[mjai_tile]
+    except KeyError:
+        ms_tile = cvt_mjai2ms(mjai_tile)
+        return ms_tile[1] + ms_tile[0]
 
 def cvt_majiang_tehai_lst(str_tehai:str) -> list[str]:
-    lst = re.findall(r'([mpsz]\d+)', str_tehai)
-    if not lst:
-        return []
-    res = []
-    for tile in lst:
-        t = tile[0]
-        nums = tile[1:]
-        res.extend([t + n for n in nums])
-    return res
+    """ 'm2479s157z14' -> ['m2', 'm4', 'm7', 'm9', 's1', ...]"""
+    return [ID_TO_MAJIANG[i] for i in majiang_tehai_ids(str_tehai)]
 
 
 def cvt_ms2mjai(ms_tile:str) -> str:
     """ convert majsoul tile to mjai tile"""
-    if ms_tile in TILES_MS_2_MJAI:
-        return TILES_MS_2_MJAI[ms_tile]
-    else:
-        return ms_tile
+    return TILES_MS_2_MJAI.get(ms_tile, ms_tile)
     
 
 def cvt_mjai2ms(mjai_tile:str) -> str:
     """ convert mjai tile to majsoul tile"""
-    if mjai_tile in TILES_MJAI_2_MS:
-        return TILES_MJAI_2_MS[mjai_tile]
-    else:
-        return mjai_tile
+    return TILES_MJAI_2_MS.get(mjai_tile, mjai_tile)
 
 class MSType:
     """ Majsoul operation type constants"""
@@ -126,10 +117,12 @@ def mask_bits_to_bool_list(mask_bits):
 
 def eq(l, r):
     # Check for approximate equality using numpy's floating-point epsilon
+    import numpy as np  # imported on first use, keeps process startup light
     return np.abs(l - r) <= np.finfo(float).eps
 
 
 def softmax(arr, temperature=1.0):
+    import numpy as np
     arr = np.array(arr, dtype=float)  # Ensure the input is a numpy array of floats    
     if arr.size == 0:
         return arr  # Return the empty array if input is empty
@@ -212,12 +205,12 @@ class ActionUnicode:
 
 def cmp_mjai_tiles(tile1: str, tile2: str):
     """ compare function for sorting tiles"""
-    return MJAI_TILES_SORTED.index(tile1) - MJAI_TILES_SORTED.index(tile2)
+    return MJAI_SORT_RANK[tile1] - MJAI_SORT_RANK[tile2]
 
 
 def sort_mjai_tiles(mjai_tiles:list[str]) -> list[str]:
     """ sort mjai tiles"""
-    return sorted(mjai_tiles, key=cmp_to_key(cmp_mjai_tiles))
+    return sorted(mjai_tiles, key=MJAI_SORT_RANK.__getitem__)
 
 
 # sample data structure for mjai reaction - meta
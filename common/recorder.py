@@ -0,0 +1,137 @@
+""" Recording of GAME message streams
+A recording is a gzip compressed JSON-lines file with one entry per line:
+    ["i", majiang_msg]      message received by the bot
+    ["o", reaction]         reaction sent back for the previous message
+
+GameRecorder.record() only serializes and queues the entries: one background thread per process
+compresses and writes the recordings, off the socket callback thread.
+At exit, close_recordings() closes the recordings still open (games in progress), so that every
+file ends with a complete gzip stream.
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import pathlib
+import queue
+import threading
+import time
+import weakref
+from typing import Iterator
+
+from common.metrics import METRICS
+
+LOGGER = logging.getLogger(__name__)
+
+_SEPARATORS = (",", ":")
+
+_queue: queue.SimpleQueue = None
+_thread: threading.Thread = None
+_LOCK = threading.Lock()
+_RECORDERS: "weakref.WeakSet[GameRecorder]" = weakref.WeakSet()  # recorders not closed yet
+
+
+def _run(entries: queue.SimpleQueue):
+    while True:
+        item = entries.get()
+        if isinstance(item, threading.Event):
+            item.set()  # flush_recordings() marker
+            continue
+        recorder, lines = item
+        try:
+            recorder._write(lines)  # pylint: disable=protected-access
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Cannot write recording %s", recorder.path)
+
+
+def _writer_queue() -> queue.SimpleQueue:
+    """queue of the process-wide writer thread, started on first use (and again after fork)"""
+    global _queue, _thread
+    with _LOCK:
+        if _thread is None or not _thread.is_alive():
+            if _thread is None:
+                atexit.register(close_recordings)
+            _queue = queue.SimpleQueue()
+            _thread = threading.Thread(target=_run, args=(_queue,), name="recorder-writer", daemon=True)
+            _thread.start()
+            METRICS.gauge("majiang_recorder_queue_depth", _queue.qsize, "recording entries waiting for the writer")
+        return _queue
+
+
+def flush_recordings(timeout: float = None) -> bool:
+    """wait until the entries queued so far are written, returns False on timeout"""
+    with _LOCK:
+        if _thread is None or not _thread.is_alive():
+            return True
+        done = threading.Event()
+        _queue.put(done)
+    return done.wait(timeout)
+
+
+def close_recordings(timeout: float = None) -> bool:
+    """close every open recording and wait until they are written, returns False on timeout.
+    Runs at exit; call it explicitly where atexit does not run (e.g. multiprocessing workers)"""
+    with _LOCK:
+        recorders = list(_RECORDERS)
+    for recorder in recorders:
+        recorder.close()
+    return flush_recordings(timeout)
+
+
+class GameRecorder:
+    """Writes one bot's incoming GAME messages and outgoing reactions to a recording"""
+
+    def __init__(self, folder: str, name: str) -> None:
+        """params:
+        folder(str): folder for the recordings, created if missing
+        name(str): bot name, used in the file name"""
+        path = pathlib.Path(folder)
+        path.mkdir(parents=True, exist_ok=True)
+        self.path = path / f"{name}_{time.strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
+        self._file = None  # opened by the writer thread
+        self._closed = False
+        self._queue = _writer_queue()
+        with _LOCK:
+            _RECORDERS.add(self)
+
+    def record(self, msg: dict, reaction: dict | None):
+        """queue an incoming message and the reaction sent for it, returns at once.
+        Both are serialized now, so the caller may modify them afterwards"""
+        if self._closed:
+            return
+        lines = json.dumps(["i", msg], separators=_SEPARATORS, ensure_ascii=False) + "\n"
+        lines += json.dumps(["o", reaction], separators=_SEPARATORS, ensure_ascii=False) + "\n"
+        self._queue.put((self, lines))
+
+    def close(self):
+        """close the recording once the queued entries are written"""
+        if not self._closed:
+            self._closed = True
+            with _LOCK:
+                _RECORDERS.discard(self)
+            self._queue.put((self, None))
+
+    def _write(self, lines: str | None):
+        # writer thread only. None closes the file
+        if lines is None:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            return
+        if self._file is None:
+            self._file = gzip.open(self.path, "at", encoding="utf-8", compresslevel=6)
+        self._file.write(lines)
+
+
+def read_recording(path: str) -> Iterator[tuple[dict, dict | None]]:
+    """yield (majiang_msg, recorded reaction) pairs from a recording"""
+    msg = None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            kind, data = json.loads(line)
+            if kind == "i":
+                msg = data
+            elif kind == "o" and msg is not None:
+                yield msg, data
+                msg = None
@@ -0,0 +1,76 @@
+""" Integer tile codec with precomputed conversion tables
+
+Tile ids:
+    0 ~ 33      1m..9m, 1p..9p, 1s..9s, E S W N P F C   (same order as MJAI_TILES_34)
+    34 ~ 36     aka doras 5mr, 5pr, 5sr
+    37          unknown tile '?'
+
+Formats:
+    mjai        '1m', '5mr', 'E', '?'
+    Majsoul     '1m', '0m', '1z'
+    Majiang     'm1', 'm0', 'z1'
+All conversions are single list / dict lookups.
+"""
+
+N_TILES = 38
+AKA_BASE = 34
+UNKNOWN = 37
+
+_HONORS_MJAI = ["E", "S", "W", "N", "P", "F", "C"]
+
+ID_TO_MJAI: list[str] = (
+    [f"{n}{s}" for s in "mps" for n in range(1, 10)]
+    + _HONORS_MJAI
+    + ["5mr", "5pr", "5sr", "?"]
+)
+ID_TO_MS: list[str] = (
+    [f"{n}{s}" for s in "mps" for n in range(1, 10)]
+    + [f"{n}z" for n in range(1, 8)]
+    + ["0m", "0p", "0s", "?"]
+)
+ID_TO_MAJIANG: list[str] = [t[1] + t[0] if t != "?" else "?" for t in ID_TO_MS]
+
+MJAI_TO_ID: dict[str, int] = {t: i for i, t in enumerate(ID_TO_MJAI)}
+MS_TO_ID: dict[str, int] = {t: i for i, t in enumerate(ID_TO_MS)}
+MAJIANG_TO_ID: dict[str, int] = {t: i for i, t in enumerate(ID_TO_MAJIANG)}
+
+# tile id -> 34-kind id (aka doras count as their 5), '?' stays 37
+ID_TO_KIND: list[int] = list(range(34)) + [4, 13, 22, UNKNOWN]
+# tile id -> aka suit index (0 m / 1 p / 2 s), or -1 if not an aka dora
+ID_TO_AKA: list[int] = [-1] * 34 + [0, 1, 2, -1]
+
+# sort rank: suit by suit, aka dora right before its 5, '?' last
+_SORTED_MJAI = [
+    "1m", "2m", "3m", "4m", "5mr", "5m", "6m", "7m", "8m", "9m",
+    "1p", "2p", "3p", "4p", "5pr", "5p", "6p", "7p", "8p", "9p",
+    "1s", "2s", "3s", "4s", "5sr", "5s", "6s", "7s", "8s", "9s",
+    "E", "S", "W", "N", "P", "F", "C", "?",
+]
+ID_TO_SORT_RANK: list[int] = [_SORTED_MJAI.index(t) for t in ID_TO_MJAI]
+MJAI_SORT_RANK: dict[str, int] = {t: i for i, t in enumerate(_SORTED_MJAI)}
+
+# direct string -> string tables for the translator hot paths
+MAJIANG_TO_MJAI: dict[str, str] = {t: ID_TO_MJAI[i] for t, i in MAJIANG_TO_ID.items()}
+MJAI_TO_MAJIANG: dict[str, str] = {t: ID_TO_MAJIANG[i] for t, i in MJAI_TO_ID.items()}
+MS_TO_MJAI: dict[str, str] = {t: ID_TO_MJAI[i] for t, i in MS_TO_ID.items()}
+MJAI_TO_MS: dict[str, str] = {t: ID_TO_MS[i] for t, i in MJAI_TO_ID.items()}
+
+
+def mjai_sort_key(mjai_tile: str) -> int:
+    """sort key of a mjai tile"""
+    return MJAI_SORT_RANK[mjai_tile]
+
+
+def majiang_tehai_ids(str_tehai: str) -> list[int]:
+    """parse a Majiang shoupai string (e.g. 'm2479s157z14') into tile ids.
+    Digits count only directly after a suit letter or another digit, like [mpsz]\\d+"""
+    res = []
+    suit = None
+    for ch in str_tehai:
+        if ch in "mpsz":
+            suit = ch
+        elif suit is not None and ch.isdigit():
+            res.append(MAJIANG_TO_ID[suit + ch])
+        else:
+            suit = None
+    return res
@@ -1,17 +1,16 @@
 """ Common/utility methods
 no logging in this file because logging might not have been initialized yet
+requests / ctypes / subprocess are imported inside the helpers that need them, to keep startup light
 """
 
 from enum import Enum, auto
 import pathlib
+import math
 import sys
-import ctypes
 import time
-import subprocess
 import threading
 import random
 import string
-import requests
 
 
 class Folder:
@@ -69,6 +68,8 @@ class BotNotSupportingMode(Exception):
 
 def error_to_str(error: Exception, lan="") -> str:
     """Convert error to language specific string"""
+    import requests
+
     if isinstance(error, LocalModelException):
         return lan.LOCAL_MODEL_ERROR
     elif isinstance(error, BotNotSupportingMode):
@@ -118,6 +119,8 @@ def wait_for_file(file: str, timeout: int = 5) -> bool:
 
 def sub_run_args() -> dict:
     """return **args for subprocess.run"""
+    import subprocess
+
     startup_info = subprocess.STARTUPINFO()
     startup_info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
     startup_info.wShowWindow = subprocess.SW_HIDE
@@ -162,6 +165,8 @@ def random_str(length: int) -> str:
 def set_dpi_awareness():
     """Set DPI Awareness"""
     if sys.platform == "win32":
+        import ctypes
+
         try:
             ctypes.windll.shcore.SetProcessDpiAwareness(1)  # for Windows 8.1 and later
         except AttributeError:
@@ -178,29 +183,41 @@ ES_DISPLAY_REQUIRED = 0x00000002
 def prevent_sleep():
     """prevent system going into sleep/screen saver"""
     if sys.platform == "win32":
+        import ctypes
+
         ctypes.windll.kernel32.SetThreadExecutionState(
             ES_CONTINUOUS | ES_SYSTEM_REQUIRED | ES_DISPLAY_REQUIRED
         )
 
 
 class FPSCounter:
-    """Class for counting frames and calculating fps."""
+    """Class for counting frames and calculating fps.
+    Timestamps are kept in a fixed-size ring, so memory stays constant however often frame() is called.
+    """
 
-    def __init__(self):
+    def __init__(self, capacity: int = 1024):
+        """params:
+        capacity(int): max frames remembered, which is also the max fps that can be reported"""
         self.lock = threading.Lock()
-        self.timestamps = []  # List to hold timestamps of frame calls
+        self.capacity = capacity
+        self._ring = [0.0] * capacity  # timestamps of frame calls
+        self._next = 0  # ring index for the next timestamp
+        self._size = 0  # number of valid timestamps in the ring
         self.last_calc_time = time.time()  # Last time fps was calculated
         self.last_fps = 0  # Last calculated fps value
 
     def frame(self):
         """Indicates that a frame has been rendered or processed. Adds the current time to timestamps."""
         with self.lock:
-            self.timestamps.append(time.time())
+            self._ring[self._next] = time.time()
+            self._next = (self._next + 1) % self.capacity
+            if self._size < self.capacity:
+                self._size += 1
 
     def reset(self):
         """Resets the counter by clearing all recorded timestamps."""
         with self.lock:
-            self.timestamps.clear()
+            self._size = 0
 
     @property
     def fps(self):
@@ -208,9 +225,24 @@ class FPSCounter:
         if time.time() - self.last_calc_time < 0.5:
             return self.last_fps
         with self.lock:
-            # Filter out timestamps that are older than 1 second from the current time
+            # walk back from the newest timestamp until one is older than 1 second
             cur_time = time.time()
-            self.timestamps = [t for t in self.timestamps if cur_time - t < 1]
-            self.last_fps = len(self.timestamps)
+            n = 0
+            idx = self._next
+            while n < self._size:
+                idx = (idx - 1) % self.capacity
+                if cur_time - self._ring[idx] >= 1:
+                    break
+                n += 1
+            self.last_fps = n
             self.last_calc_time = cur_time
             return self.last_fps
+
+
+def percentiles(values: list[float], qs: tuple = (50, 95, 99)) -> dict[int, float]:
+    """Return {q: q-th percentile} of values (nearest rank). Empty values give 0 for every q"""
+    if not values:
+        return {q: 0.0 for q in qs}
+    ordered = sorted(values)
+    n = len(ordered)
+    return {q: ordered[min(n - 1, max(0, math.ceil(q / 100 * n) - 1))] for q in qs}
@@ -7,6 +7,8 @@ from common.mj_helper import MjaiType, GameInfo, MJAI_WINDS
 
 LOGGER = logging.getLogger("majiang")
 from common.utils import GameMode
+from common.metrics import Stages
+from common.hand import Hand
 from bot import Bot
 
 
@@ -18,8 +20,7 @@ class KyokuState:
         self.jikaze: str = None  # jikaze jifu (自风)
         self.kyoku: int = None  # Kyoku (局)
         self.honba: int = None  # Honba (本場)
-        self.my_tehai: list = None  # list of tehai in mjai format
-        self.my_tsumohai: str = None  # tsumohai in mjai format, or None
+        self.my_hand: Hand = Hand()  # own tehai and tsumohai
         self.doras_ms: list[str] = []  # list of doras in ms tile format
 
         ### flags
@@ -30,6 +31,16 @@ class KyokuState:
         self.self_in_reach: bool = False  # if self is in reach state
         self.player_reach: list = [False] * 4  # list of player reach states
 
+    @property
+    def my_tehai(self) -> list[str]:
+        """sorted list of tehai in mjai format (built on access)"""
+        return self.my_hand.tehai()
+
+    @property
+    def my_tsumohai(self) -> str:
+        """tsumohai in mjai format, or None"""
+        return self.my_hand.tsumohai_mjai()
+
 
 class GameState:
     """Stores Majsoul game state and processes inputs outputs to/from Bot"""
@@ -74,6 +85,27 @@ class GameState:
         """ if any new round has started (so game info is available)"""
         self.is_game_ended: bool = False  # if game has ended
 
+        ### Metrics
+        self.stages: Stages = Stages()  # stage timings, see set_metric_labels()
+        self.logger: logging.Logger = LOGGER  # per-bot logger, see set_logger()
+        self._bot_time: float = 0  # time spent in the bot during the current input()
+
+    def set_metric_labels(self, **labels):
+        """Set the labels (e.g. bot name, room) of the stage timings of this game and its bot"""
+        self.stages = Stages(**labels)
+        self.mjai_bot.set_metric_labels(**labels)
+
+    def reset(self):
+        """Forget the current game so that this object can play the next one.
+        The bot (and its engine), logger and metric labels are kept"""
+        stages, logger = self.stages, self.logger
+        self.__init__(self.mjai_bot)
+        self.stages, self.logger = stages, logger
+
+    def set_logger(self, logger: logging.Logger):
+        """Log this game's messages and reactions to logger (e.g. common.log_setup.bot_logger())"""
+        self.logger = logger
+
     def get_game_info(self) -> GameInfo:
         """Return game info. Return None if N/A"""
         if self.is_round_started:
@@ -117,9 +149,14 @@ class GameState:
             dict: Mjai message in dict format (i.e. AI's reaction) if any. May be None.
         """
         self.is_bot_calculating = True
-        start_time = time.time()
+        self._bot_time = 0
+        start_time = time.perf_counter()
         reaction = self._input_inner(majiang_msg)
-        time_used = time.time() - start_time
+        time_used = time.perf_counter() - start_time
+        # everything but the bot call is Majiang -> mjai translation
+        self.stages.observe("translate", time_used - self._bot_time)
+        if self._bot_time:
+            self.stages.observe("bot_react", self._bot_time)
         if reaction is not None:
             # Update last_reaction (not none) and set it to pending
             self.last_reaction = reaction
@@ -136,6 +173,12 @@ class GameState:
         returns:
             dict: Translated mjai reaction in majiang dict format
         """
+        start_time = time.perf_counter()
+        res = self._trans_mjai_react_inner(reaction)
+        self.stages.observe("trans_mjai_react", time.perf_counter() - start_time)
+        return res
+
+    def _trans_mjai_react_inner(self, reaction: dict | None) -> dict:
         # if it is a neglected message and thus have a wrong seq, the server will still neglect it
         # example: kaigang, say, player
         if reaction is None:
@@ -205,7 +248,7 @@ class GameState:
         elif re_type == MjaiType.RYUKYOKU:
             return {"daopai": "-", "seq": self.last_op_step}
         else:
-            LOGGER.warning("Unexpected reaction type: %s", re_type)
+            self.logger.warning("Unexpected reaction type: %s", re_type)
             return None
 
     def _input_inner(self, majiang_msg: dict) -> dict | None:
@@ -228,16 +271,16 @@ class GameState:
             if majiang_type in ["say", "player"]:
                 # Neglect these messages
                 return None
-            print("[GameState]: Unexpected message: ", majiang_type)
+            self.logger.warning("Unexpected message: %s", majiang_type)
             return None
-        print("[GameState]: ", majiang_msg)
+        self.logger.debug("[GameState]: %s", majiang_msg)
         try:
             seq = majiang_msg["seq"]
         except KeyError:
             if majiang_type == "kaigang":
                 pass  # kaigang message has no seq
             else:
-                print("[seq error]!", majiang_msg)
+                self.logger.warning("[seq error]! %s", majiang_msg)
             seq = self.last_op_step
 
         self.last_op_step = seq
@@ -286,7 +329,7 @@ class GameState:
                 tile_mjai = "?"
             else:  # my tsumo
                 tile_mjai = mj_helper.cvt_majiang2mjai(majiang_data["p"])
-                self.kyoku_state.my_tsumohai = tile_mjai
+                self.kyoku_state.my_hand.draw(tile_mjai)
             self.mjai_pending_input_msgs.append(
                 {"type": MjaiType.TSUMO, "actor": actor, "pai": tile_mjai}
             )
@@ -301,13 +344,7 @@ class GameState:
 
             tsumogiri = "_" in majiang_data["p"]
             if actor == self.seat:
-                if self.kyoku_state.my_tsumohai:
-                    self.kyoku_state.my_tehai.append(self.kyoku_state.my_tsumohai)
-                    self.kyoku_state.my_tsumohai = None
-                self.kyoku_state.my_tehai.remove(tile_mjai)
-                self.kyoku_state.my_tehai = mj_helper.sort_mjai_tiles(
-                    self.kyoku_state.my_tehai
-                )
+                self.kyoku_state.my_hand.discard(tile_mjai)
 
             if "*" in majiang_data["p"]:  # Player declares reach
                 if actor == self.seat:  # self reach
@@ -359,10 +396,7 @@ class GameState:
                 )
             if actor == self.seat:
                 for c in consumed_mjai:
-                    self.kyoku_state.my_tehai.remove(c)
-                self.kyoku_state.my_tehai = mj_helper.sort_mjai_tiles(
-                    self.kyoku_state.my_tehai
-                )
+                    self.kyoku_state.my_hand.remove(c)
 
             action_type = -1
             if len(consumed_mjai) == 3:
@@ -437,16 +471,12 @@ class GameState:
                 raise RuntimeError(f"Unexpected gang tiles: {majiang_data['m']}")
 
             if actor == self.seat:
-                self.kyoku_state.my_tehai.append(self.kyoku_state.my_tsumohai)
-                self.kyoku_state.my_tsumohai = None
+                self.kyoku_state.my_hand.merge_tsumohai()
                 if action_type == MjaiType.ANKAN:
                     for c in consumed_mjai:
-                        self.kyoku_state.my_tehai.remove(c)
+                        self.kyoku_state.my_hand.remove(c)
                 else:
-                    self.kyoku_state.my_tehai.remove(pai)
-                self.kyoku_state.my_tehai = mj_helper.sort_mjai_tiles(
-                    self.kyoku_state.my_tehai
-                )
+                    self.kyoku_state.my_hand.remove(pai)
 
             return self._react_all(majiang_data)
 
@@ -458,7 +488,7 @@ class GameState:
         if majiang_type == "pingju":
             return self.ms_end_kyoku()
 
-        LOGGER.warning("Unexpected majiang_type: %s", majiang_type)
+        self.logger.warning("Unexpected majiang_type: %s", majiang_type)
         return None
 
     def ms_new_round(self, majiang_data: dict) -> dict:
@@ -482,15 +512,14 @@ class GameState:
         my_tehai_majiang_str = majiang_data["shoupai"][(self.seat - oya)]
         assert my_tehai_majiang_str != ""
         my_tehai_majiang = mj_helper.cvt_majiang_tehai_lst(my_tehai_majiang_str)
-        self.kyoku_state.my_tehai = [
-            mj_helper.cvt_majiang2mjai(tile) for tile in my_tehai_majiang
-        ]
-        self.kyoku_state.my_tehai = mj_helper.sort_mjai_tiles(self.kyoku_state.my_tehai)
+        self.kyoku_state.my_hand = Hand(
+            [mj_helper.cvt_majiang2mjai(tile) for tile in my_tehai_majiang]
+        )
 
         tehais_mjai[self.seat] = self.kyoku_state.my_tehai
         # mjai accepts 13 tiles + following tsumohai event
         # Majiang is the same as mjai, different from majsoul
-        assert len(self.kyoku_state.my_tehai) == 13
+        assert len(tehais_mjai[self.seat]) == 13
 
         # append messages and react
         start_kyoku_msg = {
@@ -513,7 +542,7 @@ class GameState:
         self.mode_id = -1
         seatList: list = majiang_data["player"]
         if not seatList:
-            LOGGER.debug("No seatList in majiang_data, game has likely ended")
+            self.logger.debug("No seatList in majiang_data, game has likely ended")
             self.is_game_ended = True
             return None
         if len(seatList) == 4:
@@ -522,7 +551,7 @@ class GameState:
             self.game_mode = GameMode.MJ3P
         else:
             raise RuntimeError(f"Unexpected seat len:{len(seatList)}")
-        LOGGER.info("Game Mode: %s", self.game_mode.name)
+        self.logger.info("Game Mode: %s", self.game_mode.name)
         self.seat = (majiang_data["id"] - majiang_data["qijia"] + 4) % 4
         self.mjai_bot.init_bot(self.seat, self.game_mode)
         # Start_game has no effect for mjai bot, omit here
@@ -564,31 +593,30 @@ class GameState:
         returns:
             dict: the last reaction(output) from bot, or None
         """
+        start_time = time.perf_counter()
         try:
             if len(self.mjai_pending_input_msgs) == 1:
-                print("[Bot in]:", self.mjai_pending_input_msgs[0])
-                LOGGER.info("Bot in: %s", self.mjai_pending_input_msgs[0])
+                self.logger.debug("Bot in: %s", self.mjai_pending_input_msgs[0])
                 output_reaction = self.mjai_bot.react(self.mjai_pending_input_msgs[0])
             else:
-                print(
-                    "[Bot in]:", "\n".join(str(m) for m in self.mjai_pending_input_msgs)
-                )
-                LOGGER.info(
-                    "Bot in (batch):\n%s",
-                    "\n".join(str(m) for m in self.mjai_pending_input_msgs),
-                )
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(
+                        "Bot in (batch):\n%s",
+                        "\n".join(str(m) for m in self.mjai_pending_input_msgs),
+                    )
                 output_reaction = self.mjai_bot.react_batch(
                     self.mjai_pending_input_msgs
                 )
         except Exception as e:
-            LOGGER.error("Bot react error: %s", e, exc_info=True)
+            self.logger.error("Bot react error: %s", e, exc_info=True)
             output_reaction = None
+        self._bot_time += time.perf_counter() - start_time
         self.mjai_pending_input_msgs = []  # clear intput queue
 
         if output_reaction is None:
             return None
         else:
-            LOGGER.info("Bot out: %s", output_reaction)
+            self.logger.debug("Bot out: %s", output_reaction)
             if self.game_mode == GameMode.MJ3P:
                 is_3p = True
             else:
@@ -0,0 +1,245 @@
+"""asyncio version of MajiangBot
+All bots of the process share one event loop, so idle / waiting bots cost no OS thread.
+Engine evaluations run in a thread pool, the event loop never blocks on inference.
+Requires python-socketio[asyncio_client] (aiohttp)
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import time
+
+import aiohttp
+import socketio
+
+from bot_runtime import BotRuntimeMixin
+from common.recorder import GameRecorder
+from common.connection import Backoff, ConnectTimer
+from majiang_socket_bot import MajiangBotSetting, RoomSetting
+
+_EXECUTOR: concurrent.futures.ThreadPoolExecutor = None
+_CONNECTOR: aiohttp.TCPConnector = None
+_CONNECT_SLOTS: asyncio.Semaphore = None
+_BACKOFF = Backoff()
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """return the process-wide executor for engine evaluations"""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(32, (os.cpu_count() or 1) + 4),
+            thread_name_prefix="majiang-engine",
+        )
+    return _EXECUTOR
+
+
+def _connection_pool(setting: MajiangBotSetting) -> tuple[aiohttp.TCPConnector, asyncio.Semaphore]:
+    """return the keep-alive connection pool and the connect concurrency limit shared by the bots of the loop"""
+    global _CONNECTOR, _CONNECT_SLOTS
+    if _CONNECTOR is None:
+        _CONNECTOR = aiohttp.TCPConnector(limit=0, limit_per_host=32)
+        _CONNECT_SLOTS = asyncio.Semaphore(setting.connect_concurrency)
+    return _CONNECTOR, _CONNECT_SLOTS
+
+
+class AsyncMajiangBot(BotRuntimeMixin):
+    sio: socketio.AsyncClient = None
+    session: aiohttp.ClientSession = None
+    _loader: asyncio.Future = None  # loads the engine in the executor while the bot connects
+
+    def __init__(self, setting: MajiangBotSetting, room="", botname=""):
+        self._init_runtime(setting, room, botname)
+        # GAME messages must be processed in order, asyncio.Lock wakes waiters FIFO
+        self._game_lock = asyncio.Lock()
+
+    @classmethod
+    async def create(cls, setting: MajiangBotSetting, room="", botname=""):
+        """build the bot, the model is loaded by start()"""
+        return cls(setting, room, botname)
+
+    async def loop(self):
+        await self.sio.wait()
+
+    async def login(self):
+        """authenticate once, the session (cookies) is reused for every game of this bot"""
+        self.log.info("Starting bot")
+        connector, slots = _connection_pool(self.setting)
+        # own cookies, shared keep-alive connections.
+        # unsafe: also keep cookies from servers addressed by IP, e.g. http://127.0.0.1:8000/
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+        )
+
+        async def post():
+            async with self.session.post(
+                self.server + self.authpath, data={"name": self.myname, "passwd": "*"}
+            ) as r:
+                if not r.status in [200, 302]:
+                    raise ConnectionError(
+                        f"Failed to auth on the server: {self.server + self.authpath} {r.status} {await r.text()}"
+                    )
+
+        async with slots:
+            await _BACKOFF.run_async(
+                post, f"auth of {self.myname}", (aiohttp.ClientError, ConnectionError)
+            )
+
+    async def start(self):
+        """play one game (log in first if needed), then reset for the next one"""
+        if self._loader is None:
+            # auth and socket setup do not wait for the torch import / model load
+            self._loader = asyncio.get_running_loop().run_in_executor(
+                get_executor(), self.load_bot
+            )
+        try:
+            self.connect_timer = ConnectTimer(self.stages)
+            if self.session is None:
+                await self.login()
+            self.connect_timer.mark("auth")
+            if self.record_dir:
+                self.recorder = GameRecorder(self.record_dir, self.myname)
+            self.sio = socketio.AsyncClient(
+                http_session=self.session, reconnection_attempts=3
+            )
+            self.callbacks()
+            kwargs = {"socketio_path": self.socketpath}
+            if self.setting.websocket_only:
+                kwargs["transports"] = ["websocket"]
+            async with _connection_pool(self.setting)[1]:
+                await _BACKOFF.run_async(
+                    lambda: self.sio.connect(self.server, **kwargs),
+                    f"socket connect of {self.myname}",
+                    (socketio.exceptions.ConnectionError, OSError),
+                )
+            await self.loop()
+        except Exception:
+            # log in again next time, the session may be the problem
+            if self.session is not None:
+                await self.session.close()
+                self.session = None
+            raise
+        finally:
+            if self.recorder:
+                self.recorder.close()
+                self.recorder = None
+            # reset_game() builds the libriichi bots of the next game: off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                get_executor(), self.reset_game
+            )
+        return 0
+
+    def _decide(self, data) -> tuple:
+        """run on the executor: feed GAME msg to the game state and translate the reaction"""
+        mjai_react = self.game.input(data)
+        reaction = self.game.trans_mjai_react(mjai_react)
+        return mjai_react, reaction
+
+    def callbacks(self):
+        @self.sio.event
+        async def connect():
+            self.log.info("Connected to server: %s", self.server)
+
+        @self.sio.event
+        async def connect_error(data):
+            self.log.warning("Connection failed! %s", data)
+
+        @self.sio.event
+        async def disconnect():
+            self.log.info("Disconnected")
+
+        @self.sio.on("HELLO")
+        async def on_hello(data):
+            self.connect_timer.mark("hello")
+            self.log.info("HELLO received: %s", data)
+            self.is_in_room = False
+            if not data:
+                self.log.error("Login failed!")
+                await self.sio.disconnect()
+            else:
+                if self.myuid and "offline" in data.keys():
+                    self.log.warning("Got kicked out")
+                    self.is_in_room = False
+                else:
+                    self.myuid = data["uid"]
+                    if self.room:
+                        self.log.info("Joining room: %s", self.room)
+                        await self.sio.emit("ROOM", self.room)
+
+        @self.sio.on("ROOM")
+        async def on_room(data):
+            self.log.info("ROOM received: %s", data)
+            if not self.is_in_room:
+                self.connect_timer.mark("room_join")
+                self.log.info("Connected: %s", self.connect_timer.summary())
+            self.is_in_room = True
+
+        @self.sio.on("START")
+        async def on_start():
+            self.is_in_game = True
+            self.log.info("START received")
+
+        @self.sio.on("END")
+        async def on_end(data):
+            self._ended_at = time.perf_counter()
+            self.log.info("END received")
+            self.is_in_game = False
+            self.is_in_room = False
+            if self.archive and data:
+                self.archive.submit(data, self.myname, self.room)
+            await self.sio.disconnect()
+
+        @self.sio.on("ERROR")
+        async def on_error(data):
+            self.log.error("ERROR received: %s", data)
+            await self.sio.disconnect()
+
+        @self.sio.on("GAME")
+        async def on_game(data):
+            if "players" in data.keys():
+                self.log.info("GAME received: %s", data)
+                return
+            async with self._game_lock:
+                loop = asyncio.get_running_loop()
+                mjai_react, reaction = await loop.run_in_executor(
+                    get_executor(), self._decide, data
+                )
+                if self.recorder:
+                    self.recorder.record(data, reaction)
+                self.log.debug("%s %s", mjai_react, reaction)
+                if self.game.last_reaction_time:
+                    self.log.debug("thought %s s", self.game.last_reaction_time)
+                start_time = time.perf_counter()
+                await self.sio.emit("GAME", reaction)
+                self.stages.observe("sio_emit", time.perf_counter() - start_time)
+                self.n_messages.inc()
+                if mjai_react is not None:
+                    self.n_decisions.inc()
+                    self.decision_fps.frame()
+
+
+async def run_room(setting: MajiangBotSetting, room: RoomSetting):
+    """Keep room.number bots playing in the room, game after game. Runs forever.
+    The bots are a warm pool, see majiang_socket_bot.run_room"""
+    bots = [
+        await AsyncMajiangBot.create(
+            setting, room.room, f"{room.name_prefix}{chr(ord('A')+_)}"
+        )
+        for _ in range(room.number)
+    ]
+    for b in bots[1:]:
+        b.archive = None  # the room's game is archived once, by its first bot
+    while True:
+        results = await asyncio.gather(
+            *(b.start() for b in bots), return_exceptions=True
+        )
+        for b, res in zip(bots, results):
+            if isinstance(res, Exception):
+                b.log.error("stopped with error", exc_info=res)
+
+
+async def run_rooms(setting: MajiangBotSetting, rooms: list[RoomSetting]):
+    """Run all rooms on the current event loop"""
+    await asyncio.gather(*(run_room(setting, r) for r in rooms))
@@ -1,18 +1,20 @@
 from dataclasses import dataclass
+import logging
 import threading
 import socketio
 import requests
-import random
-import string
 import time
-from bot import Bot, get_bot
-from game_state import GameState
+from bot.local.config import EngineConfig
+from bot_runtime import BotRuntimeMixin
+from common.recorder import GameRecorder
+from common.metrics import start_metrics_server
+from common.decision_worker import DecisionWorker
+from common.connection import ConnectTimer, get_connection_manager
+from common.log_setup import parse_levels, setup_logging
+from common.cpu_layout import describe_layout, parse_cpu_list, pin_thread
 import argparse
 
-
-def generate_random_name(length=5):
-    letters = string.ascii_letters
-    return "Mortal_" + "".join([random.choice(letters) for _ in range(length)])
+LOGGER = logging.getLogger(__name__)
 
 
 @dataclass
@@ -20,85 +22,218 @@ class MajiangBotSetting:
     server: str = "https://kobalab.net/"
     apppath: str = "majiang/"
     modelpath: str = "model.pth"
+    device: str = None  # torch device for the engine, None to pick automatically
+    batch_window_ms: float = 0  # cross-bot micro-batching window, 0 to disable
+    max_batch: int = 16  # max rows per micro-batch
+    compile_mode: str = None  # None (eager), 'trace' or 'inductor'
+    precision: str = "fp32"  # 'fp32', 'bf16' or 'int8'
+    fused: bool = True  # inference-only Brain (folded batch norms), False keeps memory-mapped weights shared
+    intra_op_threads: int = 0  # threads inside one op (process-wide for torch), 0 for the library default
+    inter_op_threads: int = 0  # threads across ops (process-wide for torch), 0 for the library default
+    inference_cpus: str = None  # cpu list for engine evaluations, e.g. "4-15", None for no pinning
+    io_cpus: str = None  # cpu list for socket / bot threads, e.g. "0-3", None for no pinning
+    cache_entries: int = 0  # max rows of the engine's q value cache, 0 for no count limit
+    cache_mb: float = 0  # max memory of the engine's q value cache in MB, 0 for no memory limit
+    quick_eval: bool = True  # answer single-option decisions without a forward pass
+    always_hora: bool = False  # always take hora when legal, without a forward pass
+    agari_guard: bool = False  # libriichi's rule-based agari guard
+    decision_worker: bool = False  # handle GAME messages on a per-bot worker thread, not the socket thread
+    decision_queue: int = 64  # max GAME messages queued for the decision worker
+    record_dir: str = None  # folder to record GAME messages / reactions into, None to disable
+    archive_dir: str = None  # folder of the game archive (common.archive), None to disable
+    metrics_port: int = None  # local port of the Prometheus metrics endpoint, None to disable
+    websocket_only: bool = False  # connect socket.io over websocket, without the long-polling handshake
+    connect_concurrency: int = 16  # max bots of the process authenticating / connecting at the same time
+    log_level: str = "INFO"  # root log level, DEBUG adds the per-message logs
+    bot_log_levels: str = None  # per room / bot log levels, e.g. "A1234=WARNING,A1234.Mortal_A1234_A=DEBUG"
+
+    def engine_config(self) -> EngineConfig:
+        """return the engine config described by this setting"""
+        return EngineConfig(
+            device=self.device,
+            batch_window_ms=self.batch_window_ms,
+            max_batch=self.max_batch,
+            compile_mode=self.compile_mode,
+            precision=self.precision,
+            fused=self.fused,
+            intra_op_threads=self.intra_op_threads,
+            inter_op_threads=self.inter_op_threads,
+            inference_cpus=parse_cpu_list(self.inference_cpus),
+            cache_entries=self.cache_entries,
+            cache_mb=self.cache_mb,
+            quick_eval=self.quick_eval,
+            always_hora=self.always_hora,
+            agari_guard=self.agari_guard,
+        )
+
+
+@dataclass
+class RoomSetting:
+    room: str = ""
+    number: int = 3  # number of bots joining the room, 1 ~ 3
+    name_prefix: str = "Mortal_"
+
+    def __post_init__(self):
+        if self.number not in [1, 2, 3]:
+            raise ValueError(f"Number of bots should be 1 ~ 3 (room {self.room})")
+
+
+def parse_rooms(spec: str, default_number: int = 3) -> list[RoomSetting]:
+    """Parse a room list like "A1234:3,B5678:2" into room settings.
+    The bot number can be omitted for a room ("A1234"), default_number is used then.
+    Raises ValueError for a malformed list"""
+    rooms = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        room, _, number = item.partition(":")
+        if number and not number.strip().isdigit():
+            raise ValueError(f"Bad bot number {number!r} for room {room!r}")
+        rooms.append(
+            RoomSetting(room=room, number=int(number) if number else default_number)
+        )
+    if len(rooms) > 1:
+        for r in rooms:
+            r.name_prefix = f"Mortal_{r.room}_"
+    return rooms
+
 
+def run_room(setting: MajiangBotSetting, room: RoomSetting):
+    """Keep room.number bots playing in the room, game after game. Blocks forever.
+    The bots are a warm pool: engine, session and name are kept, only the game state is reset.
+    Building them does not load the model, each bot loads it while it logs in (see MajiangBot.start)"""
+    bots = [
+        MajiangBot(setting, room.room, f"{room.name_prefix}{chr(ord('A')+_)}")
+        for _ in range(room.number)
+    ]
+    for b in bots[1:]:
+        b.archive = None  # the room's game is archived once, by its first bot
+    while True:
+        threads = [threading.Thread(target=b.start) for b in bots]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
 
-class MajiangBot:
+
+class MajiangBot(BotRuntimeMixin):
     sio: socketio.Client = None
-    server: str = ""
-    authpath: str = ""
-    socketpath: str = ""
-    modelpath: str = ""
-    bot: Bot = None
-    game: GameState = None
-    myuid = ""
-    myname = ""
-    is_in_room = False
-    is_in_game = False
-    room = ""
     session: requests.Session = None
+    worker: DecisionWorker = None
+    _loader: threading.Thread = None  # loads the engine while the bot connects
 
     def __init__(self, setting: MajiangBotSetting, room="", botname=""):
-        self.server = setting.server
-        self.authpath = setting.apppath + "server/auth/"
-        self.socketpath = setting.apppath + "server/socket.io/"
-        self.modelpath = setting.modelpath
-        self.bot = get_bot(setting.modelpath)
-        self.game = GameState(self.bot)
-        self.room = room
-        self.myname = botname if botname else generate_random_name()
+        self._init_runtime(setting, room, botname)
+        self.use_worker = setting.decision_worker
+        self.decision_queue = setting.decision_queue
+        self.connections = get_connection_manager(
+            self.server,
+            self.authpath,
+            max_concurrent=setting.connect_concurrency,
+            websocket_only=setting.websocket_only,
+        )
 
     def loop(self):
         self.sio.wait()
 
+    def login(self):
+        """authenticate once, the session (cookies) is reused for every game of this bot"""
+        self.log.info("Starting bot")
+        # pooled keep-alive connections, retried with backoff
+        self.session = self.connections.login(self.myname)
+
     def start(self):
-        # self.session.verify = False
-        print("Starting bot:", self.myname)
-        self.session = requests.Session()
-        r = self.session.post(
-            self.server + self.authpath, data={"name": self.myname, "passwd": "*"}
-        )
-        if not r.status_code in [200, 302]:
-            print(r.status_code, r.text)
-            raise Exception(
-                "Failed to auth on the server: " + self.server + self.authpath
+        """play one game (log in first if needed), then reset for the next one"""
+        if self._loader is None:
+            # auth and socket setup do not wait for the torch import / model load
+            self._loader = threading.Thread(
+                target=self.load_bot, name=f"load-{self.myname}", daemon=True
             )
-        time.sleep(1)
-        self.sio = socketio.Client(http_session=self.session, reconnection_attempts=3)
-        self.callbacks()
-        self.sio.connect(self.server, socketio_path=self.socketpath)
-        self.loop()
+            self._loader.start()
+        try:
+            self.connect_timer = ConnectTimer(self.stages)
+            if self.session is None:
+                self.login()
+            self.connect_timer.mark("auth")
+            if self.record_dir:
+                self.recorder = GameRecorder(self.record_dir, self.myname)
+            if self.use_worker:
+                self.worker = DecisionWorker(
+                    self.handle_game,
+                    self.decision_queue,
+                    name=f"decision-{self.myname}",
+                    bot=self.myname,
+                    room=self.room,
+                )
+            self.sio = socketio.Client(http_session=self.session, reconnection_attempts=3)
+            self.callbacks()
+            self.connections.connect(self.sio, self.server, self.socketpath, self.myname)
+            self.loop()
+        except Exception:
+            # log in again next time, the session may be the problem
+            self.session = None
+            raise
+        finally:
+            if self.worker:
+                self.worker.close()
+                self.worker = None
+            if self.recorder:
+                self.recorder.close()
+                self.recorder = None
+            self.reset_game()
         return 0
 
+    def handle_game(self, data: dict):
+        """translate a GAME message, evaluate it and emit the reply"""
+        mjai_react = self.game.input(data)
+        reaction = self.game.trans_mjai_react(mjai_react)
+        if self.recorder:
+            self.recorder.record(data, reaction)
+        self.log.debug("%s %s", mjai_react, reaction)
+        # self.log.debug("(tehai) %s", self.game.kyoku_state.my_tehai)
+        if self.game.last_reaction_time:
+            self.log.debug("thought %s s", self.game.last_reaction_time)
+            # time.sleep(self.game.last_reaction_time)
+        start_time = time.perf_counter()
+        self.sio.emit("GAME", reaction)
+        self.stages.observe("sio_emit", time.perf_counter() - start_time)
+        self.n_messages.inc()
+        if mjai_react is not None:
+            self.n_decisions.inc()
+            self.decision_fps.frame()
+
     def callbacks(self):
         @self.sio.event
         def connect():
-            print(self.myname, "Connected to server:", self.server)
+            self.log.info("Connected to server: %s", self.server)
 
         @self.sio.event
         def connect_error(data):
-            print(self.myname, ": connection failed!", data)
+            self.log.warning("Connection failed! %s", data)
 
         @self.sio.event
         def disconnect():
-            print(self.myname, "is disconnected!")
+            self.log.info("Disconnected")
 
         @self.sio.on("HELLO")
         def on_hello(data):
-            print(self.myname, ": HELLO received:", data)
+            self.connect_timer.mark("hello")
+            self.log.info("HELLO received: %s", data)
             self.is_in_room = False
             if not data:
-                print(self.myname, "Login failed!")
+                self.log.error("Login failed!")
                 self.sio.disconnect()
             else:
                 if self.myuid and "offline" in data.keys():
-                    print(self.myname, "get kicked out")
+                    self.log.warning("Got kicked out")
                     self.is_in_room = False
                     # self.sio.start_background_task(find_room)
                     # self.sio.disconnect()
                 else:
                     self.myuid = data["uid"]
                     if self.room:
-                        print(self.myname, "Joining room:", self.room)
+                        self.log.info("Joining room: %s", self.room)
                         self.sio.emit("ROOM", self.room)
                     else:
                         # self.sio.start_background_task(find_room)
@@ -107,7 +242,10 @@ class MajiangBot:
 
         @self.sio.on("ROOM")
         def on_room(data):
-            print(self.myname, "ROOM received:", data)
+            self.log.info("ROOM received: %s", data)
+            if not self.is_in_room:
+                self.connect_timer.mark("room_join")
+                self.log.info("Connected: %s", self.connect_timer.summary())
             self.is_in_room = True
 
         # Modded Server: <ROOMS> command
@@ -129,41 +267,39 @@ class MajiangBot:
         @self.sio.on("START")
         def on_start():
             self.is_in_game = True
-            print(self.myname, "START received")
+            self.log.info("START received")
 
         @self.sio.on("END")
         def on_end(data):
-            print(self.myname, "END received")
+            self._ended_at = time.perf_counter()
+            self.log.info("END received")
+            if self.worker:
+                # replies to the last messages are still emitted in order before disconnecting
+                self.worker.close()
+            self.log.info("Forward passes skipped this game: %d", self.bot.skipped_forward)
             self.is_in_game = False
             self.is_in_room = False
-            # save logs
-            # fn = f"logs/{self.myname}_{int(time.time())}_log.json"
-            # import json
-
-            # with open(fn, "w", encoding="utf-8") as json_file:
-            #     json.dump(data, json_file, ensure_ascii=False)
+            # save the paipu, written by the archive's background thread
+            if self.archive and data:
+                self.archive.submit(data, self.myname, self.room)
             self.sio.disconnect()
 
         @self.sio.on("ERROR")
         def on_error(data):
-            print(self.myname, "ERROR received:", data)
+            self.log.error("ERROR received: %s", data)
             self.sio.disconnect()
 
         @self.sio.on("GAME")
         def on_game(data):
             if "players" in data.keys():
-                print(self.myname, "GAME received:", data)
+                self.log.info("GAME received: %s", data)
                 return
             # msg = json.loads(data)
             # print(game.input(msg))
-            mjai_react = self.game.input(data)
-            reaction = self.game.trans_mjai_react(mjai_react)
-            print(f"[{self.myname}]", mjai_react, reaction)
-            # print(f"[{self.myname}](tehai)", self.game.kyoku_state.my_tehai)
-            if self.game.last_reaction_time:
-                print("thought", f"{self.game.last_reaction_time}", "s")
-                # time.sleep(self.game.last_reaction_time)
-            self.sio.emit("GAME", reaction)
+            if self.worker:
+                self.worker.submit(data)
+            else:
+                self.handle_game(data)
 
         # def find_room():
         #     while not self.is_in_room:
@@ -183,7 +319,181 @@ if __name__ == "__main__":
         type=str,
         default="model.pth",
     )
+    parser.add_argument(
+        "-d",
+        "--device",
+        help="torch device for the model, e.g. cpu / cuda (default: auto)",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--batch-window-ms",
+        help="collect engine calls from all bots for this many ms and evaluate them in one batch (default: 0, off)",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--max-batch",
+        help="max rows per batched evaluation, a full batch is evaluated without waiting (default: 16)",
+        type=int,
+        default=16,
+    )
+    parser.add_argument(
+        "--compile",
+        dest="compile_mode",
+        help="compile the model for inference with TorchScript (trace) or torch.compile (inductor)",
+        choices=["trace", "inductor"],
+        default=None,
+    )
+    parser.add_argument(
+        "--precision",
+        help="inference precision: fp32, bf16 (autocast) or int8 (dynamic quantization, cpu only)"
+        " (default: fp32, see bench.precision)",
+        choices=["fp32", "bf16", "int8"],
+        default="fp32",
+    )
+    parser.add_argument(
+        "--no-fuse",
+        dest="fused",
+        help="run the model as loaded, without folding batch norms (slim checkpoints converted fused"
+        " are always run as loaded)",
+        action="store_false",
+    )
+    parser.add_argument(
+        "--eval-cache",
+        help="cache the q values of up to this many observations in the engine (default: 0, off, see bench.cache)",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--eval-cache-mb",
+        help="cap the memory of the observation cache at this many MB (default: 0, no cap)",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--no-quick-eval",
+        dest="quick_eval",
+        help="run the model even when only one action is legal",
+        action="store_false",
+    )
+    parser.add_argument(
+        "--always-hora",
+        help="always declare hora when it is legal, without running the model",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--agari-guard",
+        help="enable libriichi's rule-based agari guard (Mortal's enable_rule_based_agari_guard)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--intra-op-threads",
+        help="threads inside one op of the engine (torch.set_num_threads / ORT), 0 for the default",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--inter-op-threads",
+        help="threads across ops of the engine (torch / ORT), 0 for the default",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--inference-cpus",
+        help='run engine evaluations on these cpus, e.g. "4-15" (Linux)',
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--io-cpus",
+        help='run socket and bot threads on these cpus, e.g. "0-3" (Linux)',
+        type=str,
+        default=None,
+    )
     parser.add_argument("-r", "--room", help="room name", type=str)
+    parser.add_argument(
+        "--rooms",
+        help='rooms with the number of bots for each, e.g. "A1234:3,B5678:2". Overrides -r/-n',
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--decision-worker",
+        help="evaluate GAME messages on a per-bot worker thread, so the socket keeps answering pings while the model thinks",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--decision-queue",
+        help="max GAME messages queued per bot for the decision worker, the socket thread waits when full (default: 64)",
+        type=int,
+        default=64,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="run the rooms in this many worker processes under a supervisor (default: 0, all in this process)",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        help="run all bots of the process on one asyncio event loop instead of one thread per bot",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--record",
+        help="record every bot's GAME messages and reactions into this folder (for bench.replay)",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--archive",
+        help="archive the paipu of every finished game into this folder (compressed, indexed, see common.archive)",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--metrics-port",
+        help="serve stage latency histograms and counters in Prometheus format on this local port"
+        " (worker i of --workers uses port + 1 + i)",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--pin-workers",
+        help="pin each worker process to its own share of the CPU cores",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--websocket-only",
+        help="connect socket.io over websocket directly, without starting with long-polling",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--connect-concurrency",
+        help="max bots authenticating / connecting at the same time, failures are retried with backoff (default: 16)",
+        type=int,
+        default=16,
+    )
+    parser.add_argument(
+        "--log-level",
+        help="log level: DEBUG (every message and reaction), INFO, WARNING, ... (default: INFO)",
+        type=str,
+        default="INFO",
+    )
+    parser.add_argument(
+        "--bot-log-level",
+        help='log levels per room or bot, e.g. "A1234=WARNING,A1234.Mortal_A1234_A=DEBUG"',
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--import-report",
+        help="print the import time of the startup path and exit (1 if torch or another heavy module is imported)",
+        action="store_true",
+    )
     parser.add_argument(
         "-s",
         "--server",
@@ -195,22 +505,78 @@ if __name__ == "__main__":
         "-a", "--apppath", help="app path on the server", type=str, default="majiang/"
     )
     args = parser.parse_args()
+    if args.import_report:
+        from common.import_report import main as import_report
+
+        exit(import_report([]))
+    setup_logging(args.log_level, parse_levels(args.bot_log_level))
     print(args)
-    if args.number not in [1, 2, 3]:
-        raise Exception("Number of bots should be 1 ~ 3")
+    try:
+        if args.rooms:
+            rooms = parse_rooms(args.rooms, args.number)
+        else:
+            rooms = [RoomSetting(room=args.room, number=args.number)]
+    except ValueError as e:
+        parser.error(str(e))
     setting = MajiangBotSetting(
-        server=args.server, apppath=args.apppath, modelpath=args.modelpath
+        server=args.server,
+        apppath=args.apppath,
+        modelpath=args.modelpath,
+        device=args.device,
+        batch_window_ms=args.batch_window_ms,
+        max_batch=args.max_batch,
+        compile_mode=args.compile_mode,
+        precision=args.precision,
+        fused=args.fused,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+        inference_cpus=args.inference_cpus,
+        io_cpus=args.io_cpus,
+        cache_entries=args.eval_cache,
+        cache_mb=args.eval_cache_mb,
+        quick_eval=args.quick_eval,
+        always_hora=args.always_hora,
+        agari_guard=args.agari_guard,
+        decision_worker=args.decision_worker,
+        decision_queue=args.decision_queue,
+        record_dir=args.record,
+        archive_dir=args.archive,
+        metrics_port=args.metrics_port,
+        websocket_only=args.websocket_only,
+        connect_concurrency=args.connect_concurrency,
+        log_level=args.log_level,
+        bot_log_levels=args.bot_log_level,
     )
+    if args.workers <= 0:
+        # threads started from now on (rooms, sockets) inherit the io cpus
+        pin_thread(parse_cpu_list(args.io_cpus))
+        LOGGER.info("CPU layout: %s", describe_layout(
+            args.intra_op_threads, args.inter_op_threads,
+            parse_cpu_list(args.inference_cpus), parse_cpu_list(args.io_cpus)))
+    if args.metrics_port and args.workers <= 0:
+        start_metrics_server(args.metrics_port)
+        LOGGER.info("Metrics on http://127.0.0.1:%d/metrics", args.metrics_port)
     try:
-        while True:
-            bots = [
-                MajiangBot(setting, args.room, f"Mortal_{chr(ord('A')+_)}")
-                for _ in range(args.number)
+        if args.workers > 0:
+            from supervisor import TableSupervisor
+
+            TableSupervisor(
+                setting, rooms, args.workers, args.pin_workers, args.use_async
+            ).run()
+        elif args.use_async:
+            import asyncio
+            from majiang_async_bot import run_rooms
+
+            asyncio.run(run_rooms(setting, rooms))
+        else:
+            room_threads = [
+                threading.Thread(target=run_room, args=(setting, r), daemon=True)
+                for r in rooms
             ]
-            threads = [threading.Thread(target=b.start) for b in bots]
-            for t in threads:
+            for t in room_threads:
                 t.start()
-            for t in threads:
-                t.join()
+            for t in room_threads:
+                while t.is_alive():
+                    t.join(1)
     except KeyboardInterrupt:
         exit()
@@ -0,0 +1 @@
+""" Headless Majiang table simulator (no server, no sockets)"""
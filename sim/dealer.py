@@ -0,0 +1,382 @@
+""" In-process Majiang dealer for headless games
+
+Drives four GameState instances with the same message dicts the Majiang server sends to
+MajiangBot.on_game (kaiju, qipai, zimo, dapai, fulou, gang, gangzimo, kaigang, hule, pingju, jieju)
+and applies their replies from GameState.trans_mjai_react.
+
+The dealer trusts the bots for legality of hule / kyushu declarations (libriichi only offers
+legal ones) and uses flat point transfers instead of a yaku / fu calculator. It is meant for
+throughput measurement and translator regression checks, not for scoring-accurate games.
+Replies that cannot be applied (tile not in hand, wrong seq, ...) are counted as errors and
+replaced by a safe default action.
+"""
+import random
+import time
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+SUITS = "mpsz"
+MARKS = "+=-"       # called from shimo / toimen / kami, relative to the caller
+RON_POINTS = 3900
+TSUMO_POINTS = 1300     # paid by each other player
+MAX_KYOKU = 32      # safety cap for one game
+
+
+def tile_kind(tile:str) -> str:
+    """ kind of a Majiang tile, red fives count as fives: 'm0' -> 'm5'"""
+    return tile[0] + "5" if tile[1] == "0" else tile
+
+
+def shoupai_str(tiles:list[str]) -> str:
+    """ Majiang shoupai string of concealed tiles, e.g. 'm123p0s55z11'"""
+    res = ""
+    for s in SUITS:
+        nums = sorted((t[1] for t in tiles if t[0] == s), key=lambda n: 5.5 if n == "0" else int(n))
+        if nums:
+            res += s + "".join(nums)
+    return res
+
+
+def new_wall(rng:random.Random) -> list[str]:
+    """ shuffled 136-tile wall with one red five per suit"""
+    tiles = []
+    for s in "mps":
+        for n in range(1, 10):
+            for k in range(4):
+                tiles.append(f"{s}0" if n == 5 and k == 0 else f"{s}{n}")
+    for n in range(1, 8):
+        tiles += [f"z{n}"] * 4
+    rng.shuffle(tiles)
+    return tiles
+
+
+class DealerStats:
+    """ counters of one or more headless games"""
+    def __init__(self) -> None:
+        self.games:int = 0
+        self.kyokus:int = 0
+        self.messages:int = 0           # Majiang messages delivered to a GameState
+        self.decisions:int = 0          # messages that produced a bot reaction
+        self.decision_times:list[float] = []   # seconds per decision (input + trans_mjai_react)
+        self.errors:int = 0             # replies that could not be applied
+
+    def merge(self, other:"DealerStats"):
+        """ add the counters of other to this"""
+        self.games += other.games
+        self.kyokus += other.kyokus
+        self.messages += other.messages
+        self.decisions += other.decisions
+        self.decision_times.extend(other.decision_times)
+        self.errors += other.errors
+
+
+class _Kyoku:
+    """ dealer-side state of one kyoku"""
+    def __init__(self, wall:list[str]) -> None:
+        self.dead = wall[:14]
+        self.live = wall[14:]
+        self.baopai:list[str] = [self.dead[0]]
+        self.hands:list[list[str]] = [[] for _ in range(4)]
+        self.pons:list[list[str]] = [[] for _ in range(4)]    # kinds of pon melds, for kakan
+        self.reached:list[bool] = [False] * 4
+        self.n_gang:int = 0
+
+
+class _NextDraw:
+    """ kyoku continues with a draw of seat"""
+    __slots__ = ("seat",)
+
+    def __init__(self, seat:int) -> None:
+        self.seat = seat
+
+
+class Dealer:
+    """ Plays Majiang games between four GameState instances (seat i = player i, qijia 0)"""
+    def __init__(self, players:list, rng:random.Random=None, names:list[str]=None) -> None:
+        """ params:
+            players(list[GameState]): game states of the four seats
+            rng(random.Random): random source for the walls
+            names(list[str]): player names in the kaiju message"""
+        assert len(players) == 4
+        self.players = players
+        self.rng = rng or random.Random()
+        self.names = names or [f"headless_{i}" for i in range(4)]
+        self.stats = DealerStats()
+
+        self.seq:int = 0
+        self.scores:list[int] = [25000] * 4
+        self.zhuangfeng:int = 0
+        self.jushu:int = 0
+        self.changbang:int = 0
+        self.lizhibang:int = 0
+        self.k:_Kyoku = None
+
+    # ===== messaging =====
+    def _send(self, msgs:list[dict]) -> list[dict]:
+        """ deliver msgs[i] to seat i and return their replies"""
+        replies = []
+        for gs, msg in zip(self.players, msgs):
+            start = time.perf_counter()
+            mjai_react = gs.input(msg)
+            reply = gs.trans_mjai_react(mjai_react)
+            elapsed = time.perf_counter() - start
+            self.stats.messages += 1
+            if mjai_react is not None:
+                self.stats.decisions += 1
+                self.stats.decision_times.append(elapsed)
+            replies.append(reply or {})
+        return replies
+
+    def _broadcast(self, mtype:str, data:dict, with_seq:bool=True) -> list[dict]:
+        msg = {mtype: data}
+        if with_seq:
+            self.seq += 1
+            msg["seq"] = self.seq
+        replies = self._send([msg] * 4)
+        if with_seq:
+            for r in replies:
+                if "seq" in r and r["seq"] != self.seq:
+                    self._error("reply seq %s != %s", r["seq"], self.seq)
+        return replies
+
+    def _error(self, fmt:str, *args):
+        self.stats.errors += 1
+        LOGGER.warning("[dealer] " + fmt, *args)
+
+    def _l(self, seat:int) -> int:
+        """ Majiang position of a seat relative to the dealer of this kyoku"""
+        return (seat - self.jushu) % 4
+
+    # ===== game flow =====
+    def play_game(self) -> DealerStats:
+        """ play one full game (east-south) and return the stats of this dealer so far"""
+        self.scores = [25000] * 4
+        self.zhuangfeng = self.jushu = self.changbang = self.lizhibang = 0
+        self.seq = 1
+        self._send([
+            {"kaiju": {"id": i, "rule": {}, "title": "headless", "player": self.names, "qijia": 0}, "seq": self.seq}
+            for i in range(4)
+        ])
+        for _ in range(MAX_KYOKU):
+            oya_won = self._play_kyoku()
+            self.stats.kyokus += 1
+            if min(self.scores) < 0:
+                break
+            if oya_won:
+                self.changbang += 1
+                continue
+            self.changbang = self.changbang + 1 if oya_won is None else 0
+            self.jushu += 1
+            if self.jushu == 4:
+                self.jushu = 0
+                self.zhuangfeng += 1
+                if self.zhuangfeng == 2:
+                    break
+        self._broadcast("jieju", {
+            "title": "headless", "player": self.names, "qijia": 0, "log": [],
+            "defen": self.scores.copy(), "rank": [], "point": [],
+        })
+        self.stats.games += 1
+        return self.stats
+
+    def _play_kyoku(self) -> bool | None:
+        """ play one kyoku. returns True if oya won, False if another player won, None for pingju"""
+        k = self.k = _Kyoku(new_wall(self.rng))
+        for _ in range(13):
+            for seat in range(4):
+                k.hands[seat].append(k.live.pop())
+        self.seq += 1
+        msgs = []
+        for seat in range(4):
+            shoupai = [""] * 4      # others' shoupai is hidden
+            shoupai[self._l(seat)] = shoupai_str(k.hands[seat])
+            msgs.append({"qipai": {
+                "zhuangfeng": self.zhuangfeng, "jushu": self.jushu, "changbang": self.changbang,
+                "lizhibang": self.lizhibang, "defen": self.scores.copy(), "baopai": k.baopai[0],
+                "shoupai": shoupai,
+            }, "seq": self.seq})
+        self._send(msgs)
+
+        actor = self.jushu
+        while True:
+            if not k.live:
+                return self._pingju("荒牌平局")
+            reply = self._zimo(actor, k.live.pop(), "zimo")
+            result = self._turn(actor, reply)
+            if not isinstance(result, _NextDraw):
+                return result
+            actor = result.seat
+
+    def _zimo(self, actor:int, tile:str, mtype:str) -> dict:
+        self.k.hands[actor].append(tile)
+        self.seq += 1
+        msgs = [
+            {mtype: {"l": self._l(actor), "p": tile if seat == actor else ""}, "seq": self.seq}
+            for seat in range(4)
+        ]
+        return self._send(msgs)[actor]
+
+    def _kan_zimo(self, actor:int) -> dict:
+        """ rinshan draw after a kan followed by the new dora indicator. returns the actor's reply"""
+        k = self.k
+        reply = self._zimo(actor, k.dead[13 - k.n_gang], "gangzimo")
+        k.n_gang += 1
+        if k.live:
+            k.live.pop(0)       # the dead wall is refilled from the end of the live wall
+        k.baopai.append(k.dead[len(k.baopai)])
+        self._broadcast("kaigang", {"baopai": k.baopai[-1]}, with_seq=False)
+        return reply
+
+    def _turn(self, actor:int, reply:dict):
+        """ handle the actor's reply to a draw or call, then the others' replies to the discard.
+        returns _NextDraw to continue the kyoku, or the kyoku result"""
+        k = self.k
+        while "gang" in reply:
+            if k.n_gang >= 4 or not self._apply_gang(actor, reply["gang"]):
+                reply = {"dapai": k.hands[actor][-1] + "_"}
+                break
+            replies = self._broadcast("gang", {"l": self._l(actor), "m": reply["gang"]})
+            for seat in self._order_after(actor):
+                if "hule" in replies[seat]:     # chankan
+                    return self._hule(seat, actor)
+            reply = self._kan_zimo(actor)
+
+        if "hule" in reply:
+            return self._hule(actor, None)
+        if "daopai" in reply:
+            return self._pingju("九種九牌")
+
+        tile, tsumogiri, reach = self._parse_dapai(actor, reply)
+        k.hands[actor].remove(tile)
+        p = tile + ("_" if tsumogiri else "") + ("*" if reach else "")
+        replies = self._broadcast("dapai", {"l": self._l(actor), "p": p})
+
+        for seat in self._order_after(actor):
+            if "hule" in replies[seat]:
+                return self._hule(seat, actor)
+        if reach:
+            k.reached[actor] = True
+            self.scores[actor] -= 1000
+            self.lizhibang += 1
+
+        # pon / daiminkan have priority over chi
+        calls = [(seat, replies[seat]["fulou"]) for seat in self._order_after(actor) if "fulou" in replies[seat]]
+        calls.sort(key=lambda c: self._is_chi(c[1]))
+        for seat, m in calls:
+            if not self._apply_fulou(seat, actor, tile, m):
+                continue
+            # after chi / pon the caller's reply to the fulou msg is its dapai
+            caller_reply = self._broadcast("fulou", {"l": self._l(seat), "m": m})[seat]
+            if self._is_kan(m):
+                caller_reply = self._kan_zimo(seat)
+            return self._turn(seat, caller_reply)
+        return _NextDraw((actor + 1) % 4)
+
+    def _order_after(self, actor:int) -> list[int]:
+        return [(actor + i) % 4 for i in range(1, 4)]
+
+    # ===== reply parsing =====
+    def _parse_dapai(self, actor:int, reply:dict) -> tuple[str, bool, bool]:
+        """ return (tile, tsumogiri, reach) of the actor's dapai reply, or a safe default discard"""
+        hand = self.k.hands[actor]
+        p = reply.get("dapai")
+        if p and len(p) >= 2 and p[:2] in hand:
+            tsumogiri = "_" in p
+            if tsumogiri and hand[-1] != p[:2]:
+                self._error("seat %d tsumogiri %s is not the drawn tile %s", actor, p, hand[-1])
+            return p[:2], tsumogiri, "*" in p
+        self._error("seat %d: no valid dapai in reply %s, hand %s", actor, reply, shoupai_str(hand))
+        return hand[-1], True, False
+
+    @staticmethod
+    def _is_chi(m:str) -> bool:
+        digits = [ch for ch in m[1:] if ch not in MARKS]
+        return len(digits) == 3 and len({tile_kind(m[0] + d) for d in digits}) == 3
+
+    @staticmethod
+    def _is_kan(m:str) -> bool:
+        return len([ch for ch in m[1:] if ch not in MARKS]) == 4
+
+    def _apply_fulou(self, seat:int, target:int, tile:str, m:str) -> bool:
+        """ check and apply a chi / pon / daiminkan of tile discarded by target"""
+        suit = m[0]
+        called = None
+        consumed = []
+        mark = None
+        for i, ch in enumerate(m[1:], 1):
+            if ch in MARKS:
+                mark = ch
+                called = suit + m[i - 1]
+                consumed.pop()
+            else:
+                consumed.append(suit + ch)
+        if called != tile or mark is None or (seat + MARKS.index(mark) + 1) % 4 != target:
+            self._error("seat %d fulou %s does not match dapai %s of seat %d", seat, m, tile, target)
+            return False
+        if self._is_chi(m) and (target + 1) % 4 != seat:
+            self._error("seat %d cannot chi from seat %d: %s", seat, target, m)
+            return False
+        if self.k.reached[seat]:
+            self._error("seat %d calls %s in reach", seat, m)
+            return False
+        hand = self.k.hands[seat]
+        for t in consumed:
+            if t not in hand:
+                self._error("seat %d fulou %s: %s not in hand %s", seat, m, t, shoupai_str(hand))
+                return False
+        for t in consumed:
+            hand.remove(t)
+        if len(consumed) == 2 and tile_kind(consumed[0]) == tile_kind(consumed[1]):
+            self.k.pons[seat].append(tile_kind(tile))
+        return True
+
+    def _apply_gang(self, seat:int, m:str) -> bool:
+        """ check and apply an ankan (e.g. m5550) or kakan (e.g. z666-6)"""
+        hand = self.k.hands[seat]
+        digits = [ch for ch in m[1:] if ch not in MARKS]
+        kind = tile_kind(m[0] + digits[-1])
+        if len(m) == 5 and len(digits) == 4:
+            tiles = [t for t in hand if tile_kind(t) == kind]
+            if len(tiles) == 4:
+                for t in tiles:
+                    hand.remove(t)
+                return True
+        elif len(m) == 6 and kind in self.k.pons[seat]:
+            added = m[0] + m[-1]
+            if added in hand:
+                hand.remove(added)
+                self.k.pons[seat].remove(kind)
+                return True
+        self._error("seat %d cannot gang %s with hand %s", seat, m, shoupai_str(hand))
+        return False
+
+    # ===== kyoku end =====
+    def _hule(self, winner:int, loser:int | None) -> bool:
+        """ flat point transfer for a win. loser None for tsumo. returns True if oya won"""
+        fenpei = [0] * 4
+        oya_mult = 1.5 if winner == self.jushu else 1
+        if loser is None:
+            for seat in range(4):
+                if seat != winner:
+                    pay = int(TSUMO_POINTS * oya_mult) + 100 * self.changbang
+                    fenpei[seat] -= pay
+                    fenpei[winner] += pay
+        else:
+            pay = int(RON_POINTS * oya_mult) + 300 * self.changbang
+            fenpei[loser] -= pay
+            fenpei[winner] += pay
+        fenpei[winner] += 1000 * self.lizhibang
+        self.lizhibang = 0
+        for seat in range(4):
+            self.scores[seat] += fenpei[seat]
+        self._broadcast("hule", {
+            "l": self._l(winner), "shoupai": shoupai_str(self.k.hands[winner]),
+            "baojia": None if loser is None else self._l(loser), "fubaopai": None,
+            "fu": 30, "fanshu": 3, "defen": fenpei[winner], "hupai": [], "fenpei": fenpei,
+        })
+        return winner == self.jushu
+
+    def _pingju(self, name:str) -> None:
+        self._broadcast("pingju", {"name": name, "shoupai": [""] * 4, "fenpei": [0] * 4})
+        return None
@@ -0,0 +1,112 @@
+""" Run headless tables and report throughput / decision latency
+
+usage: python -m sim.run -p model.pth -t 4 -g 2
+"""
+import argparse
+import random
+import threading
+import time
+
+from bot import get_bot
+from bot.local.config import EngineConfig
+from bot.local.registry import acquire_engine, release_engine, preload_for_workers, warm_up_engines, worker_context
+from game_state import GameState
+from common.utils import percentiles
+from sim.dealer import Dealer, DealerStats
+
+
+def run_table(model_path:str, engine_config:EngineConfig, games:int, seed:int) -> DealerStats:
+    """ play games on one table of four bots and return its stats"""
+    players = [GameState(get_bot(model_path, engine_config)) for _ in range(4)]
+    dealer = Dealer(players, random.Random(seed))
+    for _ in range(games):
+        dealer.play_game()
+    return dealer.stats
+
+
+def _run_table_star(args) -> DealerStats:
+    return run_table(*args)
+
+
+def run_tables(model_path:str, engine_config:EngineConfig, tables:int, games:int,
+               seed:int=0, processes:int=0) -> DealerStats:
+    """ run tables in parallel (threads, or a process pool if processes > 0) and merge their stats"""
+    jobs = [(model_path, engine_config, games, seed + i) for i in range(tables)]
+    total = DealerStats()
+    if processes > 0:
+        ctx = worker_context(model_path, engine_config.device)
+        # nothing to do if already preloaded. the engine has not run a forward pass yet, see preload_engine()
+        preload_for_workers(ctx, model_path, engine_config)
+        with ctx.Pool(processes, initializer=warm_up_engines) as pool:
+            for stats in pool.imap_unordered(_run_table_star, jobs):
+                total.merge(stats)
+        return total
+
+    results:list[DealerStats] = []
+    lock = threading.Lock()
+    def worker(job):
+        stats = run_table(*job)
+        with lock:
+            results.append(stats)
+    threads = [threading.Thread(target=worker, args=(job,)) for job in jobs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for stats in results:
+        total.merge(stats)
+    return total
+
+
+def report(stats:DealerStats, elapsed:float) -> str:
+    """ human readable summary of a run"""
+    pct = percentiles(stats.decision_times, (50, 95, 99))
+    mean = sum(stats.decision_times) / len(stats.decision_times) if stats.decision_times else 0
+    lines = [
+        f"games: {stats.games}  kyokus: {stats.kyokus}  time: {elapsed:.2f}s",
+        f"games/sec: {stats.games / elapsed:.3f}  decisions/sec: {stats.decisions / elapsed:.1f}"
+        f"  messages/sec: {stats.messages / elapsed:.1f}",
+        f"decision latency ms: mean {mean*1000:.2f}  p50 {pct[50]*1000:.2f}"
+        f"  p95 {pct[95]*1000:.2f}  p99 {pct[99]*1000:.2f}",
+        f"errors (rejected replies): {stats.errors}",
+    ]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless Majiang table simulator")
+    parser.add_argument("-p", "--modelpath", help="path to the local Mortal model", type=str, default="model.pth")
+    parser.add_argument("-d", "--device", help="torch device for the model (default: auto)", type=str, default=None)
+    parser.add_argument("-t", "--tables", help="number of tables run in parallel", type=int, default=1)
+    parser.add_argument("-g", "--games", help="games per table", type=int, default=1)
+    parser.add_argument("--processes", help="run tables in a process pool of this size instead of threads",
+                        type=int, default=0)
+    parser.add_argument("--seed", help="wall shuffle seed of the first table", type=int, default=0)
+    parser.add_argument("--batch-window-ms", help="cross-bot micro-batching window (default: 0, off)",
+                        type=float, default=0)
+    parser.add_argument("--max-batch", help="max rows per batched evaluation", type=int, default=16)
+    parser.add_argument("--compile", dest="compile_mode", help="compile the model (default: eager)",
+                        choices=["trace", "inductor"], default=None)
+    parser.add_argument("--precision", help="inference precision (default: fp32)",
+                        choices=["fp32", "bf16", "int8"], default="fp32")
+    parser.add_argument("--eval-cache", help="q value cache entries of the engine (default: 0, off)",
+                        type=int, default=0)
+    parser.add_argument("--no-quick-eval", dest="quick_eval", help="run the model for single-option decisions too",
+                        action="store_false")
+    parser.add_argument("--always-hora", help="always declare hora when legal", action="store_true")
+    parser.add_argument("--agari-guard", help="enable libriichi's rule-based agari guard", action="store_true")
+    args = parser.parse_args()
+
+    config = EngineConfig(device=args.device, batch_window_ms=args.batch_window_ms, max_batch=args.max_batch,
+                          compile_mode=args.compile_mode, precision=args.precision,
+                          cache_entries=args.eval_cache, quick_eval=args.quick_eval,
+                          always_hora=args.always_hora, agari_guard=args.agari_guard)
+    # load the model before timing. before forking the process pool, without starting torch's thread pools
+    if args.processes > 0:
+        preload_for_workers(worker_context(args.modelpath, config.device), args.modelpath, config)
+    else:
+        acquire_engine(args.modelpath, config)
+        release_engine(args.modelpath, config)
+    start = time.perf_counter()
+    total = run_tables(args.modelpath, config, args.tables, args.games, args.seed, args.processes)
+    print(report(total, time.perf_counter() - start))
@@ -0,0 +1,216 @@
+""" Multi-process table supervisor
+Runs the rooms in a number of worker processes, each hosting the bots of one or more rooms.
+The model is loaded before the workers are forked, so the weights are shared copy-on-write;
+each worker warms it up after the fork.
+Crashed workers are restarted.
+"""
+
+import os
+import signal
+import sys
+import time
+import logging
+import threading
+import multiprocessing as mp
+
+from bot.local.registry import preload_for_workers, warm_up_engines, worker_context
+from common.cpu_layout import describe_layout, parse_cpu_list, pin_thread
+from common.log_setup import parse_levels, setup_logging
+
+LOGGER = logging.getLogger(__name__)
+
+RESTART_DELAY_MIN = 1  # seconds before restarting a crashed worker
+RESTART_DELAY_MAX = 60
+
+
+def _split_cpus(n_workers: int) -> list[set[int]]:
+    """split the CPUs available to this process into n_workers (nearly) equal sets"""
+    cpus = sorted(os.sched_getaffinity(0))
+    n_workers = min(n_workers, len(cpus))
+    return [set(cpus[i::n_workers]) for i in range(n_workers)]
+
+
+def _worker_main(
+    index: int, setting, rooms: list, cpus: set[int] | None, use_async: bool
+):
+    """worker process entry: run the rooms until one of them stops or the worker is terminated"""
+    # multiprocessing workers exit without running atexit: close the recordings and archives on the way out,
+    # also when the supervisor terminates the worker
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        _run_worker(index, setting, rooms, cpus, use_async)
+    finally:
+        from common.archive import close_archives
+        from common.recorder import close_recordings
+
+        close_recordings(timeout=10)
+        close_archives(timeout=10)
+
+
+def _run_worker(
+    index: int, setting, rooms: list, cpus: set[int] | None, use_async: bool
+):
+    """run every assigned room in its own thread (or on one event loop), forever"""
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    # the log writer thread does not survive fork
+    setup_logging(setting.log_level, parse_levels(setting.bot_log_levels))
+    # the engine loaded before the fork has not run a forward pass yet.
+    # before pinning to the io cpus: torch thread pools started now inherit the worker's cpus
+    warm_up_engines()
+    io_cpus = parse_cpu_list(setting.io_cpus)
+    # explicit io cpus take precedence over the worker's share for the socket / bot threads
+    pin_thread(io_cpus)
+    if setting.metrics_port:
+        from common.metrics import start_metrics_server
+
+        start_metrics_server(setting.metrics_port + 1 + index)
+    LOGGER.info(
+        "Worker %d (pid %d) rooms: %s cpus: %s",
+        index,
+        os.getpid(),
+        [f"{r.room}x{r.number}" for r in rooms],
+        sorted(cpus) if cpus else "all",
+    )
+    LOGGER.info(
+        "Worker %d (pid %d) CPU layout: %s",
+        index,
+        os.getpid(),
+        describe_layout(
+            setting.intra_op_threads,
+            setting.inter_op_threads,
+            parse_cpu_list(setting.inference_cpus),
+            io_cpus,
+        ),
+    )
+    if use_async:
+        import asyncio
+        from majiang_async_bot import run_rooms
+
+        asyncio.run(run_rooms(setting, rooms))
+        sys.exit(1)
+
+    from majiang_socket_bot import run_room
+
+    threads = [
+        threading.Thread(target=run_room, args=(setting, r), daemon=True) for r in rooms
+    ]
+    for t in threads:
+        t.start()
+    # rooms run forever, a room thread that stops has crashed: exit so the supervisor restarts us
+    while all(t.is_alive() for t in threads):
+        time.sleep(1)
+    sys.exit(1)
+
+
+class _Worker:
+    """supervisor-side record of one worker slot"""
+
+    def __init__(self, index: int, rooms: list, cpus: set[int] | None) -> None:
+        self.index = index
+        self.rooms = rooms
+        self.cpus = cpus
+        self.process: mp.Process = None
+        self.restarts = 0  # consecutive restarts, reset once a worker stays up
+        self.started_at: float = 0
+        self.next_start: float = 0  # time when the worker may be (re)started
+
+
+class TableSupervisor:
+    """Start worker processes for the rooms and keep them running"""
+
+    def __init__(
+        self,
+        setting,
+        rooms: list,
+        n_workers: int,
+        pin_cpus: bool = False,
+        use_async: bool = False,
+    ):
+        """params:
+        setting(MajiangBotSetting): bot settings shared by all workers
+        rooms(list[RoomSetting]): rooms to fill, spread round robin over the workers
+        n_workers(int): number of worker processes (capped at the number of rooms)
+        pin_cpus(bool): pin each worker to its own share of the CPU cores (Linux only)
+        use_async(bool): workers run their bots on an asyncio event loop"""
+        self.setting = setting
+        self.use_async = use_async
+        self.rooms = rooms
+        n_workers = max(1, min(n_workers, len(rooms)))
+
+        # fork after loading the model so the workers share its pages, if possible
+        self.ctx = worker_context(setting.modelpath, setting.device)
+
+        cpu_sets = [None] * n_workers
+        if pin_cpus:
+            if hasattr(os, "sched_setaffinity"):
+                cpu_sets = _split_cpus(n_workers)
+                n_workers = len(cpu_sets)
+            else:
+                LOGGER.warning("CPU pinning is not supported on %s", sys.platform)
+        self.workers = [
+            _Worker(i, rooms[i::n_workers], cpu_sets[i]) for i in range(n_workers)
+        ]
+
+    def preload(self):
+        """load the shared engine in the supervisor before forking workers"""
+        start = time.time()
+        # the supervisor only keeps the engine loaded for the workers, it hosts no bots
+        if preload_for_workers(self.ctx, self.setting.modelpath, self.setting.engine_config()):
+            LOGGER.info("Model loaded in %.2fs before fork", time.time() - start)
+
+    def _start(self, worker: _Worker):
+        worker.process = self.ctx.Process(
+            target=_worker_main,
+            args=(
+                worker.index,
+                self.setting,
+                worker.rooms,
+                worker.cpus,
+                self.use_async,
+            ),
+            name=f"majiang-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.time()
+        LOGGER.info(
+            "Worker %d started, pid %d, restarts %d",
+            worker.index,
+            worker.process.pid,
+            worker.restarts,
+        )
+
+    def run(self):
+        """start all workers and restart those that exit, until interrupted"""
+        self.preload()
+        for w in self.workers:
+            self._start(w)
+        try:
+            while True:
+                time.sleep(1)
+                now = time.time()
+                for w in self.workers:
+                    if w.process is not None and w.process.is_alive():
+                        continue
+                    if w.process is not None:
+                        LOGGER.warning(
+                            "Worker %d exited with code %s",
+                            w.index,
+                            w.process.exitcode,
+                        )
+                        w.process = None
+                        if now - w.started_at > RESTART_DELAY_MAX:
+                            w.restarts = 0
+                        # back off on repeated crashes
+                        delay = min(
+                            RESTART_DELAY_MAX, RESTART_DELAY_MIN * 2**w.restarts
+                        )
+                        w.next_start = now + delay
+                        w.restarts += 1
+                    if now >= w.next_start:
+                        self._start(w)
+        finally:
+            for w in self.workers:
+                if w.process is not None and w.process.is_alive():
+                    w.process.terminate()
@@ -0,0 +1,70 @@
+""" common.archive: write games on the background thread, read them back by block"""
+import sqlite3
+
+import pytest
+
+from common import archive as archive_mod
+from common.archive import INDEX_FILE, ArchiveReader, GameArchive, close_archives, get_archive
+
+
+def _paipu(title: str, n_kyoku: int) -> dict:
+    log = [
+        [{"qipai": {"zhuangfeng": 0, "jushu": i, "changbang": 0}}, {"zimo": {"l": 0, "p": "m1"}}]
+        for i in range(n_kyoku)
+    ]
+    return {"title": title, "player": ["A", "B", "C", "D"], "log": log}
+
+
+def test_write_and_read(tmp_path):
+    archive = GameArchive(str(tmp_path), segment_mb=0)  # one segment per game
+    archive.submit(_paipu("first", 2), bot="Mortal_A", room="R1")
+    archive.submit(_paipu("second", 3), bot="Mortal_B", room="R2")
+    archive.close()
+    assert len(list(tmp_path.glob("*.seg"))) == 2
+
+    reader = ArchiveReader(str(tmp_path))
+    try:
+        games = reader.find()
+        assert [g.title for g in games] == ["second", "first"]
+        (first,) = reader.find(bot="Mortal_A")
+        assert (first.room, first.n_kyoku) == ("R1", 2)
+        assert reader.find(room="R3") == []
+        assert reader.kyokus(first.id) == [(0, 0, 0, 0), (1, 0, 1, 0)]
+        assert reader.read_kyoku(first.id, 1) == _paipu("first", 2)["log"][1]
+        assert reader.read_game(first.id) == _paipu("first", 2)
+        with pytest.raises(KeyError):
+            reader.read_kyoku(first.id, 2)
+        with pytest.raises(KeyError):
+            reader.read_game(12345)
+    finally:
+        reader.close()
+
+
+def test_reader_is_read_only(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ArchiveReader(str(tmp_path))
+    assert not (tmp_path / INDEX_FILE).exists()
+
+    archive = GameArchive(str(tmp_path))
+    archive.close()
+    reader = ArchiveReader(str(tmp_path))
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            reader.conn.execute("DELETE FROM games")
+    finally:
+        reader.close()
+
+
+def test_get_archive_is_shared_and_closed(tmp_path):
+    archive = get_archive(str(tmp_path))
+    assert get_archive(str(tmp_path / ".." / tmp_path.name)) is archive
+    archive.submit(_paipu("queued", 1), bot="Mortal_A", room="R1")
+    close_archives()
+    assert not archive._thread.is_alive()  # pylint: disable=protected-access
+    assert archive_mod._ARCHIVES == {}  # pylint: disable=protected-access
+    archive.close()  # closing again is a no-op
+    reader = ArchiveReader(str(tmp_path))
+    try:
+        assert [g.title for g in reader.find()] == ["queued"]
+    finally:
+        reader.close()
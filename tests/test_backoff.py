@@ -0,0 +1,98 @@
+""" common.connection.Backoff: delays, retries and the async variant"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("requests")
+from common import connection  # pylint: disable=wrong-import-position
+from common.connection import Backoff  # pylint: disable=wrong-import-position
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """delays slept by Backoff, without sleeping; delays are at their upper bound"""
+    slept = []
+    monkeypatch.setattr(connection.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(connection.time, "sleep", slept.append)
+
+    async def no_sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+    return slept
+
+
+def _failing(n_failures: int, error=ConnectionError):
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= n_failures:
+            raise error("down")
+        return len(calls)
+
+    return func, calls
+
+
+def test_delay_is_jittered_below_the_capped_exponential():
+    backoff = Backoff(base=0.5, cap=3)
+    for attempt, bound in enumerate([0.5, 1, 2, 3, 3]):
+        for _ in range(20):
+            assert 0 <= backoff.delay(attempt) <= bound
+
+
+def test_run_retries_until_success(sleeps):
+    func, calls = _failing(3)
+    assert Backoff(base=1, cap=5).run(func, "auth") == 4
+    assert len(calls) == 4
+    assert sleeps == [1, 2, 4]
+
+
+def test_run_reraises_after_max_attempts(sleeps):
+    func, calls = _failing(10)
+    with pytest.raises(ConnectionError):
+        Backoff(base=1, max_attempts=3).run(func, "auth")
+    assert len(calls) == 3
+    assert sleeps == [1, 2]
+
+
+def test_run_does_not_retry_other_errors(sleeps):
+    func, calls = _failing(1, ValueError)
+    with pytest.raises(ValueError):
+        Backoff().run(func, "auth", retry_on=(ConnectionError,))
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+def test_run_async(sleeps):
+    func, calls = _failing(2)
+
+    async def coro_func():
+        return func()
+
+    assert asyncio.run(Backoff(base=1).run_async(coro_func, "connect")) == 3
+    assert len(calls) == 3
+    assert sleeps == [1, 2]
+
+
+class _FakeSio:
+    def __init__(self, errors: list) -> None:
+        self.errors = errors
+        self.calls = 0
+
+    def connect(self, server, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+def test_connect_retries_connection_errors_only(sleeps):
+    socketio_exceptions = pytest.importorskip("socketio.exceptions")
+    manager = connection.ConnectionManager("http://server/", "auth", backoff=Backoff(base=1))
+    sio = _FakeSio([socketio_exceptions.ConnectionError("refused"), OSError("reset")])
+    manager.connect(sio, "http://server/", "socket.io", "Mortal_A")
+    assert sio.calls == 3
+    sio = _FakeSio([TypeError("bug")])
+    with pytest.raises(TypeError):
+        manager.connect(sio, "http://server/", "socket.io", "Mortal_A")
+    assert sio.calls == 1
@@ -0,0 +1,98 @@
+""" bot.local.batching.BatchingEngine with a fake engine: split / merge of concurrent calls"""
+import threading
+import time
+
+import pytest
+
+from bot.local.batching import BatchingEngine
+
+
+class FakeEngine:
+    """echoes each obs row as its action, records the batch sizes"""
+
+    name = "fake"
+
+    def __init__(self, fail: bool = False) -> None:
+        self.batches = []
+        self.fail = fail
+
+    def react_batch(self, obs, masks, invisible_obs):
+        self.batches.append(len(masks))
+        if self.fail:
+            raise ValueError("engine error")
+        return list(obs), [[float(o)] for o in obs], list(masks), [True] * len(obs)
+
+
+def _call_concurrently(engine, requests: list[list[int]]) -> list:
+    """react_batch from one thread per request, started together. Returns the results (or errors)"""
+    results = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = engine.react_batch(requests[i], [[True]] * len(requests[i]), None)
+        except Exception as e:  # pylint: disable=broad-except
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(requests))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results
+
+
+def test_rows_go_back_to_their_caller():
+    fake = FakeEngine()
+    engine = BatchingEngine(fake, window_ms=200, max_batch=6)
+    requests = [[1], [2, 3], [4, 5, 6]]
+    results = _call_concurrently(engine, requests)
+    engine.close()
+    assert fake.batches == [6]  # full batch: evaluated without waiting for the window
+    for rows, (actions, q_out, masks, is_greedy) in zip(requests, results):
+        assert actions == rows
+        assert q_out == [[float(r)] for r in rows]
+        assert len(masks) == len(is_greedy) == len(rows)
+    assert engine.mean_batch_size == 6
+
+
+def test_batches_hold_whole_requests_up_to_max_batch():
+    fake = FakeEngine()
+    engine = BatchingEngine(fake, window_ms=100, max_batch=4)
+    requests = [[1, 2], [3, 4], [5, 6]]
+    results = _call_concurrently(engine, requests)
+    engine.close()
+    assert sorted(fake.batches) == [2, 4]
+    assert [r[0] for r in results] == requests
+
+
+def test_window_flushes_a_partial_batch():
+    fake = FakeEngine()
+    engine = BatchingEngine(fake, window_ms=20, max_batch=16)
+    start = time.perf_counter()
+    actions, *_ = engine.react_batch([7], [[True]], None)
+    waited = time.perf_counter() - start
+    engine.close()
+    assert actions == [7]
+    assert fake.batches == [1]
+    assert 0.015 <= waited < 2
+
+
+def test_engine_error_reaches_every_caller_of_the_batch():
+    fake = FakeEngine(fail=True)
+    engine = BatchingEngine(fake, window_ms=200, max_batch=3)
+    results = _call_concurrently(engine, [[1], [2], [3]])
+    assert all(isinstance(r, ValueError) for r in results)
+    # the scheduler keeps running
+    fake.fail = False
+    assert engine.react_batch([4], [[True]], None)[0] == [4]
+    engine.close()
+
+
+def test_closed_engine_rejects_calls_and_forwards_attributes():
+    engine = BatchingEngine(FakeEngine(), window_ms=1)
+    assert engine.name == "fake"
+    engine.close()
+    with pytest.raises(RuntimeError):
+        engine.react_batch([1], [[True]], None)
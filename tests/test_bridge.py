@@ -0,0 +1,41 @@
+""" bot.bridge encode / decode against plain json"""
+import json
+
+import pytest
+
+from bot import bridge
+
+MSGS = [
+    {"type": "start_game", "id": 2},
+    {"type": "start_kyoku", "bakaze": "E", "dora_marker": "1s", "honba": 0, "kyoku": 1, "kyotaku": 0, "oya": 0,
+     "scores": [25000] * 4, "tehais": [["?"] * 13, ["1m", "5mr", "E"] + ["?"] * 10, ["?"] * 13, ["?"] * 13]},
+    {"type": "tsumo", "actor": 1, "pai": "5mr"},
+    {"type": "tsumo", "actor": 2, "pai": "?"},
+    {"type": "dahai", "actor": 2, "pai": "E", "tsumogiri": True},
+    {"type": "dahai", "actor": 0, "pai": "9s", "tsumogiri": False},
+    {"type": "reach", "actor": 0},
+    {"type": "reach_accepted", "actor": 3},
+    {"type": "dora", "dora_marker": "7p"},
+    {"type": "pon", "actor": 3, "target": 1, "pai": "C", "consumed": ["C", "C"]},
+    {"type": "hora", "actor": 1, "target": 0, "deltas": [-8000, 8000, 0, 0]},
+    {"type": "end_kyoku"},
+    # not the template shape: extra key, or a value the template cannot write
+    {"type": "tsumo", "actor": 1, "pai": "1m", "can_act": False},
+    {"type": "dahai", "actor": 1, "pai": "1m", "tsumogiri": None},
+    {"type": "reach"},
+]
+
+
+@pytest.mark.parametrize("msg", MSGS, ids=lambda m: m["type"])
+@pytest.mark.parametrize("can_act", [True, False])
+def test_encode_matches_json(msg, can_act):
+    original = json.dumps(msg)
+    expected = msg if can_act or "can_act" in msg else {**msg, "can_act": False}
+    assert json.loads(bridge.encode(msg, can_act)) == expected
+    assert json.dumps(msg) == original     # the msg dict is not modified
+
+
+def test_decode():
+    reaction = ('{"type":"dahai","actor":1,"pai":"9s","tsumogiri":false,"meta":{"q_values":[-1.2,0.3],'
+                '"mask_bits":2697207348,"is_greedy":true,"eval_time_ns":357088300}}')
+    assert bridge.decode(reaction) == json.loads(reaction)
@@ -0,0 +1,59 @@
+""" bot.local.checkpoint: the default (fused) engine keeps the weights of a slim checkpoint memory-mapped"""
+import sys
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("libriichi")
+
+from bot.local.checkpoint import FUSED_FORMAT, convert, load_state, measure_load
+from bot.local.config import EngineConfig
+from bot.local.engine import load_model
+from bot.local.model import DQN, Brain
+from bot.local.model_infer import FusedBrain
+
+VERSION = 4
+
+
+def training_checkpoint(path, num_blocks:int) -> str:
+    torch.manual_seed(num_blocks)
+    brain = Brain(version=VERSION, conv_channels=256, num_blocks=num_blocks)
+    dqn = DQN(version=VERSION)
+    for mod in brain.modules():
+        if isinstance(mod, torch.nn.BatchNorm1d):
+            # non-trivial statistics, so folding them changes the weights
+            mod.running_mean.uniform_(-0.5, 0.5)
+            mod.running_var.uniform_(0.5, 1.5)
+    torch.save({
+        "config": {"control": {"version": VERSION}, "resnet": {"conv_channels": 256, "num_blocks": num_blocks}},
+        "mortal": brain.state_dict(),
+        "current_dqn": dqn.state_dict(),
+        "optimizer": {"state": torch.zeros(1000)},
+    }, path)
+    return str(path)
+
+
+def test_convert_writes_the_fused_brain(tmp_path):
+    src = training_checkpoint(tmp_path / "model.pth", 2)
+    header = convert(src, str(tmp_path / "model.slim.pth"))
+    assert header["format"] == FUSED_FORMAT
+    state = load_state(str(tmp_path / "model.slim.pth"), torch.device("cpu"))
+    assert "optimizer" not in state
+    brain, _, version = load_model(str(tmp_path / "model.slim.pth"), torch.device("cpu"))
+    assert isinstance(brain, FusedBrain)
+    assert version == VERSION
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="RssAnon is read from /proc/self/status")
+def test_private_memory_does_not_grow_with_the_model(tmp_path):
+    results = {}
+    for num_blocks in (2, 24):
+        src = training_checkpoint(tmp_path / f"model{num_blocks}.pth", num_blocks)
+        dst = str(tmp_path / f"model{num_blocks}.slim.pth")
+        convert(src, dst)
+        results[num_blocks] = measure_load(dst, EngineConfig())
+    grown_weights = results[24]["weights_mb"] - results[2]["weights_mb"]
+    assert grown_weights > 25
+    # the extra weights are paged in from the mapped file, not copied
+    assert results[24]["rss_anon_mb"] - results[2]["rss_anon_mb"] < 0.2 * grown_weights
+    assert results[24]["rss_file_mb"] - results[2]["rss_file_mb"] > 0.8 * grown_weights
@@ -0,0 +1,92 @@
+""" common.decision_worker.DecisionWorker: ordering, errors and shutdown"""
+import threading
+import time
+
+from common.decision_worker import DecisionWorker
+
+
+def test_items_are_handled_in_submit_order():
+    handled = []
+
+    def handler(item):
+        # early items take longest: a worker finishing out of order would reorder them
+        time.sleep((5 - item) * 0.002)
+        handled.append(item)
+
+    worker = DecisionWorker(handler, name="test-order", bot="test_order")
+    for i in range(5):
+        worker.submit(i)
+    worker.close(5)
+    assert handled == [0, 1, 2, 3, 4]
+
+
+def test_close_handles_queued_items_first():
+    release = threading.Event()
+    handled = []
+
+    def handler(item):
+        release.wait(5)
+        handled.append(item)
+
+    worker = DecisionWorker(handler, name="test-close", bot="test_close")
+    for i in range(3):
+        worker.submit(i)
+    closer = threading.Thread(target=worker.close, args=(5,))
+    closer.start()
+    worker.close(0)  # second close returns at once
+    assert handled == []
+    release.set()
+    closer.join(5)
+    assert not closer.is_alive()
+    assert handled == [0, 1, 2]
+    assert worker.depth == 0
+
+
+def test_handler_errors_do_not_stop_the_worker():
+    handled = []
+
+    def handler(item):
+        if item == 1:
+            raise ValueError("bad message")
+        handled.append(item)
+
+    worker = DecisionWorker(handler, name="test-errors", bot="test_errors")
+    for i in range(3):
+        worker.submit(i)
+    worker.close(5)
+    assert handled == [0, 2]
+
+
+def test_submit_blocks_while_full():
+    release = threading.Event()
+    started = threading.Event()
+
+    def handler(item):
+        started.set()
+        release.wait(5)
+
+    worker = DecisionWorker(handler, max_queue=1, name="test-full", bot="test_full")
+    worker.submit(0)
+    started.wait(5)  # item 0 is being handled, the queue is empty
+    worker.submit(1)  # fills the queue
+    submitter = threading.Thread(target=worker.submit, args=(2,))
+    submitter.start()
+    submitter.join(0.05)
+    assert submitter.is_alive()  # waiting for room in the queue
+    assert worker.n_full.value == 1
+    release.set()
+    submitter.join(5)
+    worker.close(5)
+
+
+def test_close_from_the_handler():
+    done = threading.Event()
+    worker = None
+
+    def handler(item):
+        worker.close()  # e.g. the bot disconnecting while handling a message
+        done.set()
+
+    worker = DecisionWorker(handler, name="test-self-close", bot="test_self_close")
+    worker.submit(0)
+    assert done.wait(5)
@@ -0,0 +1,64 @@
+""" bot.local.cache.EvalCache: keys, LRU eviction and bounds
+rows are memoryviews here, the cache only needs tobytes() / nbytes (as numpy arrays have)"""
+from array import array
+
+import pytest
+
+from bot.local.cache import ENTRY_OVERHEAD, EvalCache
+
+
+def row(*values) -> memoryview:
+    return memoryview(array("f", values))
+
+
+def test_needs_a_bound():
+    with pytest.raises(ValueError):
+        EvalCache(0, 0, name="test_bound")
+
+
+def test_key_covers_obs_mask_and_invisible_obs():
+    obs, mask = row(1, 2, 3), row(1, 0)
+    key = EvalCache.key(obs, mask)
+    assert key == EvalCache.key(row(1, 2, 3), row(1, 0))
+    assert key != EvalCache.key(row(1, 2, 4), mask)
+    assert key != EvalCache.key(obs, row(0, 1))
+    # oracle rows: same public obs, different hidden state
+    assert EvalCache.key(obs, mask, row(5)) != EvalCache.key(obs, mask, row(6))
+    assert EvalCache.key(obs, mask, row(5)) != key
+
+
+def test_hits_misses_and_lru_eviction():
+    cache = EvalCache(max_entries=2, name="test_lru")
+    keys = [EvalCache.key(row(i), row(1)) for i in range(3)]
+    assert cache.get(keys[0]) is None
+    cache.put(keys[0], row(0.5))
+    cache.put(keys[1], row(1.5))
+    assert cache.get(keys[0]) is not None     # keys[0] is now the most recent
+    cache.put(keys[2], row(2.5))              # evicts keys[1]
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 2, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_memory_bound():
+    q = row(*range(256))
+    entry_bytes = q.nbytes + ENTRY_OVERHEAD
+    cache = EvalCache(max_mb=3 * entry_bytes / 2**20, name="test_mb")
+    for i in range(10):
+        cache.put(EvalCache.key(row(i), row(1)), row(*range(256)))
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["evictions"] == 7
+    assert stats["mb"] * 2**20 == 3 * entry_bytes
+
+
+def test_put_same_key_replaces():
+    cache = EvalCache(max_entries=4, name="test_replace")
+    key = EvalCache.key(row(1), row(1))
+    cache.put(key, row(1))
+    cache.put(key, row(2))
+    assert cache.stats()["entries"] == 1
+    assert cache.get(key).tolist() == [2.0]
@@ -0,0 +1,75 @@
+""" common.hand.Hand against a plain sorted tile list (the former GameState representation)"""
+import random
+
+import pytest
+
+from common.hand import Hand
+from common.mj_helper import sort_mjai_tiles
+from common.tile_codec import ID_TO_MJAI
+
+TILES = [t for t in ID_TO_MJAI if t != "?"]
+
+
+def test_tehai_sorted_with_akas():
+    tiles = ["5m", "5mr", "1m", "C", "5p", "E", "5sr", "9s"]
+    hand = Hand(tiles)
+    assert hand.tehai() == sort_mjai_tiles(tiles)
+    assert len(hand) == len(tiles)
+    assert hand.tsumohai_mjai() is None
+
+
+def test_remove_distinguishes_aka():
+    hand = Hand(["5m", "5m"])
+    with pytest.raises(ValueError):
+        hand.remove("5mr")
+    hand = Hand(["5mr"])
+    with pytest.raises(ValueError):
+        hand.remove("5m")
+    hand.remove("5mr")
+    assert hand.tehai() == []
+
+
+def test_draw_discard_tsumohai():
+    hand = Hand(["1m", "2m", "3m"])
+    hand.draw("5pr")
+    assert hand.tsumohai_mjai() == "5pr"
+    assert len(hand) == 4
+    hand.discard("1m")      # tedashi: the drawn tile joins the hand
+    assert hand.tsumohai_mjai() is None
+    assert hand.tehai() == ["2m", "3m", "5pr"]
+    hand.draw("E")
+    hand.discard("E")       # tsumogiri
+    assert hand.tehai() == ["2m", "3m", "5pr"]
+
+
+def test_random_play_matches_list():
+    rng = random.Random(0)
+    for _ in range(200):
+        tiles = rng.choices(TILES, k=13)
+        hand, ref, ref_tsumo = Hand(tiles), list(tiles), None
+        for _ in range(60):
+            op = rng.random()
+            if op < 0.4:
+                tile = rng.choice(TILES)
+                hand.draw(tile)
+                if ref_tsumo is not None:
+                    ref.append(ref_tsumo)
+                ref_tsumo = tile
+            elif op < 0.8 and (ref or ref_tsumo):
+                if ref_tsumo is not None:
+                    ref.append(ref_tsumo)
+                    ref_tsumo = None
+                tile = rng.choice(ref)
+                hand.discard(tile)
+                ref.remove(tile)
+            elif op < 0.9:
+                tile = rng.choice(TILES)
+                hand.add(tile)
+                ref.append(tile)
+            elif ref:
+                tile = rng.choice(ref)
+                hand.remove(tile)
+                ref.remove(tile)
+            assert hand.tehai() == sort_mjai_tiles(ref)
+            assert hand.tsumohai_mjai() == ref_tsumo
+            assert len(hand) == len(ref) + (ref_tsumo is not None)
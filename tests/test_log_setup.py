@@ -0,0 +1,50 @@
+""" common.log_setup: per room / bot level specs and the queued writer"""
+import io
+import logging
+
+import pytest
+
+from common.log_setup import BOT_LOGGER, bot_logger, parse_levels, setup_logging, stop_logging
+
+
+def test_parse_levels():
+    assert parse_levels(None) == {}
+    assert parse_levels("") == {}
+    assert parse_levels("A1234=warning, A1234.Mortal_A1234_B=DEBUG,") == {
+        "A1234": "WARNING",
+        "A1234.Mortal_A1234_B": "DEBUG",
+    }
+
+
+@pytest.mark.parametrize("spec", ["A1234", "=DEBUG", "A1234=INFO,B"])
+def test_parse_levels_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_levels(spec)
+
+
+def test_bot_logger_name():
+    assert bot_logger("Mortal_A", "A1234").name == f"{BOT_LOGGER}.A1234.Mortal_A"
+    assert bot_logger("Mortal_A").name == f"{BOT_LOGGER}.Mortal_A"
+
+
+def test_levels_and_args_frozen_at_call_time():
+    stream = io.StringIO()
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    setup_logging("INFO", parse_levels("R1=WARNING,R2.Bot_B=DEBUG"), stream=stream)
+    try:
+        args = {"seq": 1}
+        bot_logger("Bot_A", "R1").info("hidden %s", args)
+        bot_logger("Bot_A", "R1").warning("shown %s", args)
+        bot_logger("Bot_B", "R2").debug("debug %s", args)
+        args["seq"] = 2  # changed after the calls: the records keep the old value
+        bot_logger("Bot_C", "R2").debug("hidden %s", args)
+        logging.getLogger("other").info("info")
+    finally:
+        stop_logging()
+        root.handlers[:] = handlers
+        root.setLevel(level)
+    lines = stream.getvalue().splitlines()
+    assert [line.split(": ", 1)[1] for line in lines] == ["shown {'seq': 1}", "debug {'seq': 1}", "info"]
+    for name in ("R1", "R2.Bot_B"):
+        logging.getLogger(f"{BOT_LOGGER}.{name}").setLevel(logging.NOTSET)
@@ -0,0 +1,60 @@
+""" common.metrics: histogram buckets, stage totals and the text exposition format"""
+import pytest
+
+from common.metrics import BUCKETS, Histogram, MetricsRegistry, Stages
+
+
+@pytest.mark.parametrize(
+    "value, index",
+    [(0, 0), (BUCKETS[0], 0), (BUCKETS[0] * 1.01, 1), (BUCKETS[3], 3), (BUCKETS[-1], len(BUCKETS) - 1),
+     (BUCKETS[-1] + 1, len(BUCKETS))],
+)
+def test_observe_bucket_boundaries(value, index):
+    """a value equal to a bound counts in that bucket (le), values above the last go to +Inf"""
+    h = Histogram()
+    h.observe(value)
+    assert h.counts[index] == 1
+    assert sum(h.counts) == h.count == 1
+    assert h.sum == value
+
+
+def test_render_is_cumulative():
+    h = Histogram(buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 2.0):
+        h.observe(v)
+    lines = h.render("m", (("stage", "x"),))
+    assert lines == [
+        'm_bucket{stage="x",le="0.1"} 2',
+        'm_bucket{stage="x",le="1.0"} 3',
+        'm_bucket{stage="x",le="+Inf"} 4',
+        'm_sum{stage="x"} 2.65',
+        'm_count{stage="x"} 4',
+    ]
+
+
+def test_stage_totals():
+    stages = Stages(bot="test_stage_totals")
+    assert stages.totals() == {}
+    stages.observe("forward", 0.5)
+    stages.observe("forward", 0.25)
+    stages.observe("emit", 0.125)
+    assert stages.totals() == {"forward": (2, 0.75), "emit": (1, 0.125)}
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("c", "help", room='A"1\\2\n3').inc(2)
+    registry.gauge("g", lambda: 7, bot="Mortal_A")
+    registry.gauge("broken", lambda: 1 / 0)
+    text = registry.render()
+    assert 'c{room="A\\"1\\\\2\\n3"} 2' in text.splitlines()
+    assert 'g{bot="Mortal_A"} 7' in text.splitlines()
+    assert "# HELP c help" in text
+    assert "broken{" not in text  # gauges that fail are skipped
+
+
+def test_remove_gauge():
+    registry = MetricsRegistry()
+    registry.gauge("g", lambda: 1, bot="A")
+    registry.remove_gauge("g", bot="A")
+    assert 'g{bot="A"}' not in registry.render()
@@ -0,0 +1,22 @@
+""" majiang_socket_bot.parse_rooms"""
+import pytest
+
+pytest.importorskip("socketio")
+pytest.importorskip("requests")
+from majiang_socket_bot import RoomSetting, parse_rooms  # pylint: disable=wrong-import-position
+
+
+def test_single_room_keeps_default_prefix():
+    assert parse_rooms("A1234") == [RoomSetting(room="A1234", number=3)]
+
+
+def test_numbers_and_prefixes():
+    rooms = parse_rooms(" A1234:1, B5678 ,,C9:2", default_number=2)
+    assert [(r.room, r.number) for r in rooms] == [("A1234", 1), ("B5678", 2), ("C9", 2)]
+    assert [r.name_prefix for r in rooms] == ["Mortal_A1234_", "Mortal_B5678_", "Mortal_C9_"]
+
+
+@pytest.mark.parametrize("spec", ["A1234:x", "A1234:-1", "A1234:4", "A1234:0", "A:1.5"])
+def test_bad_spec(spec):
+    with pytest.raises(ValueError):
+        parse_rooms(spec)
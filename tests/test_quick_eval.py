@@ -0,0 +1,109 @@
+""" bot.local.quick_eval: trivial decisions, and how MortalEngine merges them with cached and evaluated rows"""
+import pytest
+
+from bot.local.quick_eval import HORA, trivial_action, trivial_rows
+
+N_ACTIONS = 46
+NONE = 45       # 'none' (pass) in the Mortal action space
+
+
+def test_single_legal_action():
+    assert trivial_action([NONE], quick_eval=True, always_hora=False) == (NONE, "quick_eval")
+    assert trivial_action([NONE], quick_eval=False, always_hora=False) is None
+    assert trivial_action([NONE], quick_eval=False, always_hora=True) is None
+
+
+def test_only_hora_legal():
+    assert trivial_action([HORA], quick_eval=True, always_hora=False) == (HORA, "quick_eval")
+    assert trivial_action([HORA], quick_eval=True, always_hora=True) == (HORA, "quick_eval")
+    assert trivial_action([HORA], quick_eval=False, always_hora=True) == (HORA, "always_hora")
+    assert trivial_action([HORA], quick_eval=False, always_hora=False) is None
+
+
+def test_always_hora_among_other_actions():
+    legal = [3, HORA, NONE]
+    assert trivial_action(legal, quick_eval=True, always_hora=False) is None
+    assert trivial_action(legal, quick_eval=True, always_hora=True) == (HORA, "always_hora")
+    # several options without hora: the network decides
+    assert trivial_action([3, 7, NONE], quick_eval=True, always_hora=True) is None
+
+
+def mask(*legal):
+    np = pytest.importorskip("numpy")
+    m = np.zeros(N_ACTIONS, dtype=bool)
+    m[list(legal)] = True
+    return m
+
+
+def test_trivial_rows():
+    masks = [mask(3, 7), mask(NONE), mask(3, HORA, NONE), mask(HORA)]
+    assert trivial_rows(masks, quick_eval=True, always_hora=False) == {
+        1: (NONE, "quick_eval"), 3: (HORA, "quick_eval")}
+    assert trivial_rows(masks, quick_eval=True, always_hora=True) == {
+        1: (NONE, "quick_eval"), 2: (HORA, "always_hora"), 3: (HORA, "quick_eval")}
+    assert trivial_rows(masks, quick_eval=False, always_hora=True) == {
+        2: (HORA, "always_hora"), 3: (HORA, "always_hora")}
+    assert trivial_rows(masks, quick_eval=False, always_hora=False) == {}
+
+
+def stub_engine(**flags):
+    """ MortalEngine whose network returns the observation as q values (illegal actions -inf)"""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("libriichi")
+    from bot.local.engine import MortalEngine
+
+    class Brain(torch.nn.Module):
+        def forward(self, obs):
+            return obs
+
+    class DQN(torch.nn.Module):
+        def __init__(self) -> None:
+            super().__init__()
+            self.rows = 0   # rows evaluated
+
+        def forward(self, phi, masks):
+            self.rows += len(phi)
+            return phi.masked_fill(~masks, -torch.inf)
+
+    return MortalEngine(Brain(), DQN(), is_oracle=False, version=4, name="test_quick_eval", **flags)
+
+
+def obs_row(seed):
+    np = pytest.importorskip("numpy")
+    return np.arange(N_ACTIONS, dtype=np.float32) * (1 if seed % 2 else -1) + seed
+
+
+def test_react_batch_keeps_row_order():
+    from bot.local.cache import EvalCache
+
+    engine = stub_engine(enable_quick_eval=True, enable_always_hora=True)
+    engine.cache = EvalCache(max_entries=8, name="test_quick_eval")
+    masks = [mask(3, 7), mask(NONE), mask(1, 2), mask(3, HORA), mask(5, 9)]
+    obs = [obs_row(i) for i in range(len(masks))]
+    # row 2 was seen before: its q values come from the cache
+    cached_q = [0.0] * N_ACTIONS
+    cached_q[2] = 5.0
+    torch = pytest.importorskip("torch")
+    engine.cache.put(EvalCache.key(obs[2], masks[2]), torch.tensor(cached_q))
+
+    actions, q_values, masks_out, is_greedy = engine.react_batch(obs, masks, None)
+    assert engine.dqn.rows == 2     # rows 0 and 4
+    # evaluated rows: q = obs, the largest legal one wins
+    assert actions[0] == 3 and q_values[0][3] == obs[0][3] and q_values[0][7] == obs[0][7]
+    assert actions[4] == 5 and q_values[4][5] == obs[4][5]
+    # trivial rows: placeholder 0 for the chosen action, -inf elsewhere
+    assert actions[1] == NONE and q_values[1][NONE] == 0 and q_values[1][3] == -float("inf")
+    assert actions[3] == HORA and q_values[3][HORA] == 0 and q_values[3][3] == -float("inf")
+    assert actions[2] == 2 and q_values[2][2] == 5.0
+    assert [m.index(True) for m in masks_out] == [3, NONE, 1, 3, 5]
+    assert all(is_greedy)
+
+
+def test_agari_guard_does_not_skip_the_network():
+    # the agari guard is applied by libriichi to the model's decision, not by the engine
+    engine = stub_engine(enable_quick_eval=True, enable_always_hora=False, enable_rule_based_agari_guard=True)
+    masks = [mask(3, HORA), mask(HORA)]
+    actions, q_values, _, _ = engine.react_batch([obs_row(1), obs_row(2)], masks, None)
+    assert engine.dqn.rows == 1
+    assert actions[0] == HORA and q_values[0][HORA] == obs_row(1)[HORA]
+    assert actions[1] == HORA and q_values[1][HORA] == 0
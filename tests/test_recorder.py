@@ -0,0 +1,29 @@
+""" common.recorder: recordings are written off the caller thread and closed at exit"""
+from common.recorder import GameRecorder, close_recordings, flush_recordings, read_recording
+
+
+def test_record_and_read(tmp_path):
+    recorder = GameRecorder(str(tmp_path), "Mortal_A")
+    msg = {"zimo": {"l": 0, "p": "m1"}}
+    reaction = {"dapai": {"l": 0, "p": "m1_"}}
+    recorder.record(msg, reaction)
+    msg["zimo"]["p"] = "changed"  # serialized when recorded
+    recorder.record({"say": {}}, None)
+    recorder.close()
+    recorder.record({"ignored": {}}, None)
+    assert flush_recordings(10)
+    assert list(read_recording(str(recorder.path))) == [
+        ({"zimo": {"l": 0, "p": "m1"}}, reaction),
+        ({"say": {}}, None),
+    ]
+
+
+def test_close_recordings_closes_games_in_progress(tmp_path):
+    recorders = [GameRecorder(str(tmp_path / str(i)), f"Mortal_{i}") for i in range(2)]
+    for i, recorder in enumerate(recorders):
+        recorder.record({"seq": i}, None)
+    assert flush_recordings(10)
+    assert close_recordings(10)
+    # complete gzip streams: reading them does not raise EOFError
+    for i, recorder in enumerate(recorders):
+        assert list(read_recording(str(recorder.path))) == [({"seq": i}, None)]
@@ -0,0 +1,135 @@
+""" bot.local.registry: one shared engine per (model file, config), refcounts and thread count claims
+engines are stubs, no model is loaded"""
+import threading
+import time
+
+import pytest
+
+from bot.local import registry
+from bot.local.config import EngineConfig
+from bot.local.registry import acquire_engine, engine_share_counts, preload_engine, release_engine
+
+
+class StubEngine:
+    def __init__(self, model_file, config) -> None:
+        self.model_file = model_file
+        self.config = config
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """ fresh registry whose engines are StubEngines, returns the list of (model_file, config) built"""
+    built = []
+
+    def build(model_file, config, fork_safe=False):
+        time.sleep(0.01)    # long enough for concurrent callers to pile up
+        built.append((model_file, config))
+        return StubEngine(model_file, config)
+
+    monkeypatch.setattr(registry, "_ENGINES", {})
+    monkeypatch.setattr(registry, "_TORCH_THREADS", None)
+    monkeypatch.setattr(registry, "_build_engine", build)
+    monkeypatch.setattr(registry, "engine_device", lambda model_file, device: device or "cpu")
+    return built
+
+
+def test_concurrent_acquires_build_once(builds):
+    engines = []
+    threads = [threading.Thread(target=lambda: engines.append(acquire_engine("a.pth"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert len(builds) == 1
+    assert len(engines) == 8 and all(e is engines[0] for e in engines)
+    assert list(engine_share_counts().values()) == [8]
+
+
+def test_failed_load_does_not_poison_the_key(builds, monkeypatch):
+    build = registry._build_engine
+    calls = []
+
+    def fail_once(model_file, config, fork_safe=False):
+        calls.append(model_file)
+        if len(calls) == 1:
+            time.sleep(0.05)
+            raise OSError("cannot read the model")
+        return build(model_file, config, fork_safe)
+
+    monkeypatch.setattr(registry, "_build_engine", fail_once)
+    results = []
+
+    def acquire():
+        try:
+            results.append(acquire_engine("a.pth"))
+        except OSError as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=acquire) for _ in range(2)]
+    for t in threads:
+        t.start()
+        time.sleep(0.01)    # the second caller waits for the failing load
+    for t in threads:
+        t.join(5)
+    # the waiter starts over instead of getting the failed entry
+    assert sorted(type(r).__name__ for r in results) == ["OSError", "StubEngine"]
+    assert len(builds) == 1
+    assert acquire_engine("a.pth") is next(r for r in results if isinstance(r, StubEngine))
+    assert list(engine_share_counts().values()) == [2]
+
+
+def test_release_drops_refcount_and_keeps_the_engine(builds):
+    engine = acquire_engine("a.pth")
+    acquire_engine("a.pth")
+    release_engine("a.pth")
+    assert list(engine_share_counts().values()) == [1]
+    release_engine("a.pth")
+    release_engine("a.pth")     # unpaired release: stays at 0
+    assert list(engine_share_counts().values()) == [0]
+    # still loaded for bots created later
+    assert acquire_engine("a.pth") is engine
+    assert len(builds) == 1
+
+
+def test_configs_and_model_files_get_separate_engines(builds):
+    default = acquire_engine("a.pth")
+    assert acquire_engine("a.pth", EngineConfig()) is default
+    # device None resolves to the same device as an explicit "cpu"
+    assert acquire_engine("a.pth", EngineConfig(device="cpu")) is default
+    assert acquire_engine("b.pth") is not default
+    assert acquire_engine("a.pth", EngineConfig(precision="bf16")) is not default
+    assert acquire_engine("a.pth", EngineConfig(batch_window_ms=2)) is not default
+    assert len(builds) == 4
+    assert len(engine_share_counts()) == 4
+
+
+def test_torch_thread_counts_are_claimed_per_process(builds):
+    engine = acquire_engine("a.pth", EngineConfig(intra_op_threads=2))
+    # not part of the key: the same engine
+    assert acquire_engine("a.pth", EngineConfig(intra_op_threads=2)) is engine
+    with pytest.raises(ValueError):
+        acquire_engine("a.pth", EngineConfig(intra_op_threads=4))
+    with pytest.raises(ValueError):
+        acquire_engine("b.pth", EngineConfig(inter_op_threads=1))
+    # ONNX Runtime sessions have their own pools
+    onnx2 = acquire_engine("a.onnx", EngineConfig(intra_op_threads=2))
+    onnx4 = acquire_engine("a.onnx", EngineConfig(intra_op_threads=4))
+    assert onnx2 is not onnx4
+    assert len(builds) == 3
+
+
+def test_preloaded_engine_is_warmed_up_by_the_first_acquire(builds, monkeypatch):
+    warmed = []
+
+    def warm_up(entry, key):
+        warmed.append(key[0])
+        entry.warm = True
+
+    monkeypatch.setattr(registry, "_warm_up", warm_up)
+    assert preload_engine("a.pth")
+    assert list(engine_share_counts().values()) == [0]
+    assert not preload_engine("a.onnx")     # ORT starts its thread pools when loading
+    engine = acquire_engine("a.pth")
+    acquire_engine("a.pth")
+    assert len(builds) == 1 and len(warmed) == 1
+    assert isinstance(engine, StubEngine)
@@ -0,0 +1,70 @@
+""" bench.replay: recordings replay through GameState, in process and in a worker pool
+the bot is a stub answering its own tsumo with tsumogiri, no model is loaded"""
+import multiprocessing as mp
+
+import pytest
+
+import bench.replay
+from bench.replay import replay_all
+from bot import Bot
+from common.mj_helper import MjaiType
+from common.recorder import GameRecorder, flush_recordings
+from game_state import GameState
+
+# .onnx: the engine device is known without torch, and nothing is preloaded
+MODEL = "stub.onnx"
+
+MSGS = [
+    {"kaiju": {"id": 1, "qijia": 0, "player": ["a", "b", "c", "d"]}},
+    {"qipai": {"zhuangfeng": 0, "jushu": 0, "changbang": 0, "lizhibang": 0, "defen": [25000] * 4,
+               "baopai": "z1", "shoupai": ["", "m123p456s789z1122", "", ""]}, "seq": 1},
+    {"zimo": {"l": 0, "p": ""}, "seq": 2},
+    {"dapai": {"l": 0, "p": "z7_"}, "seq": 3},
+    {"zimo": {"l": 1, "p": "m5"}, "seq": 4},
+    {"dapai": {"l": 1, "p": "m5_"}, "seq": 5},
+    {"zimo": {"l": 2, "p": ""}, "seq": 6},
+    {"jieju": {}, "seq": 7},
+]
+
+
+class TsumogiriBot(Bot):
+    def _init_bot_impl(self, mode=None):
+        pass
+
+    def react(self, input_msg:dict) -> dict | None:
+        if input_msg["type"] == MjaiType.TSUMO and input_msg["actor"] == self.seat:
+            return {"type": MjaiType.DAHAI, "actor": self.seat, "pai": input_msg["pai"], "tsumogiri": True}
+        return None
+
+
+def stub_get_bot(model_path, engine_config=None):
+    return TsumogiriBot("stub")
+
+
+def record(folder, name) -> str:
+    recorder = GameRecorder(str(folder), name)
+    game = GameState(TsumogiriBot("stub"))
+    for msg in MSGS:
+        recorder.record(msg, game.trans_mjai_react(game.input(msg)))
+    recorder.close()
+    assert flush_recordings(10)
+    return str(recorder.path)
+
+
+@pytest.fixture
+def recordings(tmp_path, monkeypatch):
+    monkeypatch.setattr(bench.replay, "get_bot", stub_get_bot)
+    return [record(tmp_path / str(i), f"stub_{i}") for i in range(3)]
+
+
+def test_replay_in_process(recordings):
+    res = replay_all(recordings, MODEL)
+    assert (res.recordings, res.messages, res.decisions, res.mismatches) == (3, 3 * len(MSGS), 3, 0)
+    assert len(res.decision_times) == 3
+
+
+@pytest.mark.skipif("fork" not in mp.get_all_start_methods(), reason="the stub reaches the workers by fork")
+def test_replay_in_worker_pool(recordings):
+    res = replay_all(recordings, MODEL, jobs=2)
+    assert (res.recordings, res.messages, res.decisions, res.mismatches) == (3, 3 * len(MSGS), 3, 0)
+    assert len(res.decision_times) == 3
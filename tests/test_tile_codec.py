@@ -0,0 +1,115 @@
+""" common.tile_codec and the table-driven mj_helper helpers against the former string helpers"""
+import random
+import re
+from functools import cmp_to_key
+
+import pytest
+
+from common import mj_helper, tile_codec
+
+
+# former implementations (before the tile codec), kept as the reference
+def _old_ms2mjai(ms_tile:str) -> str:
+    return mj_helper.TILES_MS_2_MJAI[ms_tile] if ms_tile in mj_helper.TILES_MS_2_MJAI else ms_tile
+
+
+def _old_mjai2ms(mjai_tile:str) -> str:
+    return mj_helper.TILES_MJAI_2_MS[mjai_tile] if mjai_tile in mj_helper.TILES_MJAI_2_MS else mjai_tile
+
+
+def _old_majiang2mjai(majiang_tile:str) -> str:
+    assert len(majiang_tile) == 2
+    return _old_ms2mjai(majiang_tile[1] + majiang_tile[0])
+
+
+def _old_mjai2maa(mjai_tile:str) -> str:
+    ms_tile = _old_mjai2ms(mjai_tile)
+    return ms_tile[1] + ms_tile[0]
+
+
+def _old_tehai_lst(str_tehai:str) -> list[str]:
+    res = []
+    for tile in re.findall(r'([mpsz]\d+)', str_tehai):
+        res.extend([tile[0] + n for n in tile[1:]])
+    return res
+
+
+def _old_sort(mjai_tiles:list[str]) -> list[str]:
+    return sorted(mjai_tiles, key=cmp_to_key(
+        lambda a, b: mj_helper.MJAI_TILES_SORTED.index(a) - mj_helper.MJAI_TILES_SORTED.index(b)))
+
+
+MJAI_TILES = [t for t in tile_codec.ID_TO_MJAI if t != "?"]
+MAJIANG_TILES = [f"{s}{n}" for s in "mps" for n in range(10)] + [f"z{n}" for n in range(1, 8)]
+
+
+def test_tables_are_bijective():
+    for table in (tile_codec.ID_TO_MJAI, tile_codec.ID_TO_MS, tile_codec.ID_TO_MAJIANG):
+        assert len(table) == tile_codec.N_TILES
+        assert len(set(table)) == tile_codec.N_TILES
+    for i in range(tile_codec.N_TILES):
+        assert tile_codec.MJAI_TO_ID[tile_codec.ID_TO_MJAI[i]] == i
+        assert tile_codec.MS_TO_ID[tile_codec.ID_TO_MS[i]] == i
+        assert tile_codec.MAJIANG_TO_ID[tile_codec.ID_TO_MAJIANG[i]] == i
+
+
+def test_ids_match_mjai_tiles_34():
+    assert tile_codec.ID_TO_MJAI[:34] == mj_helper.MJAI_TILES_34[:34]
+    for i, aka in zip(range(tile_codec.AKA_BASE, tile_codec.UNKNOWN), mj_helper.MJAI_AKA_DORAS):
+        assert tile_codec.ID_TO_MJAI[i] == aka
+        assert tile_codec.ID_TO_MJAI[tile_codec.ID_TO_KIND[i]] == aka[:2]
+        assert tile_codec.ID_TO_AKA[i] == "mps".index(aka[1])
+
+
+@pytest.mark.parametrize("tile", MAJIANG_TILES)
+def test_majiang2mjai(tile):
+    assert mj_helper.cvt_majiang2mjai(tile) == _old_majiang2mjai(tile)
+
+
+@pytest.mark.parametrize("tile", MJAI_TILES)
+def test_mjai2maa(tile):
+    assert mj_helper.cvt_mjai2maa(tile) == _old_mjai2maa(tile)
+    assert mj_helper.cvt_majiang2mjai(mj_helper.cvt_mjai2maa(tile)) == tile
+
+
+@pytest.mark.parametrize("tile", MJAI_TILES + ["?"])
+def test_ms_conversions(tile):
+    assert mj_helper.cvt_mjai2ms(tile) == _old_mjai2ms(tile)
+    assert mj_helper.cvt_ms2mjai(mj_helper.cvt_mjai2ms(tile)) == tile
+    assert tile_codec.MJAI_TO_MS[tile] == _old_mjai2ms(tile)
+    assert tile_codec.MS_TO_MJAI[_old_mjai2ms(tile)] == tile
+
+
+def test_sort_matches_former_sort():
+    rng = random.Random(0)
+    tiles = MJAI_TILES + ["?"]
+    assert mj_helper.sort_mjai_tiles(tiles) == mj_helper.MJAI_TILES_SORTED
+    for _ in range(500):
+        sample = rng.choices(tiles, k=rng.randint(0, 14))
+        assert mj_helper.sort_mjai_tiles(sample) == _old_sort(sample)
+        assert sorted(sample, key=tile_codec.mjai_sort_key) == _old_sort(sample)
+
+
+def _random_shoupai(rng:random.Random) -> str:
+    """ a Majiang shoupai-like string: suit groups, tsumo / fulou markers and separators"""
+    parts = []
+    for suit in rng.sample("mpsz", rng.randint(0, 4)):
+        digits = "1234567" if suit == "z" else "0123456789"
+        parts.append(suit + "".join(rng.choices(digits, k=rng.randint(0, 5))))
+        if rng.random() < 0.3:
+            parts.append(rng.choice(["_", "*", "-", "=", "+", "-5", "="]))
+    fulou = []
+    for _ in range(rng.randint(0, 2)):
+        suit = rng.choice("mps")
+        fulou.append(suit + "".join(rng.choices("0123456789", k=3)) + rng.choice(["-", "=", "+", ""]))
+    return ",".join(["".join(parts)] + fulou)
+
+
+def test_tehai_parse_matches_regex():
+    rng = random.Random(1)
+    for sample in ["", "m2479s157z14", "m123p406s789z11_", "m55-5,p123-", "z7777", "m1,", "_m1"]:
+        assert mj_helper.cvt_majiang_tehai_lst(sample) == _old_tehai_lst(sample)
+    for _ in range(2000):
+        sample = _random_shoupai(rng)
+        assert mj_helper.cvt_majiang_tehai_lst(sample) == _old_tehai_lst(sample), sample
+        assert [tile_codec.ID_TO_MAJIANG[i] for i in tile_codec.majiang_tehai_ids(sample)] == _old_tehai_lst(sample)
@@ -0,0 +1,122 @@
+""" BotRuntimeMixin.reset_game / GameState.reset: nothing of the previous game survives the warm reset,
+the engine and the pre-built libriichi bots are reused. libriichi and the engine are stubs"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import bot_runtime
+from bot.bot import BotMjai
+from bot.local.config import EngineConfig
+from bot_runtime import BotRuntimeMixin
+from common.mj_helper import MjaiType
+
+
+class FakeMjaiBot:
+    """ stands in for libriichi.mjai.Bot: keeps the msgs, never acts"""
+    def __init__(self, engine, seat) -> None:
+        self.engine = engine
+        self.seat = seat
+        self.msgs = []
+
+    def react(self, msg:str):
+        self.msgs.append(msg)
+
+
+class StubBot(BotMjai):
+    def __init__(self) -> None:
+        super().__init__("stub")
+        self.engine = None
+        self.engines_built = 0
+        self.mjai_bots:list[FakeMjaiBot] = []
+
+    def load(self):
+        if self.engine is None:
+            self.engines_built += 1
+            self.engine = object()
+
+    def _get_engine(self, mode):
+        self.load()
+        return self.engine
+
+    def _mjai_module_for(self, mode):
+        def build(engine, seat):
+            self.mjai_bots.append(FakeMjaiBot(engine, seat))
+            return self.mjai_bots[-1]
+        return SimpleNamespace(Bot=build)
+
+
+class Runtime(BotRuntimeMixin):
+    def __init__(self) -> None:
+        setting = SimpleNamespace(server="http://127.0.0.1/", apppath="majiang/", modelpath="model.pth",
+            record_dir=None, archive_dir=None, engine_config=EngineConfig)
+        self._init_runtime(setting, "test_reset", "Mortal_Reset")
+
+
+def play(game, seat:int):
+    """ kaiju and the first turns of a kyoku, ending with a reach of the bot"""
+    mine = seat  # qijia 0, jushu 0: l == seat
+    shoupai = [""] * 4
+    shoupai[mine] = "m123p456s789z1122"
+    msgs = [
+        {"kaiju": {"id": seat, "qijia": 0, "player": ["a", "b", "c", "d"]}},
+        {"qipai": {"zhuangfeng": 0, "jushu": 0, "changbang": 0, "lizhibang": 0, "defen": [25000] * 4,
+                   "baopai": "z1", "shoupai": shoupai}, "seq": 1},
+        {"zimo": {"l": mine, "p": "m5"}, "seq": 2},
+        {"dapai": {"l": mine, "p": "z1*"}, "seq": 3},
+        {"zimo": {"l": (mine + 1) % 4, "p": ""}, "seq": 4},
+    ]
+    for msg in msgs:
+        game.trans_mjai_react(game.input(msg))
+
+
+@pytest.fixture
+def runtime(monkeypatch):
+    monkeypatch.setattr(bot_runtime, "get_bot", lambda model_path, engine_config=None: StubBot())
+    rt = Runtime()
+    rt.load_bot()
+    return rt
+
+
+def test_reset_forgets_the_previous_game(runtime):
+    game, bot = runtime.game, runtime.bot
+    stages, logger = game.stages, game.logger
+    play(game, 1)
+    assert game.kyoku_state.self_in_reach and game.kyoku_state.player_reach[1]
+    assert game.kyoku_state.my_tehai and game.seat == 1 and game.is_round_started
+
+    runtime.is_in_game = runtime.is_in_room = True
+    runtime.myuid = "uid"
+    runtime._ended_at = time.perf_counter()
+    runtime.reset_game()
+
+    assert runtime.game is game and game.mjai_bot is bot
+    assert game.seat == 0 and game.game_mode is None and not game.is_round_started
+    assert game.kyoku_state.my_tehai == [] and game.kyoku_state.my_tsumohai is None
+    assert not game.kyoku_state.self_in_reach and game.kyoku_state.player_reach == [False] * 4
+    assert game.kyoku_state.pending_reach_acc is None
+    assert game.mjai_pending_input_msgs == [] and game.last_reaction is None
+    assert (runtime.myuid, runtime.is_in_room, runtime.is_in_game) == ("", False, False)
+    # labels and per-bot logger are kept
+    assert game.stages is stages and game.logger is logger
+    assert runtime.stages is stages
+
+
+def test_next_game_reuses_engine_and_prepared_bots(runtime):
+    bot = runtime.bot
+    assert bot.engines_built == 1 and len(bot.mjai_bots) == 4    # one libriichi bot per seat
+    play(runtime.game, 1)
+    first = bot.mjai_bot
+    assert first is bot.mjai_bots[1]
+
+    runtime.reset_game()
+    # only the seat used by the last game is rebuilt, on the same engine
+    assert bot.engines_built == 1 and len(bot.mjai_bots) == 5
+    assert all(b.engine is bot.engine for b in bot.mjai_bots)
+
+    runtime.game.input({"kaiju": {"id": 2, "qijia": 0, "player": ["a", "b", "c", "d"]}})
+    assert bot.mjai_bot is bot.mjai_bots[2] and bot.mjai_bot is not first
+    assert len(bot.mjai_bots) == 5
+    # the kyoku log starts over with the new game
+    assert bot._kyoku_log == [{"type": MjaiType.START_GAME, "id": 2}]
+    assert len(bot.mjai_bot.msgs) == 1